@@ -0,0 +1,33 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+
+@dataclass
+class Regression:
+    case: str
+    size: str
+    measure: str
+    baseline: float
+    current: float
+
+    @property
+    def change(self) -> float:
+        return self.current / self.baseline - 1
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[Regression]:
+    # Median time and peak memory of every case found in both runs may grow by `tolerance` (0.25 = 25 %)
+    baseline_results = {(result["case"], result["size"]): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        previous = baseline_results.get((result["case"], result["size"]))
+        if previous is None or previous["error"] or result["error"]:
+            continue
+        for measure_name in ("median_seconds", "peak_memory_bytes"):
+            if previous[measure_name] > 0 and result[measure_name] > previous[measure_name] * (1 + tolerance):
+                regressions.append(
+                    Regression(
+                        result["case"], result["size"], measure_name, previous[measure_name], result[measure_name]
+                    )
+                )
+    return regressions
@@ -0,0 +1,47 @@
+import argparse
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class ImportTime:
+    module: str
+    self_seconds: float
+    cumulative_seconds: float
+    depth: int
+
+
+def measure_imports(module: str) -> List[ImportTime]:
+    # Imports the module in a fresh interpreter with -X importtime, which reports every import on stderr
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True
+    )
+    imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append(ImportTime(name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+    return imports
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Where the import time of a module goes")
+    parser.add_argument("module", nargs="?", default="core.api.api")
+    parser.add_argument("--top", type=int, default=20, help="Number of imports listed")
+    parser.add_argument("--depth", type=int, default=2, help="Only list imports up to this nesting depth")
+    args = parser.parse_args()
+
+    imports = measure_imports(args.module)
+    total = max(entry.cumulative_seconds for entry in imports)
+    print(f"import {args.module}: {total * 1000:.0f} ms, {len(imports)} modules")
+    listed = [entry for entry in imports if entry.depth <= args.depth]
+    for entry in sorted(listed, key=lambda entry: entry.cumulative_seconds, reverse=True)[: args.top]:
+        print(f"{entry.cumulative_seconds * 1000:>10.1f} ms{entry.self_seconds * 1000:>10.1f} ms  {entry.module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from benchmarks.synthetic import SIZES, SyntheticSpec, generate_midi
+
+# Nothing from core is imported up front: in-process runs apply the scenario env before the settings are read
+
+RESULTS_VERSION = 1
+# Simulated clients send from these addresses, so admission control sees them as different clients
+CLIENT_ADDRESS = "10.0.{}.{}"
+ClientFactory = Callable[[int], httpx.AsyncClient]
+
+
+@dataclass
+class LoadFile:
+    label: str
+    data: bytes
+    weight: float
+
+
+@dataclass
+class LoadConfig:
+    # ConfigModel fields over the frontend's default config (form field), or a preset id (query parameter)
+    label: str
+    config: Optional[Dict[str, Any]]
+    preset: Optional[str]
+    weight: float
+
+
+@dataclass
+class Scenario:
+    files: List[LoadFile]
+    configs: List[LoadConfig]
+    # "rate": requests started at a fixed arrival rate, whatever the answers. "concurrency": `concurrency`
+    # clients each sending their next request when the previous one is answered.
+    mode: str = "concurrency"
+    rate: float = 2.0
+    concurrency: int = 2
+    duration: float = 30.0
+    clients: int = 1
+    endpoint: str = "/process"
+    query: Dict[str, str] = field(default_factory=dict)
+    # Environment of the server: worker counts, cache settings...
+    env: Dict[str, str] = field(default_factory=dict)
+    seed: int = 0
+
+
+@dataclass
+class RequestRecord:
+    # Seconds since the start of the run, latency counted from when the request was due to start
+    started: float
+    seconds: float
+    status: Optional[int]
+    file: str
+    config: str
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status is not None and 200 <= self.status < 300
+
+
+@dataclass
+class MemorySample:
+    seconds: float
+    # RSS of the server process and of each of its descendants (the processing workers)
+    server_bytes: int
+    worker_bytes: List[int]
+
+
+def load_scenario(path: str) -> Scenario:
+    # File paths and globs are relative to the scenario file
+    with open(path) as file:
+        spec = json.load(file)
+    directory = os.path.dirname(os.path.abspath(path))
+    files = []
+    for entry in spec.pop("files"):
+        weight = entry.get("weight", 1.0)
+        if "path" in entry:
+            paths = sorted(glob.glob(os.path.join(directory, entry["path"])))
+            if not paths:
+                raise ValueError(f"No file matches {entry['path']}")
+            for midi_path in paths:
+                with open(midi_path, "rb") as midi_file:
+                    files.append(LoadFile(os.path.basename(midi_path), midi_file.read(), weight / len(paths)))
+        else:
+            synthetic = entry["synthetic"]
+            synthetic_spec = SIZES[synthetic] if isinstance(synthetic, str) else SyntheticSpec(**synthetic)
+            label = synthetic if isinstance(synthetic, str) else f"synthetic-{synthetic_spec.notes}"
+            files.append(LoadFile(label, generate_midi(synthetic_spec), weight))
+    configs = []
+    for index, entry in enumerate(spec.pop("configs", [{"config": {}}])):
+        weight = entry.get("weight", 1.0)
+        if "preset" in entry:
+            configs.append(LoadConfig(entry.get("label", entry["preset"]), None, entry["preset"], weight))
+        else:
+            label = entry.get("label", f"{index}:{entry['config'].get('tokenizer', 'default')}")
+            configs.append(LoadConfig(label, entry["config"], None, weight))
+    return Scenario(files, configs, **spec)
+
+
+async def run_load(
+    scenario: Scenario, client_factory: ClientFactory, pid: Optional[int], sample_interval: float
+) -> Tuple[List[RequestRecord], List[MemorySample], float]:
+    from core.constants import DEFAULT_CONFIG
+
+    forms = {
+        config.label: {"config": json.dumps({**DEFAULT_CONFIG, **config.config})}
+        for config in scenario.configs
+        if config.config is not None
+    }
+    rng = random.Random(scenario.seed)
+    clients = [client_factory(index) for index in range(max(scenario.clients, 1))]
+    records: List[RequestRecord] = []
+    samples: List[MemorySample] = []
+    start = time.perf_counter()
+    deadline = start + scenario.duration
+
+    async def send(index: int, due: float) -> None:
+        load_file = rng.choices(scenario.files, [file.weight for file in scenario.files])[0]
+        config = rng.choices(scenario.configs, [config.weight for config in scenario.configs])[0]
+        params = dict(scenario.query)
+        if config.preset is not None:
+            params["preset"] = config.preset
+        files = {"file": (load_file.label, load_file.data, "audio/midi")}
+        status, error = None, None
+        try:
+            response = await clients[index % len(clients)].post(
+                scenario.endpoint, params=params, data=forms.get(config.label), files=files
+            )
+            status = response.status_code
+            if not 200 <= status < 300:
+                error = response.text[:200]
+        except httpx.HTTPError as e:
+            error = f"{type(e).__name__}: {e}"
+        now = time.perf_counter()
+        records.append(RequestRecord(due - start, now - due, status, load_file.label, config.label, error))
+
+    async def sample_memory() -> None:
+        while True:
+            if pid is not None:
+                server, workers = process_tree_rss(pid)
+                samples.append(MemorySample(time.perf_counter() - start, server, workers))
+            await asyncio.sleep(sample_interval)
+
+    sampler = asyncio.create_task(sample_memory())
+    try:
+        if scenario.mode == "rate":
+            tasks = []
+            for count in range(int(scenario.duration * scenario.rate)):
+                due = start + count / scenario.rate
+                await asyncio.sleep(max(due - time.perf_counter(), 0))
+                tasks.append(asyncio.create_task(send(count, due)))
+            await asyncio.gather(*tasks)
+        elif scenario.mode == "concurrency":
+
+            async def closed_loop(index: int) -> None:
+                while time.perf_counter() < deadline:
+                    await send(index, time.perf_counter())
+
+            await asyncio.gather(*(closed_loop(index) for index in range(scenario.concurrency)))
+        else:
+            raise ValueError(f"Unknown mode {scenario.mode!r}, expected rate or concurrency")
+    finally:
+        sampler.cancel()
+        for client in clients:
+            await client.aclose()
+    return records, samples, time.perf_counter() - start
+
+
+def process_tree_rss(pid: int) -> Tuple[int, List[int]]:
+    # From /proc (Linux): RSS of the process and of all its descendants, 0 where it can't be read
+    parents: Dict[int, int] = {}
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as file:
+                    # The command name is in parentheses and may contain spaces
+                    parents[int(entry)] = int(file.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+    descendants, frontier = [], [pid]
+    while frontier:
+        children = [child for child, parent in parents.items() if parent in frontier]
+        descendants.extend(children)
+        frontier = children
+    return _rss(pid), [_rss(child) for child in descendants]
+
+
+def _rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def summarize(records: List[RequestRecord], seconds: float) -> Dict[str, Any]:
+    ok = [record.seconds for record in records if record.ok]
+    statuses: Dict[str, int] = {}
+    for record in records:
+        key = str(record.status) if record.status is not None else "error"
+        statuses[key] = statuses.get(key, 0) + 1
+    summary: Dict[str, Any] = {
+        "requests": len(records),
+        "ok": len(ok),
+        "error_rate": (len(records) - len(ok)) / len(records) if records else 0.0,
+        "throughput": len(ok) / seconds if seconds else 0.0,
+        "statuses": statuses,
+    }
+    if ok:
+        p50, p95, p99 = np.percentile(ok, [50, 95, 99])
+        summary.update({"p50": p50, "p95": p95, "p99": p99, "max": max(ok)})
+    return summary
+
+
+def timeline(
+    records: List[RequestRecord], samples: List[MemorySample], seconds: float, interval: float
+) -> List[Dict[str, Any]]:
+    # Per interval: the requests started in it and the last memory sample taken in it
+    rows = []
+    for index in range(max(int(np.ceil(seconds / interval)), 1)):
+        start, end = index * interval, (index + 1) * interval
+        row = summarize([record for record in records if start <= record.started < end], interval)
+        in_interval = [sample for sample in samples if start <= sample.seconds < end]
+        if in_interval:
+            row["server_rss"] = in_interval[-1].server_bytes
+            row["workers_rss"] = sum(in_interval[-1].worker_bytes)
+        rows.append({"seconds": start, **row})
+    return rows
+
+
+def in_process_clients(app: Any) -> ClientFactory:
+    def create(index: int) -> httpx.AsyncClient:
+        transport = httpx.ASGITransport(app=app, client=(CLIENT_ADDRESS.format(index // 256, index % 256), 50000))
+        return httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None)
+
+    return create
+
+
+def url_clients(url: str) -> ClientFactory:
+    # The server must trust X-Forwarded-For from the harness (uvicorn --proxy-headers) to see several clients
+    def create(index: int) -> httpx.AsyncClient:
+        headers = {"X-Forwarded-For": CLIENT_ADDRESS.format(index // 256, index % 256)}
+        return httpx.AsyncClient(base_url=url, headers=headers, timeout=None)
+
+    return create
+
+
+@asynccontextmanager
+async def in_process_app(env: Dict[str, str], ready_timeout: float) -> AsyncIterator[Any]:
+    # The settings are read when core.constants is imported, so it must not be imported before
+    if "core.constants" in sys.modules and env:
+        raise RuntimeError("The settings are already imported, the scenario env can't be applied")
+    os.environ.update(env)
+    from core.api.api import app, warm_up_status
+
+    async with app.router.lifespan_context(app):
+        # As /ready: the load starts once the warm-up is over
+        deadline = time.perf_counter() + ready_timeout
+        while warm_up_status.state in ("pending", "running") and time.perf_counter() < deadline:
+            await asyncio.sleep(0.1)
+        yield app
+
+
+@asynccontextmanager
+async def uvicorn_server(env: Dict[str, str], port: int, ready_timeout: float) -> AsyncIterator[Tuple[str, int]]:
+    # A local uvicorn on the backend directory, with the scenario env, ready once /ready answers 200
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable, "-m", "uvicorn", "core.api.api:app", "--host", "127.0.0.1", "--port", str(port)]
+    command += ["--proxy-headers", "--forwarded-allow-ips", "127.0.0.1", "--log-level", "warning"]
+    server = subprocess.Popen(command, cwd=backend_dir, env={**os.environ, **env})
+    url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=url) as client:
+            deadline = time.perf_counter() + ready_timeout
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with {server.returncode}")
+                try:
+                    if (await client.get("/ready")).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.perf_counter() > deadline:
+                    raise RuntimeError(f"uvicorn wasn't ready after {ready_timeout} s")
+                await asyncio.sleep(0.2)
+        yield url, server.pid
+    finally:
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+async def run_target(args: argparse.Namespace, scenario: Scenario) -> Dict[str, Any]:
+    if args.url:
+        records, samples, seconds = await run_load(scenario, url_clients(args.url), args.pid, args.sample_interval)
+    elif args.uvicorn:
+        async with uvicorn_server(scenario.env, args.port or _free_port(), args.ready_timeout) as (url, pid):
+            records, samples, seconds = await run_load(scenario, url_clients(url), pid, args.sample_interval)
+    else:
+        # The harness shares the process with the app: the server RSS includes it
+        async with in_process_app(scenario.env, args.ready_timeout) as app:
+            records, samples, seconds = await run_load(
+                scenario, in_process_clients(app), os.getpid(), args.sample_interval
+            )
+    return {
+        "version": RESULTS_VERSION,
+        "target": args.url or ("uvicorn" if args.uvicorn else "in-process"),
+        "scenario": {
+            **{key: value for key, value in asdict(scenario).items() if key not in ("files", "configs")},
+            "files": [
+                {"label": file.label, "bytes": len(file.data), "weight": file.weight} for file in scenario.files
+            ],
+            "configs": [{"label": config.label, "weight": config.weight} for config in scenario.configs],
+        },
+        "seconds": seconds,
+        "summary": summarize(records, seconds),
+        "by_config": {
+            config.label: summarize([record for record in records if record.config == config.label], seconds)
+            for config in scenario.configs
+        },
+        "timeline": timeline(records, samples, seconds, args.report_interval),
+        "errors": sorted({record.error for record in records if record.error})[:20],
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _format_summary(label: str, summary: Dict[str, Any]) -> str:
+    line = (
+        f"{label:<24}{summary['requests']:>7} req{summary['throughput']:>9.2f} req/s{summary['error_rate']:>8.1%} err"
+    )
+    if "p50" in summary:
+        line += "".join(f"{summary[key] * 1000:>10.0f}" for key in ("p50", "p95", "p99"))
+    return line
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"{'':<24}{'':>11}{'':>15}{'':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    print(_format_summary("all", report["summary"]))
+    for label, summary in report["by_config"].items():
+        print(_format_summary(label, summary))
+    print(f"statuses: {report['summary']['statuses']}")
+    for error in report["errors"]:
+        print(f"error: {error}")
+    print(f"\n{'t':>6}{'req':>6}{'req/s':>8}{'err':>7}{'p95 ms':>9}{'server MiB':>12}{'workers MiB':>13}")
+    for row in report["timeline"]:
+        p95 = f"{row['p95'] * 1000:.0f}" if "p95" in row else "-"
+        server = f"{row['server_rss'] / 2**20:.0f}" if "server_rss" in row else "-"
+        workers = f"{row['workers_rss'] / 2**20:.0f}" if "workers_rss" in row else "-"
+        print(
+            f"{row['seconds']:>6.0f}{row['requests']:>6}{row['throughput']:>8.2f}{row['error_rate']:>7.0%}"
+            f"{p95:>9}{server:>12}{workers:>13}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test /process with the files and configs of a scenario")
+    parser.add_argument("scenario", help="Scenario JSON file, see benchmarks/scenarios")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--uvicorn", action="store_true", help="Start a local uvicorn instead of the in-process app")
+    target.add_argument("--url", help="Load an already running server instead")
+    parser.add_argument("--pid", type=int, help="Server process whose RSS to sample, with --url")
+    parser.add_argument("--port", type=int, help="Port of the local uvicorn, a free one by default")
+    parser.add_argument("--ready-timeout", type=float, default=120.0, help="Seconds to wait for the warm-up")
+    parser.add_argument("--mode", choices=["rate", "concurrency"], help="Overrides the scenario's mode")
+    parser.add_argument("--rate", type=float, help="Overrides the scenario's requests per second")
+    parser.add_argument("--concurrency", type=int, help="Overrides the scenario's concurrency")
+    parser.add_argument("--duration", type=float, help="Overrides the scenario's duration in seconds")
+    parser.add_argument("--env", nargs="*", default=[], metavar="NAME=VALUE", help="Added to the scenario's env")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="Seconds between RSS samples")
+    parser.add_argument("--report-interval", type=float, default=5.0, help="Seconds per timeline row")
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario)
+    for name in ("mode", "rate", "concurrency", "duration"):
+        if getattr(args, name) is not None:
+            setattr(scenario, name, getattr(args, name))
+    scenario.env.update(item.split("=", 1) for item in args.env)
+
+    report = asyncio.run(run_target(args, scenario))
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
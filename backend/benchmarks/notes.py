@@ -0,0 +1,102 @@
+import argparse
+import json
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, List, Tuple
+
+from miditoolkit import MidiFile
+
+from benchmarks.synthetic import SIZES, SyntheticSpec, generate_midi
+from core.service.midi_processing import midi_to_notes
+from core.service.note_table import serialize_note_tables
+from core.service.parsed_score import ParsedScore
+
+
+@dataclass
+class LegacyNote:
+    pitch: int
+    name: str
+    start: int
+    end: int
+    velocity: int
+
+
+def legacy_pitch_to_name(pitch: int) -> str:
+    note_names = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+    octave = pitch // 12 - 1
+    note = note_names[pitch % 12]
+    return f"{note}{octave}"
+
+
+def legacy_midi_to_notes(midi: MidiFile) -> List[List[LegacyNote]]:
+    # What the pipeline did before note tables: a dataclass and a freshly formatted name per note
+    notes = []
+    for instrument in midi.instruments:
+        track_notes = []
+        for note in instrument.notes:
+            note_name = legacy_pitch_to_name(note.pitch)
+            track_notes.append(LegacyNote(note.pitch, note_name, note.start, note.end, note.velocity))
+        notes.append(track_notes)
+    return notes
+
+
+def legacy_serialize(notes: List[List[LegacyNote]]) -> str:
+    return json.dumps([[note.__dict__ for note in track_notes] for track_notes in notes], separators=(",", ":"))
+
+
+def best_time(function: Callable[[], Any], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def traced(function: Callable[[], Any]) -> Tuple[Any, int, int]:
+    # The result, the memory it holds on to and the peak while it ran
+    tracemalloc.start()
+    try:
+        result = function()
+        held, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, held, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare note tables with the legacy per-note dataclasses")
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=["medium", "large"])
+    parser.add_argument("--notes", type=int, help="Also run a synthetic file with this many notes")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    specs = [(size, SIZES[size]) for size in args.sizes]
+    if args.notes:
+        specs.append((f"{args.notes}", SyntheticSpec(notes=args.notes, tracks=8)))
+    print(f"best of {args.repeat} runs, memory from tracemalloc")
+    print(f"{'size':<10}{'notes':>9}{'':>8}{'build ms':>10}{'json ms':>10}{'held MiB':>10}{'peak MiB':>10}")
+    for name, spec in specs:
+        midi = ParsedScore.from_bytes(generate_midi(spec)).midi
+        count = sum(len(instrument.notes) for instrument in midi.instruments)
+        implementations: List[Tuple[str, Callable[[], Any], Callable[[Any], str]]] = [
+            ("legacy", lambda: legacy_midi_to_notes(midi), legacy_serialize),
+            ("table", lambda: midi_to_notes(midi), serialize_note_tables),
+        ]
+        serialized = []
+        for label, build, serialize in implementations:
+            # Held: the notes of the file, peak: building and serializing them
+            notes, held, _ = traced(build)
+            _, _, peak = traced(lambda: serialize(build()))
+            serialized.append(serialize(notes))
+            print(
+                f"{name:<10}{count:>9}{label:>8}{best_time(build, args.repeat) * 1000:>10.2f}"
+                f"{best_time(lambda: serialize(notes), args.repeat) * 1000:>10.2f}"
+                f"{held / 2**20:>10.2f}{peak / 2**20:>10.2f}"
+            )
+        assert serialized[0] == serialized[1]
+
+
+if __name__ == "__main__":
+    main()
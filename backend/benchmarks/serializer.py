@@ -0,0 +1,60 @@
+import argparse
+import json
+import os
+import time
+from typing import Any, Callable, Dict
+
+from starlette.responses import JSONResponse
+
+from core.api.model import ConfigModel
+from core.constants import DEFAULT_CONFIG, ROOT_DIR
+from core.service.midi_processing import tokenize_midi_file
+from core.service.parsed_score import ParsedScore
+from core.service.serializer import TokSequenceEncoder, serialize_tokens
+
+DEFAULT_MIDI_FILE_PATH = os.path.join(ROOT_DIR, "..", "..", "example_files", "bethlem2.mid")
+TOKENIZERS = ["REMI", "MIDILike", "TSD", "Structured", "CPWord", "Octuple"]
+# The frontend's defaults, run with every tokenizer
+BENCHMARK_CONFIG: Dict[str, Any] = {key: value for key, value in DEFAULT_CONFIG.items() if key != "tokenizer"}
+
+
+def best_time(function: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the legacy token serialization with TokenWriter")
+    parser.add_argument("path", nargs="?", default=DEFAULT_MIDI_FILE_PATH)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    score = ParsedScore.from_file(args.path)
+    print(f"{os.path.basename(args.path)}, best of {args.repeat} runs")
+    print(f"{'tokenizer':<12}{'events':>10}{'legacy ms':>12}{'writer ms':>12}{'speedup':>10}")
+    for tokenizer in TOKENIZERS:
+        tokens, _, _ = tokenize_midi_file(ConfigModel(**{**BENCHMARK_CONFIG, "tokenizer": tokenizer}), score)
+        n_events = sum(len(sequence.events) for sequence in tokens)
+
+        # What /process used to do: dumps with the encoder, loads it back, and JSONResponse dumps it again
+        def legacy() -> bytes:
+            return JSONResponse(json.loads(json.dumps(tokens, cls=TokSequenceEncoder))).body
+
+        def writer() -> bytes:
+            return serialize_tokens(tokens).encode()
+
+        assert json.loads(legacy()) == json.loads(writer())
+        legacy_time = best_time(legacy, args.repeat)
+        writer_time = best_time(writer, args.repeat)
+        print(
+            f"{tokenizer:<12}{n_events:>10}{legacy_time * 1000:>12.2f}{writer_time * 1000:>12.2f}"
+            f"{legacy_time / writer_time:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
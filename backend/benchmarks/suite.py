@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, get_args
+
+# /process runs on the benchmark's own thread, so its timings don't include process pool overhead
+os.environ.setdefault("PROCESSING_BACKEND", "inline")
+os.environ.setdefault("RESULT_CACHE_DIR", "")
+
+import miditok
+import numpy as np
+
+from benchmarks.baseline import compare
+from benchmarks.serializer import BENCHMARK_CONFIG
+from benchmarks.synthetic import SIZES, generate_midi
+from core.api.model import ConfigModel
+from core.service.midi_processing import retrieve_information_from_midi, tokenize_midi_file
+from core.service.parsed_score import ParsedScore
+
+if TYPE_CHECKING:
+    from fastapi.testclient import TestClient
+
+TOKENIZERS = list(get_args(ConfigModel.model_fields["tokenizer"].annotation))
+RESULTS_VERSION = 1
+
+
+@dataclass
+class CaseResult:
+    case: str
+    size: str
+    notes: int
+    file_bytes: int
+    repeat: int
+    best_seconds: float
+    median_seconds: float
+    notes_per_second: float
+    peak_memory_bytes: int
+    error: Optional[str] = None
+
+
+def measure(case: str, size: str, notes: int, file_bytes: int, function: Callable[[], Any], repeat: int) -> CaseResult:
+    try:
+        # The first call builds and caches tokenizers, it is not part of the measures
+        function()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        # Tracing slows everything down, so memory is measured on a run of its own
+        tracemalloc.start()
+        try:
+            function()
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    except Exception as e:
+        return CaseResult(case, size, notes, file_bytes, repeat, 0.0, 0.0, 0.0, 0, error=str(e) or type(e).__name__)
+    median = statistics.median(timings)
+    return CaseResult(case, size, notes, file_bytes, repeat, min(timings), median, notes / median, peak_memory)
+
+
+def run_suite(sizes: List[str], tokenizers: List[str], process_tokenizers: List[str], repeat: int) -> List[CaseResult]:
+    results = []
+    for size in sizes:
+        midi_bytes = generate_midi(SIZES[size])
+        score = ParsedScore.from_bytes(midi_bytes)
+        notes = sum(len(instrument.notes) for instrument in score.midi.instruments)
+
+        def run(case: str, function: Callable[[], Any]) -> None:
+            result = measure(case, size, notes, len(midi_bytes), function, repeat)
+            results.append(result)
+            print(_format_result(result), flush=True)
+
+        for tokenizer in tokenizers:
+            config = ConfigModel(**{**BENCHMARK_CONFIG, "tokenizer": tokenizer})
+            run(f"tokenize:{tokenizer}", lambda: tokenize_midi_file(config, score))
+        run("parse", lambda: ParsedScore.from_bytes(midi_bytes))
+        run("info", lambda: retrieve_information_from_midi(score))
+        if process_tokenizers:
+            # The whole /process request in-process: multipart parsing, the pipeline and the response
+            from fastapi.testclient import TestClient
+
+            from core.api.api import app
+
+            with TestClient(app) as client:
+                for tokenizer in process_tokenizers:
+                    run(f"process:{tokenizer}", partial(post_process, client, midi_bytes, tokenizer))
+    return results
+
+
+def post_process(client: "TestClient", midi_bytes: bytes, tokenizer: str) -> None:
+    from core.service.result_cache import result_cache
+
+    # Every run does the whole work, not a cache lookup
+    result_cache.clear()
+    config = json.dumps({"tokenizer": tokenizer, **BENCHMARK_CONFIG})
+    response = client.post(
+        "/process", files={"file": ("synthetic.mid", midi_bytes, "audio/midi")}, data={"config": config}
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"/process answered {response.status_code}: {response.text[:200]}")
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "miditok": miditok.__version__,
+    }
+
+
+def _format_result(result: CaseResult) -> str:
+    if result.error:
+        return f"{result.size:<8}{result.case:<22}error: {result.error}"
+    return (
+        f"{result.size:<8}{result.case:<22}{result.median_seconds * 1000:>10.2f} ms"
+        f"{result.notes_per_second:>14,.0f} notes/s{result.peak_memory_bytes / 2**20:>10.1f} MiB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Throughput and peak memory of the pipeline on synthetic MIDI files")
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=["small", "medium"])
+    parser.add_argument("--tokenizers", nargs="+", choices=TOKENIZERS, default=TOKENIZERS)
+    parser.add_argument(
+        "--process-tokenizers", nargs="*", choices=TOKENIZERS, default=["REMI"], help="Tokenizers run through /process"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with the results in this JSON file, exit with 1 on regressions")
+    parser.add_argument("--current", help="Compare these stored results with the baseline instead of running")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="Allowed growth before a regression, 0.25 = 25%%"
+    )
+    args = parser.parse_args()
+
+    if args.current:
+        with open(args.current) as file:
+            report = json.load(file)
+    else:
+        results = run_suite(args.sizes, args.tokenizers, args.process_tokenizers, args.repeat)
+        report = {
+            "version": RESULTS_VERSION,
+            "environment": environment(),
+            "sizes": {size: asdict(SIZES[size]) for size in args.sizes},
+            "results": [asdict(result) for result in results],
+        }
+    if args.output and not args.current:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, report, args.tolerance)
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression.size} {regression.case} {regression.measure}: "
+                f"{regression.baseline:.6g} -> {regression.current:.6g} ({regression.change:+.0%})"
+            )
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
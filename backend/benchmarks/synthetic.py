@@ -0,0 +1,133 @@
+import argparse
+import random
+from dataclasses import dataclass, replace
+from io import BytesIO
+from typing import List, Sequence, Tuple
+
+from mido import Message, MetaMessage, MidiFile, MidiTrack, bpm2tempo
+
+DRUM_CHANNEL = 9
+# Kick, snare, closed and open hi-hat, toms, crash, ride
+DRUM_PITCHES = [36, 38, 42, 46, 45, 48, 49, 51]
+TIME_SIGNATURES = [(4, 4), (3, 4), (6, 8), (2, 4), (5, 4)]
+
+
+@dataclass(frozen=True)
+class SyntheticSpec:
+    # `notes` are spread evenly over the pitched tracks, the drum track (if any) gets `drum_notes` more.
+    # The same spec and seed always give the same bytes.
+    notes: int = 1000
+    tracks: int = 2
+    drum_notes: int = 0
+    tempo_changes: int = 1
+    time_signature_changes: int = 1
+    ticks_per_beat: int = 480
+    seed: int = 0
+
+
+# Named sizes used by the benchmark suite
+SIZES = {
+    "small": SyntheticSpec(notes=500, tracks=2, drum_notes=100, tempo_changes=2, time_signature_changes=1),
+    "medium": SyntheticSpec(notes=5000, tracks=4, drum_notes=1000, tempo_changes=8, time_signature_changes=4),
+    "large": SyntheticSpec(notes=25000, tracks=8, drum_notes=5000, tempo_changes=32, time_signature_changes=8),
+}
+
+
+def generate_midi(spec: SyntheticSpec) -> bytes:
+    rng = random.Random(spec.seed)
+    midi = MidiFile(type=1, ticks_per_beat=spec.ticks_per_beat)
+    beat = spec.ticks_per_beat
+    grid = max(beat // 4, 1)
+    # Roughly two notes per beat and track, so longer files come from more notes, not sparser ones
+    length = max(spec.notes // max(spec.tracks, 1), spec.drum_notes, 1) * beat // 2
+
+    conductor = MidiTrack()
+    conductor.append(MetaMessage("track_name", name=f"synthetic {spec.notes} notes", time=0))
+    meta_events: List[Tuple[int, MetaMessage]] = []
+    for index in range(max(spec.tempo_changes, 1)):
+        time = 0 if index == 0 else rng.randrange(0, length, beat)
+        meta_events.append((time, MetaMessage("set_tempo", tempo=bpm2tempo(rng.randint(60, 180)))))
+    for index in range(spec.time_signature_changes):
+        time = 0 if index == 0 else rng.randrange(0, length, beat * 4)
+        numerator, denominator = rng.choice(TIME_SIGNATURES)
+        meta_events.append((time, MetaMessage("time_signature", numerator=numerator, denominator=denominator)))
+    meta_events.append((0, MetaMessage("key_signature", key=rng.choice(["C", "G", "F", "Am", "Em", "Bb"]))))
+    conductor.extend(_to_delta(meta_events))
+    midi.tracks.append(conductor)
+
+    for index in range(spec.tracks):
+        count = spec.notes // spec.tracks + (1 if index < spec.notes % spec.tracks else 0)
+        channel = index % 15 + (1 if index % 15 >= DRUM_CHANNEL else 0)
+        program = rng.randrange(0, 128)
+        low = rng.randint(28, 72)
+        pitches = range(low, low + 24)
+        midi.tracks.append(_note_track(rng, count, length, grid, channel, program, pitches, f"track {index}"))
+    if spec.drum_notes:
+        midi.tracks.append(_note_track(rng, spec.drum_notes, length, grid, DRUM_CHANNEL, 0, DRUM_PITCHES, "drums"))
+
+    output = BytesIO()
+    midi.save(file=output)
+    return output.getvalue()
+
+
+def _note_track(
+    rng: random.Random,
+    count: int,
+    length: int,
+    grid: int,
+    channel: int,
+    program: int,
+    pitches: Sequence[int],
+    name: str,
+) -> MidiTrack:
+    events: List[Tuple[int, Message]] = [(0, Message("program_change", channel=channel, program=program))]
+    for _ in range(count):
+        # Onsets mostly on a 16th note grid, some off it, and overlapping notes make chords
+        start = rng.randrange(0, length) if rng.random() < 0.1 else rng.randrange(0, length, grid)
+        duration = grid * rng.choice([1, 2, 4, 8, 16]) + (rng.randrange(0, grid) if rng.random() < 0.1 else 0)
+        pitch = rng.choice(pitches)
+        velocity = rng.randint(20, 127)
+        events.append((start, Message("note_on", channel=channel, note=pitch, velocity=velocity)))
+        events.append((start + duration, Message("note_off", channel=channel, note=pitch, velocity=0)))
+    track = MidiTrack()
+    track.append(MetaMessage("track_name", name=name, time=0))
+    track.extend(_to_delta(events))
+    return track
+
+
+def _to_delta(events: List[Tuple[int, Message]]) -> List[Message]:
+    # Note offs sort before note ons at the same tick, so repeated notes don't cut each other
+    events = sorted(events, key=lambda event: (event[0], event[1].type != "note_off"))
+    messages = []
+    previous = 0
+    for time, message in events:
+        messages.append(message.copy(time=time - previous))
+        previous = time
+    return messages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write a synthetic MIDI file")
+    parser.add_argument("path")
+    parser.add_argument("--size", choices=SIZES, help="Start from a named size, other options override it")
+    parser.add_argument("--notes", type=int)
+    parser.add_argument("--tracks", type=int)
+    parser.add_argument("--drum-notes", type=int)
+    parser.add_argument("--tempo-changes", type=int)
+    parser.add_argument("--time-signature-changes", type=int)
+    parser.add_argument("--ticks-per-beat", type=int)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    spec = SIZES[args.size] if args.size else SyntheticSpec()
+    overrides = {
+        name: value for name, value in vars(args).items() if name not in ("path", "size") and value is not None
+    }
+    spec = replace(spec, **overrides)
+    with open(args.path, "wb") as file:
+        file.write(generate_midi(spec))
+    print(f"Wrote {args.path}: {spec}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import asyncio
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Iterable, Tuple
+
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from core.api.logging_middleware import client_ip
+
+# Token buckets of clients that are back to a full bucket are dropped past this many clients
+MAX_TRACKED_CLIENTS = 10000
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: int) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+@dataclass
+class AdmissionStats:
+    # Counters since startup: admitted right away or after waiting (queued), and rejected by the token
+    # bucket (rate_limited), because too many requests were waiting (queue_full) or after max_wait (timed_out)
+    admitted: int
+    queued: int
+    rate_limited: int
+    queue_full: int
+    timed_out: int
+    in_flight: int
+    waiting: int
+    clients: int
+    max_in_flight: int
+    max_per_client: int
+
+
+@dataclass
+class _TokenBucket:
+    tokens: float
+    updated: float
+
+
+class AdmissionController:
+    # At most max_in_flight admitted requests, max_per_client of them from the same client, and per client a
+    # token bucket of `burst` requests refilled at `rate` per second (rate 0 disables it). Requests over the
+    # concurrency limits wait in arrival order, up to max_wait seconds. A freed slot is handed right away to
+    # the first waiter whose client is under its limit, so one client's backlog doesn't hold up the others.
+    # All methods run on the event loop.
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_per_client: int,
+        rate: float,
+        burst: int,
+        max_wait: float,
+        max_queued: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_per_client = max_per_client
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.max_queued = max_queued
+        self._clock = clock
+        self._in_flight = 0
+        self._per_client: Dict[str, int] = {}
+        self._waiters: Deque[Tuple[str, "asyncio.Future[None]"]] = deque()
+        self._buckets: Dict[str, _TokenBucket] = {}
+        self._admitted = 0
+        self._queued = 0
+        self._rate_limited = 0
+        self._queue_full = 0
+        self._timed_out = 0
+
+    async def acquire(self, client: str) -> None:
+        # Returns once the request may run, release() must then be called when it is done
+        self._take_token(client)
+        if self._can_run(client):
+            self._admit(client)
+            return
+        if len(self._waiters) >= self.max_queued:
+            self._queue_full += 1
+            raise AdmissionRejected(503, "Server is busy, try again later", 1)
+
+        waiter = (client, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        self._queued += 1
+        try:
+            await asyncio.wait([waiter[1]], timeout=self.max_wait)
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        if not waiter[1].done():
+            self._waiters.remove(waiter)
+            self._timed_out += 1
+            if self._per_client.get(client, 0) >= self.max_per_client:
+                raise AdmissionRejected(429, "Too many concurrent requests from this client", 1)
+            raise AdmissionRejected(503, "Server is busy, try again later", 1)
+
+    def release(self, client: str) -> None:
+        self._in_flight -= 1
+        self._per_client[client] -= 1
+        if not self._per_client[client]:
+            del self._per_client[client]
+        for waiter in list(self._waiters):
+            if self._in_flight >= self.max_in_flight:
+                break
+            waiting_client, future = waiter
+            if self._per_client.get(waiting_client, 0) < self.max_per_client:
+                self._waiters.remove(waiter)
+                self._admit(waiting_client)
+                future.set_result(None)
+
+    def stats(self) -> AdmissionStats:
+        return AdmissionStats(
+            admitted=self._admitted,
+            queued=self._queued,
+            rate_limited=self._rate_limited,
+            queue_full=self._queue_full,
+            timed_out=self._timed_out,
+            in_flight=self._in_flight,
+            waiting=len(self._waiters),
+            clients=len(self._per_client),
+            max_in_flight=self.max_in_flight,
+            max_per_client=self.max_per_client,
+        )
+
+    def _can_run(self, client: str) -> bool:
+        return self._in_flight < self.max_in_flight and self._per_client.get(client, 0) < self.max_per_client
+
+    def _admit(self, client: str) -> None:
+        self._in_flight += 1
+        self._per_client[client] = self._per_client.get(client, 0) + 1
+        self._admitted += 1
+
+    def _abandon(self, waiter: Tuple[str, "asyncio.Future[None]"]) -> None:
+        # The waiting request was cancelled (client gone, shutdown): give its slot back if it was handed one
+        if waiter[1].done():
+            self.release(waiter[0])
+        else:
+            self._waiters.remove(waiter)
+
+    def _take_token(self, client: str) -> None:
+        if self.rate <= 0:
+            return
+        now = self._clock()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_CLIENTS:
+                self._drop_full_buckets(now)
+            bucket = self._buckets[client] = _TokenBucket(self.burst, now)
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+        if bucket.tokens < 1:
+            self._rate_limited += 1
+            raise AdmissionRejected(429, "Too many requests", math.ceil((1 - bucket.tokens) / self.rate))
+        bucket.tokens -= 1
+
+    def _drop_full_buckets(self, now: float) -> None:
+        for client, bucket in list(self._buckets.items()):
+            if bucket.tokens + (now - bucket.updated) * self.rate >= self.burst:
+                del self._buckets[client]
+
+
+class AdmissionMiddleware:
+    # Admission control for POST requests to the CPU-heavy paths. A request holds its slot until its response
+    # is fully sent (streamed responses included), and a waiting one hasn't had its body read yet.
+    def __init__(self, app: ASGIApp, *, controller: AdmissionController, paths: Iterable[str]) -> None:
+        self.app = app
+        self.controller = controller
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        client = client_ip(scope) or "unknown"
+        try:
+            await self.controller.acquire(client)
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                content={"success": False, "data": None, "error": e.detail},
+                status_code=e.status_code,
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(client)
@@ -1,20 +1,174 @@
+import asyncio
 import json
 import logging.config
-from typing import List
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, List, Optional, Set, Tuple
 
-from fastapi import Body, FastAPI, File, HTTPException, UploadFile
+from fastapi import Body, FastAPI, File, Form, HTTPException, Query, Request, UploadFile
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
-from core.api.logging_middleware import LoggingMiddleware, log_config
-from core.api.model import ConfigModel, MusicInformationData
-from core.service.midi_processing import retrieve_information_from_midi, tokenize_midi_file
-from core.service.serializer import TokSequenceEncoder
+from core.api.admission import AdmissionController, AdmissionMiddleware
+from core.api.forwarded import ForwardedClientMiddleware
+from core.api.logging_middleware import LoggingMiddleware, QueueLogging, log_config
+from core.api.model import ConfigModel
+from core.api.negotiation import MEDIA_TYPES, negotiate_format
+from core.api.uploads import BodySizeLimitMiddleware, read_midi_body, read_midi_upload
+from core.constants import (
+    ADMISSION_BURST,
+    ADMISSION_MAX_IN_FLIGHT,
+    ADMISSION_MAX_PER_CLIENT,
+    ADMISSION_MAX_QUEUED,
+    ADMISSION_MAX_WAIT,
+    ADMISSION_RATE,
+    BATCH_MAX_ITEMS,
+    FORWARDED_TRUSTED_HOPS,
+    JOB_TIMEOUT,
+    MAX_REQUEST_BYTES,
+    PRESETS_FILE,
+    PROCESSING_BACKEND,
+    PROCESSING_QUEUE_SIZE,
+    PROCESSING_TIMEOUT,
+    PROCESSING_WORKERS,
+    STARTUP_WARM_UP,
+)
+from core.service.executor import ExecutorQueueFullError, ExecutorTimeoutError, ProcessingExecutor
+from core.service.jobs import Job, job_store
+from core.service.piano_roll import PianoRollTooLargeError, piano_roll_window, unpack_piano_roll
+from core.service.presets import PresetStoreFullError, create_preset, preset_store, read_presets_file
+from core.service.record_relay import RecordStream
+from core.service.relay import shutdown_manager
+from core.service.result_cache import file_digest, metrics_key, piano_roll_key, result_cache, result_key, vocab_key
+from core.service.timing import ProgressListener, StageTimer, stage_histograms
+from core.service.tokenizers.tokenizer_cache import canonical_config_key
+from core.service.vocab import etag_matches, vocab_etag
+from core.service.warm_up import (
+    WarmUpStatus,
+    import_api_pipeline,
+    warm_up_pipeline,
+    warm_up_tokenizers,
+    warm_up_worker,
+    worker_status,
+)
+
+# The processing pipeline (miditok, muspy, miditoolkit...) takes seconds to import. It is imported where it is
+# used, so the server listens right away and the startup warm-up imports it in the background (see /ready).
+if TYPE_CHECKING:
+    from core.service.midi_processing import BatchResult, PianoRollResult, ProcessingResult, VocabResult
+    from core.service.sessions import SessionData
 
 logging.config.dictConfig(log_config)
+queue_logging = QueueLogging(log_config["loggers"])
+
+processing_executor = ProcessingExecutor(
+    PROCESSING_BACKEND,  # type: ignore[arg-type]
+    workers=PROCESSING_WORKERS,
+    max_queue=PROCESSING_QUEUE_SIZE,
+    timeout=PROCESSING_TIMEOUT,
+    initializer=warm_up_worker if PROCESSING_BACKEND == "process" else warm_up_tokenizers,
+)
+
+
+admission_controller = AdmissionController(
+    max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+    max_per_client=ADMISSION_MAX_PER_CLIENT,
+    rate=ADMISSION_RATE,
+    burst=ADMISSION_BURST,
+    max_wait=ADMISSION_MAX_WAIT,
+    max_queued=ADMISSION_MAX_QUEUED,
+)
+# The endpoints running files through the processing workers. /jobs has its own limits (JOB_MAX_PENDING).
+ADMISSION_PATHS = ["/process", "/process/batch", "/process/stream", "/piano-roll"]
+
+warm_up_status = WarmUpStatus()
+# Seconds between rounds of worker_status jobs while some processing workers are still warming up
+WARM_UP_POLL_INTERVAL = 0.1
+# References to the running jobs' tasks, the event loop only keeps weak ones
+job_tasks: Set["asyncio.Task[None]"] = set()
+# The same for the tasks stopping the relays of finished /process/stream responses
+stream_tasks: Set["asyncio.Task[None]"] = set()
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Seconds between keepalive comments on idle job event streams
+JOB_KEEPALIVE = 15.0
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    queue_logging.start()
+    processing_executor.start()
+    if PRESETS_FILE:
+        # Before serving, so requests naming a preset of the file find it. Computing their keys imports the
+        # pipeline, the startup only waits for it when there is a presets file.
+        for preset in await run_in_threadpool(read_presets_file, PRESETS_FILE):
+            preset_store.add(preset)
+    warm_up_status.state, warm_up_status.seconds, warm_up_status.error = "pending", None, None
+    warm_up_task = asyncio.create_task(_warm_up()) if STARTUP_WARM_UP else None
+    if warm_up_task is None:
+        warm_up_status.state = "skipped"
+    yield
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+    for task in list(job_tasks):
+        task.cancel()
+    processing_executor.shutdown()
+    for task in list(stream_tasks):
+        task.cancel()
+    job_store.close()
+    shutdown_manager()
+    queue_logging.stop()
+
+
+async def _warm_up() -> None:
+    # Imports the pipeline here while the processing workers warm themselves up, and the server already
+    # answers (and /ready says it isn't ready)
+    logger = logging.getLogger(__name__)
+    warm_up_status.state = "running"
+    start_time = time.perf_counter()
+    try:
+        import_seconds = await run_in_threadpool(import_api_pipeline)
+        logger.info({"warm_up": "imported", "seconds": round(import_seconds, 3)})
+        if processing_executor.backend == "process":
+            await _wait_for_warm_workers()
+        else:
+            # Threads share one pipeline, and their initializer only warmed up the tokenizer cache
+            await processing_executor.run(warm_up_pipeline, preset_store.pins())
+    except Exception as e:
+        logger.exception({"warm_up": "failed", "reason": e})
+        warm_up_status.state, warm_up_status.error = "failed", str(e) or type(e).__name__
+    else:
+        warm_up_status.state = "done"
+    warm_up_status.seconds = time.perf_counter() - start_time
+    logger.info({"warm_up": warm_up_status.state, "seconds": round(warm_up_status.seconds, 3)})
+
+
+async def _wait_for_warm_workers() -> None:
+    # Every worker process runs the pipeline warm-up in its initializer (warm_up_worker). Jobs reporting
+    # their worker are run until each worker answered, so the warm-up is over on all of them.
+    warm_workers: Set[int] = set()
+    while True:
+        statuses = await asyncio.gather(
+            *(processing_executor.run(worker_status) for _ in range(processing_executor.workers))
+        )
+        for pid, error in statuses:
+            if error is not None:
+                raise RuntimeError(f"Warm-up of worker {pid} failed: {error}")
+            warm_workers.add(pid)
+        if len(warm_workers) >= processing_executor.workers:
+            return
+        await asyncio.sleep(WARM_UP_POLL_INTERVAL)
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Innermost, so its 413s still get the CORS headers and are logged
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=MAX_REQUEST_BYTES)
+
+# Waiting requests haven't had their body read, rejected ones get the CORS headers and are logged
+app.add_middleware(AdmissionMiddleware, controller=admission_controller, paths=ADMISSION_PATHS)
 
 origins = ["http://localhost:3000", "https://wimu-frontend-ccb0bbc023d3.herokuapp.com"]
 
@@ -24,6 +178,9 @@ app.add_middleware(
 
 app.add_middleware(LoggingMiddleware, logger=logging.getLogger(__name__))
 
+# Outermost, so the logs and admission control see the client the proxies saw
+app.add_middleware(ForwardedClientMiddleware, trusted_hops=FORWARDED_TRUSTED_HOPS)
+
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request, exc):
@@ -33,29 +190,783 @@ async def validation_exception_handler(request, exc):
 
 
 @app.post("/process")
-async def process(config: ConfigModel = Body(...), file: UploadFile = File(...)) -> JSONResponse:
-    try:
-        if file.content_type not in ["audio/mid", "audio/midi", "audio/x-mid", "audio/x-midi"]:
-            raise HTTPException(status_code=415, detail="Unsupported file type")
-        midi_bytes: bytes = await file.read()
-        tokens, notes = tokenize_midi_file(config, midi_bytes)
-        serialized_tokens = json.dumps(tokens, cls=TokSequenceEncoder)
-        serialized_notes = [[note.__dict__ for note in track_notes] for track_notes in notes]
-        metrics: MusicInformationData = retrieve_information_from_midi(midi_bytes)
+async def process(
+    request: Request,
+    config: Optional[ConfigModel] = Body(None),
+    file: Optional[UploadFile] = File(None),
+    response_format: Optional[str] = Query(None, alias="format"),
+    session: bool = Query(False),
+    preset: Optional[str] = Query(None),
+) -> Response:
+    start_time = time.perf_counter()
+    timer = StageTimer()
+    try:
+        config, preset_key = _resolve_config(config, preset)
+        wire_format = negotiate_format(response_format, request.headers.get("accept"))
+        if session and wire_format != "json":
+            raise HTTPException(status_code=400, detail="Sessions are only available as JSON")
+        with timer.stage("read"):
+            midi_bytes = await _read_file(request, file)
+        if session:
+            return await _create_session(config, midi_bytes, timer, start_time)
+
+        content = await _process_content(config, midi_bytes, wire_format, timer, preset_key=preset_key)
+        timer.add("total", time.perf_counter() - start_time)
+        stage_histograms.observe(timer, config.tokenizer, len(midi_bytes))
+        return Response(
+            content=content, media_type=MEDIA_TYPES[wire_format], headers={"Server-Timing": timer.server_timing()}
+        )
+    except HTTPException as e:
         return JSONResponse(
-            content={
-                "success": True,
-                "data": {
-                    "tokens": json.loads(serialized_tokens),
-                    "notes": serialized_notes,
-                    "metrics": json.loads(metrics.model_dump_json())
-                },
-                "error": None,
-            }
+            content={"success": False, "data": None, "error": str(e.detail)},
+            status_code=e.status_code,
+            headers=e.headers,
         )
+    except Exception as e:
+        return JSONResponse(content={"success": False, "data": None, "error": str(e)}, status_code=500)
+
+
+async def _process_content(
+    config: ConfigModel,
+    midi_bytes: bytes,
+    wire_format: str,
+    timer: StageTimer,
+    progress: Optional[ProgressListener] = None,
+    timeout: Optional[float] = None,
+    preset_key: Optional[str] = None,
+) -> bytes:
+    # The /process response body, from the result cache or the processing executor. preset_key is the
+    # canonical config key of the preset the config comes from, if any.
+    from core.service.midi_processing import create_tokenizer_config, process_midi_file
+    from core.service.serializer import serialize_packed_process_response, serialize_process_response
+
+    with timer.stage("cache"):
+        digest = file_digest(midi_bytes)
+        if preset_key is not None:
+            config_key = preset_key
+        else:
+            config_key = canonical_config_key(config.tokenizer, create_tokenizer_config(config))
+        tokens_key = result_key(digest, config_key, wire_format)
+        tokens_and_notes = await run_in_threadpool(result_cache.get, tokens_key)
+        metrics = await run_in_threadpool(result_cache.get, metrics_key(digest))
+
+    if tokens_and_notes is None or metrics is None:
+        try:
+            result: ProcessingResult = await _run_timed(
+                timer,
+                process_midi_file,
+                config,
+                midi_bytes,
+                tokens_and_notes is None,
+                metrics is None,
+                wire_format,
+                progress,
+                preset_key,
+                timeout=timeout,
+            )
+        except ExecutorQueueFullError:
+            raise HTTPException(
+                status_code=503, detail="Server is busy, try again later", headers={"Retry-After": "1"}
+            )
+        except ExecutorTimeoutError:
+            raise HTTPException(status_code=504, detail="Processing took too long")
+        if result.tokens_and_notes is not None:
+            tokens_and_notes = result.tokens_and_notes
+            await run_in_threadpool(result_cache.set, tokens_key, tokens_and_notes)
+        if result.metrics is not None:
+            metrics = result.metrics
+            await run_in_threadpool(result_cache.set, metrics_key(digest), metrics)
+
+    assert tokens_and_notes is not None and metrics is not None
+    with timer.stage("serialize"):
+        if wire_format == "msgpack":
+            return serialize_packed_process_response(tokens_and_notes, metrics)
+        return serialize_process_response(tokens_and_notes, metrics)
+
+
+async def _read_file(request: Request, file: Optional[UploadFile]) -> bytes:
+    # The file of the form, or with a preset the file alone as the body, which is checked as it streams in
+    if file is not None:
+        return await read_midi_upload(file)
+    if request.headers.get("content-type", "").startswith(("multipart/", "application/x-www-form-urlencoded")):
+        # A form without its file
+        raise HTTPException(status_code=422, detail="Invalid request parameters")
+    return await read_midi_body(request)
+
+
+def _resolve_config(config: Optional[ConfigModel], preset_id: Optional[str]) -> Tuple[ConfigModel, Optional[str]]:
+    # Requests send either a config or the id of a preset, and then get its config and canonical key
+    if preset_id is None:
+        if config is None:
+            raise HTTPException(status_code=422, detail="Invalid request parameters")
+        return config, None
+    if config is not None:
+        raise HTTPException(status_code=422, detail="Send either a config or a preset, not both")
+    preset = preset_store.get(preset_id)
+    if preset is None:
+        raise HTTPException(status_code=404, detail="Preset not found")
+    return preset.config, preset.config_key
+
+
+async def _create_session(config: ConfigModel, midi_bytes: bytes, timer: StageTimer, start_time: float) -> Response:
+    # The result stays on the server, the response only has the metrics and the size of every track
+    from core.service.midi_processing import process_midi_session
+    from core.service.sessions import serialize_session, session_store
+
+    with timer.stage("cache"):
+        digest = file_digest(midi_bytes)
+        metrics = await run_in_threadpool(result_cache.get, metrics_key(digest))
+    try:
+        data: SessionData = await _run_timed(timer, process_midi_session, config, midi_bytes, metrics is None)
+    except ExecutorQueueFullError:
+        raise HTTPException(status_code=503, detail="Server is busy, try again later", headers={"Retry-After": "1"})
+    except ExecutorTimeoutError:
+        raise HTTPException(status_code=504, detail="Processing took too long")
+    if data.metrics is None:
+        data.metrics = metrics
+    else:
+        await run_in_threadpool(result_cache.set, metrics_key(digest), data.metrics)
+
+    session_id = session_store.add(data)
+    if session_id is None:
+        raise HTTPException(status_code=413, detail="The result is too large to be kept in a session")
+    timer.add("total", time.perf_counter() - start_time)
+    stage_histograms.observe(timer, config.tokenizer, len(midi_bytes))
+    return Response(
+        content=serialize_session(session_id, data, session_store.ttl),
+        media_type=MEDIA_TYPES["json"],
+        headers={"Server-Timing": timer.server_timing()},
+    )
+
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str) -> Response:
+    from core.service.sessions import serialize_session, session_store
+
+    data = session_store.get(session_id)
+    if data is None:
+        return _session_not_found()
+    return Response(content=serialize_session(session_id, data, session_store.ttl), media_type=MEDIA_TYPES["json"])
+
+
+@app.get("/sessions/{session_id}/tokens")
+async def get_session_tokens(
+    session_id: str,
+    track: int = Query(0, ge=0),
+    start_tick: Optional[int] = Query(None, ge=0),
+    end_tick: Optional[int] = Query(None, ge=0),
+) -> Response:
+    # `track` is the token stream, the only one (0) for tokenizers making a single stream for all tracks
+    from core.service.sessions import serialize_token_window, session_store
+
+    data = session_store.get(session_id)
+    if data is None:
+        return _session_not_found()
+    if track >= len(data.streams):
+        return _session_error(f"Track {track} has no tokens", 400)
+    start, end = data.streams[track].window(start_tick, end_tick)
+    return Response(
+        content=serialize_token_window(track, data.streams[track], start, end), media_type=MEDIA_TYPES["json"]
+    )
+
+
+@app.get("/sessions/{session_id}/notes")
+async def get_session_notes(
+    session_id: str,
+    track: int = Query(0, ge=0),
+    start_tick: Optional[int] = Query(None, ge=0),
+    end_tick: Optional[int] = Query(None, ge=0),
+) -> Response:
+    from core.service.sessions import serialize_note_window, session_store
+
+    data = session_store.get(session_id)
+    if data is None:
+        return _session_not_found()
+    if track >= len(data.tracks):
+        return _session_error(f"Track {track} does not exist", 400)
+    indexes = data.tracks[track].window(start_tick, end_tick)
+    return Response(content=serialize_note_window(track, data.tracks[track], indexes), media_type=MEDIA_TYPES["json"])
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str) -> JSONResponse:
+    from core.service.sessions import session_store
+
+    if not session_store.delete(session_id):
+        return _session_not_found()
+    return JSONResponse(content={"success": True, "data": None, "error": None})
+
+
+def _session_not_found() -> JSONResponse:
+    return _session_error("Session not found or expired", 404)
+
+
+def _session_error(error: str, status_code: int) -> JSONResponse:
+    return JSONResponse(content={"success": False, "data": None, "error": error}, status_code=status_code)
+
+
+@app.post("/piano-roll")
+async def create_piano_roll(
+    file: UploadFile = File(...),
+    track: Optional[int] = Query(None, ge=0),
+    level: Optional[int] = Query(None, ge=0),
+    start_tick: Optional[int] = Query(None, ge=0),
+    end_tick: Optional[int] = Query(None, ge=0),
+    width: int = Query(1024, ge=1),
+) -> Response:
+    # Tiles are computed once per file and cached, later views of the same file use GET /piano-roll/{digest}
+    from core.service.midi_processing import process_piano_roll
+
+    start_time = time.perf_counter()
+    timer = StageTimer()
+    try:
+        with timer.stage("read"):
+            midi_bytes = await read_midi_upload(file)
+        with timer.stage("cache"):
+            digest = file_digest(midi_bytes)
+            packed = await run_in_threadpool(result_cache.get, piano_roll_key(digest))
+        if packed is None:
+            try:
+                result: PianoRollResult = await _run_timed(timer, process_piano_roll, midi_bytes)
+            except ExecutorQueueFullError:
+                raise HTTPException(
+                    status_code=503, detail="Server is busy, try again later", headers={"Retry-After": "1"}
+                )
+            except ExecutorTimeoutError:
+                raise HTTPException(status_code=504, detail="Processing took too long")
+            except PianoRollTooLargeError as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            packed = result.piano_roll
+            await run_in_threadpool(result_cache.set, piano_roll_key(digest), packed)
+        response = _piano_roll_response(digest, packed, track, level, start_tick, end_tick, width)
+        timer.add("total", time.perf_counter() - start_time)
+        response.headers["Server-Timing"] = timer.server_timing()
+        return response
+    except HTTPException as e:
+        return JSONResponse(
+            content={"success": False, "data": None, "error": str(e.detail)},
+            status_code=e.status_code,
+            headers=e.headers,
+        )
+    except Exception as e:
+        return JSONResponse(content={"success": False, "data": None, "error": str(e)}, status_code=500)
+
+
+@app.get("/piano-roll/{digest}")
+async def get_piano_roll(
+    digest: str,
+    track: Optional[int] = Query(None, ge=0),
+    level: Optional[int] = Query(None, ge=0),
+    start_tick: Optional[int] = Query(None, ge=0),
+    end_tick: Optional[int] = Query(None, ge=0),
+    width: int = Query(1024, ge=1),
+) -> Response:
+    packed = await run_in_threadpool(result_cache.get, piano_roll_key(digest))
+    if packed is None:
+        return _session_error("Piano roll not found, upload the file to POST /piano-roll", 404)
+    try:
+        return _piano_roll_response(digest, packed, track, level, start_tick, end_tick, width)
+    except HTTPException as e:
+        return _session_error(str(e.detail), e.status_code)
+
+
+def _piano_roll_response(
+    digest: str,
+    packed: bytes,
+    track: Optional[int],
+    level: Optional[int],
+    start_tick: Optional[int],
+    end_tick: Optional[int],
+    width: int,
+) -> JSONResponse:
+    # One track, or all of them, at the requested level or the one picked for `width` tiles across the window
+    piano_roll = unpack_piano_roll(packed)
+    tracks = piano_roll["tracks"]
+    if track is not None and track >= len(tracks):
+        raise HTTPException(status_code=400, detail=f"Track {track} does not exist")
+    if start_tick is not None and end_tick is not None and end_tick < start_tick:
+        raise HTTPException(status_code=400, detail="end_tick must not be before start_tick")
+    indexes = range(len(tracks)) if track is None else [track]
+    windows = [piano_roll_window(piano_roll, index, level, start_tick, end_tick, width) for index in indexes]
+    return JSONResponse(
+        content={
+            "success": True,
+            "data": {
+                "digest": digest,
+                "resolution": piano_roll["resolution"],
+                "base_step": piano_roll["base_step"],
+                "end": piano_roll["end"],
+                "tracks": windows,
+            },
+            "error": None,
+        }
+    )
+
+
+@app.post("/process/stream")
+async def process_stream(config: ConfigModel = Body(...), file: UploadFile = File(...)) -> Response:
+    from core.service.midi_processing import process_midi_stream
+
+    try:
+        midi_bytes = await read_midi_upload(file)
+        stream = RecordStream(asyncio.get_running_loop())
+        sink = await run_in_threadpool(stream.sink)
+        job = asyncio.ensure_future(processing_executor.run(process_midi_stream, config, midi_bytes, sink))
+        try:
+            # Parsing errors and a busy executor still get a regular error response, the stream only starts
+            # with the first record
+            first = await _next_record(stream.records, job)
+        except ExecutorQueueFullError:
+            _end_stream(stream, job)
+            raise HTTPException(
+                status_code=503, detail="Server is busy, try again later", headers={"Retry-After": "1"}
+            )
+        except ExecutorTimeoutError:
+            _end_stream(stream, job)
+            raise HTTPException(status_code=504, detail="Processing took too long")
+        except Exception:
+            _end_stream(stream, job)
+            raise
+        return StreamingResponse(_relay_records(first, stream, job), media_type=NDJSON_MEDIA_TYPE)
     except HTTPException as e:
         return JSONResponse(
-            content={"success": False, "data": None, "error": str(e.detail)}, status_code=e.status_code
+            content={"success": False, "data": None, "error": str(e.detail)},
+            status_code=e.status_code,
+            headers=e.headers,
         )
     except Exception as e:
         return JSONResponse(content={"success": False, "data": None, "error": str(e)}, status_code=500)
+
+
+async def _next_record(records: "asyncio.Queue[Optional[bytes]]", job: "asyncio.Future[None]") -> Optional[bytes]:
+    # The next record the worker made, None after the last one. Raises the job's error once the records
+    # it made before failing are relayed.
+    next_record = asyncio.ensure_future(records.get())
+    waiting: List["asyncio.Future[Any]"] = [next_record, job]
+    await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+    error = None if next_record.done() else job.exception()
+    if error is not None:
+        next_record.cancel()
+        raise error
+    return await next_record
+
+
+async def _relay_records(
+    first: Optional[bytes], stream: RecordStream, job: "asyncio.Future[None]"
+) -> AsyncIterator[bytes]:
+    # The records of a /process/stream job as the worker makes them, the worker waits while they are sent
+    from core.service.serializer import serialize_stream_record
+
+    record = first
+    try:
+        while record is not None:
+            yield record
+            try:
+                record = await _next_record(stream.records, job)
+            except ExecutorTimeoutError:
+                yield serialize_stream_record("error", error="Processing took too long")
+                return
+            except Exception as e:
+                yield serialize_stream_record("error", error=str(e))
+                return
+    finally:
+        _end_stream(stream, job)
+
+
+def _end_stream(stream: RecordStream, job: "asyncio.Future[None]") -> None:
+    # Nobody reads the records anymore: the worker goes on without waiting, and the stream's relay stops once
+    # the job is over
+    stream.drop()
+    task = asyncio.create_task(_close_stream(stream, job))
+    stream_tasks.add(task)
+    task.add_done_callback(stream_tasks.discard)
+
+
+async def _close_stream(stream: RecordStream, job: "asyncio.Future[None]") -> None:
+    await asyncio.wait([job])
+    if not job.cancelled():
+        # Its error went to the client, or the client is gone
+        job.exception()
+    await run_in_threadpool(stream.close)
+
+
+@app.post("/process/batch")
+async def process_batch(
+    request: Request,
+    configs: List[ConfigModel] = Form(...),
+    files: List[UploadFile] = File(...),
+    response_format: Optional[str] = Query(None, alias="format"),
+) -> Response:
+    from core.service.midi_processing import create_tokenizer_config
+    from core.service.serializer import serialize_batch_response
+
+    start_time = time.perf_counter()
+    try:
+        wire_format = negotiate_format(response_format, request.headers.get("accept"))
+        if wire_format == "msgpack":
+            raise HTTPException(status_code=400, detail="Batch responses are only available as JSON")
+        if len(files) * len(configs) > BATCH_MAX_ITEMS:
+            raise HTTPException(
+                status_code=413, detail=f"A batch is limited to {BATCH_MAX_ITEMS} file and config pairs"
+            )
+
+        # Identical configs are only tokenized once, and share their results
+        config_keys = [canonical_config_key(config.tokenizer, create_tokenizer_config(config)) for config in configs]
+        distinct_keys = list(dict.fromkeys(config_keys))
+        distinct_configs = [configs[config_keys.index(key)] for key in distinct_keys]
+
+        # A batch never takes more than the workers, so it doesn't fill the queue shared with /process.
+        # Stage timings are summed over the files, which run concurrently.
+        slots = asyncio.Semaphore(processing_executor.workers)
+        timer = StageTimer()
+        file_results = await asyncio.gather(
+            *(_process_batch_file(file, distinct_configs, distinct_keys, wire_format, slots, timer) for file in files)
+        )
+
+        batch_files = []
+        batch_results = []
+        for file_index, (file, (tokens_and_notes, errors, metrics, file_error)) in enumerate(zip(files, file_results)):
+            batch_files.append((file.filename or "", metrics, file_error))
+            for config_index, key in enumerate(config_keys):
+                distinct_index = distinct_keys.index(key)
+                batch_results.append(
+                    (file_index, config_index, tokens_and_notes[distinct_index], errors[distinct_index])
+                )
+        with timer.stage("serialize"):
+            content = serialize_batch_response(batch_files, batch_results)
+        timer.add("total", time.perf_counter() - start_time)
+        return Response(
+            content=content, media_type=MEDIA_TYPES[wire_format], headers={"Server-Timing": timer.server_timing()}
+        )
+    except HTTPException as e:
+        return JSONResponse(
+            content={"success": False, "data": None, "error": str(e.detail)},
+            status_code=e.status_code,
+            headers=e.headers,
+        )
+    except Exception as e:
+        return JSONResponse(content={"success": False, "data": None, "error": str(e)}, status_code=500)
+
+
+# Tokens and notes and error of each config, then the file's metrics and error
+BatchFileOutcome = Tuple[List[Optional[bytes]], List[Optional[str]], Optional[bytes], Optional[str]]
+
+
+async def _process_batch_file(
+    file: UploadFile,
+    configs: List[ConfigModel],
+    config_keys: List[str],
+    wire_format: str,
+    slots: asyncio.Semaphore,
+    timer: StageTimer,
+) -> BatchFileOutcome:
+    from core.service.midi_processing import process_midi_batch
+
+    def failed(error: str) -> BatchFileOutcome:
+        return [None] * len(configs), [error] * len(configs), None, error
+
+    with timer.stage("read"):
+        try:
+            midi_bytes = await read_midi_upload(file)
+        except HTTPException as e:
+            return failed(str(e.detail))
+    with timer.stage("cache"):
+        digest = file_digest(midi_bytes)
+        tokens_keys = [result_key(digest, config_key, wire_format) for config_key in config_keys]
+        tokens_and_notes = [await run_in_threadpool(result_cache.get, key) for key in tokens_keys]
+        metrics = await run_in_threadpool(result_cache.get, metrics_key(digest))
+    errors: List[Optional[str]] = [None] * len(configs)
+    missing = [config if cached is None else None for config, cached in zip(configs, tokens_and_notes)]
+    if metrics is not None and not any(missing):
+        return tokens_and_notes, errors, metrics, None
+
+    async with slots:
+        try:
+            result: BatchResult = await _run_timed(
+                timer, process_midi_batch, missing, midi_bytes, metrics is None, wire_format
+            )
+        except ExecutorQueueFullError:
+            return failed("Server is busy, try again later")
+        except ExecutorTimeoutError:
+            return failed("Processing took too long")
+        except Exception as e:
+            return failed(str(e))
+
+    for index, key in enumerate(tokens_keys):
+        content = result.tokens_and_notes[index]
+        if content is not None:
+            tokens_and_notes[index] = content
+            await run_in_threadpool(result_cache.set, key, content)
+        errors[index] = result.errors[index]
+    if result.metrics is not None:
+        metrics = result.metrics
+        await run_in_threadpool(result_cache.set, metrics_key(digest), metrics)
+    return tokens_and_notes, errors, metrics, None
+
+
+async def _run_timed(
+    timer: StageTimer, function: Callable[..., Any], *args: Any, timeout: Optional[float] = None
+) -> Any:
+    # Runs a pipeline function in the processing executor and adds the stage timings it measured. What the
+    # stages don't account for is time spent waiting for a worker (and sending the job to it).
+    start_time = time.perf_counter()
+    result = await processing_executor.run(function, *args, timeout=timeout)
+    elapsed = time.perf_counter() - start_time
+    timer.add("wait", max(elapsed - sum(seconds for _, seconds in result.timings), 0.0))
+    timer.extend(result.timings)
+    return result
+
+
+@app.get("/vocab")
+async def vocab(request: Request, config: str = Query(...)) -> Response:
+    # The vocabulary of the tokenizer of a config (ConfigModel JSON), to decode ?format=ids tokens. It only
+    # changes with the config, so it carries a strong ETag and If-None-Match requests get a 304.
+    from core.service.midi_processing import create_tokenizer_config, process_vocab
+
+    start_time = time.perf_counter()
+    timer = StageTimer()
+    try:
+        try:
+            user_config = ConfigModel.model_validate_json(config)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Invalid request parameters")
+        with timer.stage("cache"):
+            etag = vocab_etag(canonical_config_key(user_config.tokenizer, create_tokenizer_config(user_config)))
+            headers = {"ETag": etag, "Cache-Control": "no-cache"}
+            if_none_match = request.headers.get("if-none-match")
+            if if_none_match is not None and etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers=headers)
+            content = await run_in_threadpool(result_cache.get, vocab_key(etag))
+        if content is None:
+            try:
+                result: VocabResult = await _run_timed(timer, process_vocab, user_config)
+            except ExecutorQueueFullError:
+                raise HTTPException(
+                    status_code=503, detail="Server is busy, try again later", headers={"Retry-After": "1"}
+                )
+            except ExecutorTimeoutError:
+                raise HTTPException(status_code=504, detail="Processing took too long")
+            content = result.vocab
+            await run_in_threadpool(result_cache.set, vocab_key(etag), content)
+        timer.add("total", time.perf_counter() - start_time)
+        return Response(
+            content=content, media_type="application/json", headers={**headers, "Server-Timing": timer.server_timing()}
+        )
+    except HTTPException as e:
+        return JSONResponse(
+            content={"success": False, "data": None, "error": str(e.detail)},
+            status_code=e.status_code,
+            headers=e.headers,
+        )
+    except Exception as e:
+        return JSONResponse(content={"success": False, "data": None, "error": str(e)}, status_code=500)
+
+
+@app.post("/jobs")
+async def create_job(
+    request: Request,
+    config: Optional[ConfigModel] = Body(None),
+    file: Optional[UploadFile] = File(None),
+    response_format: Optional[str] = Query(None, alias="format"),
+    preset: Optional[str] = Query(None),
+) -> JSONResponse:
+    # Same input as /process, but answers right away: the job runs in the background (JOB_CONCURRENCY at a
+    # time) and its progress and result are read from /jobs/{id}
+    start_time = time.perf_counter()
+    timer = StageTimer()
+    try:
+        config, preset_key = _resolve_config(config, preset)
+        wire_format = negotiate_format(response_format, request.headers.get("accept"))
+        with timer.stage("read"):
+            midi_bytes = await _read_file(request, file)
+    except HTTPException as e:
+        return _job_error(str(e.detail), e.status_code)
+    job = job_store.create()
+    if job is None:
+        return JSONResponse(
+            content={"success": False, "data": None, "error": "Too many pending jobs, try again later"},
+            status_code=503,
+            headers={"Retry-After": "1"},
+        )
+    timer.listener = job.apply
+    job.apply({"stage": "read", "status": "finished", "seconds": timer.summed()["read"]})
+    task = asyncio.create_task(_run_job(job, config, preset_key, midi_bytes, wire_format, timer, start_time))
+    job_tasks.add(task)
+    task.add_done_callback(job_tasks.discard)
+    return JSONResponse(
+        content={"success": True, "data": job.summary(), "error": None},
+        status_code=202,
+        headers={"Location": f"/jobs/{job.job_id}"},
+    )
+
+
+async def _run_job(
+    job: Job,
+    config: ConfigModel,
+    preset_key: Optional[str],
+    midi_bytes: bytes,
+    wire_format: str,
+    timer: StageTimer,
+    start_time: float,
+) -> None:
+    try:
+        async with job_store.slots():
+            job.start()
+            reporter = await run_in_threadpool(job_store.reporter, job)
+            content = await _process_content(config, midi_bytes, wire_format, timer, reporter, JOB_TIMEOUT, preset_key)
+    except HTTPException as e:
+        job.fail(str(e.detail), e.status_code, time.monotonic())
+    except Exception as e:
+        job.fail(str(e), 500, time.monotonic())
+    else:
+        timer.add("total", time.perf_counter() - start_time)
+        stage_histograms.observe(timer, config.tokenizer, len(midi_bytes))
+        job.finish(content, MEDIA_TYPES[wire_format], timer.summed(), time.monotonic())
+    finally:
+        job_store.finished(job)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> JSONResponse:
+    job = job_store.get(job_id)
+    if job is None:
+        return _job_error("Job not found", 404)
+    return JSONResponse(content={"success": True, "data": job.summary(), "error": None})
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str) -> Response:
+    # What /process would have answered, 409 until the job is finished
+    job = job_store.get(job_id)
+    if job is None:
+        return _job_error("Job not found", 404)
+    if job.status == "failed":
+        return _job_error(job.error or "Processing failed", job.status_code or 500)
+    if job.status != "done":
+        return _job_error(f"Job is {job.status}", 409)
+    return Response(content=job.result, media_type=job.media_type, headers={"Server-Timing": job.server_timing or ""})
+
+
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str) -> Response:
+    # Server-Sent Events: the job summary as a "progress" event whenever it changes, and last a "done" or
+    # "failed" one, after which the stream ends
+    job = job_store.get(job_id)
+    if job is None:
+        return _job_error("Job not found", 404)
+    return StreamingResponse(
+        _job_events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _job_events(job: Job) -> AsyncIterator[bytes]:
+    version = -1
+    while True:
+        if not await job.wait_for_change(version, JOB_KEEPALIVE):
+            # Comment lines keep proxies from closing an idle connection
+            yield b": keepalive\n\n"
+            continue
+        version = job.version
+        event = job.status if job.finished else "progress"
+        yield f"event: {event}\ndata: {json.dumps(job.summary())}\n\n".encode()
+        if job.finished:
+            return
+
+
+def _job_error(error: str, status_code: int) -> JSONResponse:
+    return JSONResponse(content={"success": False, "data": None, "error": error}, status_code=status_code)
+
+
+@app.post("/presets")
+async def create_preset_endpoint(config: ConfigModel = Body(...)) -> JSONResponse:
+    # Registers a config under a stable id, for /process?preset=<id>. A processing worker builds and pins
+    # its tokenizer right away, the others when they first use it.
+    from core.service.midi_processing import pin_preset_tokenizer
+
+    try:
+        preset = await run_in_threadpool(create_preset, config)
+        # A full store or an id taken by another config is rejected before a worker pins anything
+        if preset_store.check(preset) is None:
+            await processing_executor.run(pin_preset_tokenizer, preset.config, preset.config_key)
+        preset = preset_store.add(preset)
+    except PresetStoreFullError:
+        return _preset_error(f"Too many presets, at most {preset_store.max_presets}", 507)
+    except ValueError as e:
+        return _preset_error(str(e), 409)
+    except ExecutorQueueFullError:
+        return JSONResponse(
+            content={"success": False, "data": None, "error": "Server is busy, try again later"},
+            status_code=503,
+            headers={"Retry-After": "1"},
+        )
+    except ExecutorTimeoutError:
+        return _preset_error("Processing took too long", 504)
+    except Exception as e:
+        return _preset_error(str(e), 500)
+    return JSONResponse(
+        content={"success": True, "data": preset.summary(), "error": None},
+        status_code=201,
+        headers={"Location": f"/presets/{preset.preset_id}"},
+    )
+
+
+@app.get("/presets")
+async def list_presets() -> JSONResponse:
+    return JSONResponse(
+        content={"success": True, "data": [preset.summary() for preset in preset_store.list()], "error": None}
+    )
+
+
+@app.get("/presets/{preset_id}")
+async def get_preset(preset_id: str) -> JSONResponse:
+    preset = preset_store.get(preset_id)
+    if preset is None:
+        return _preset_error("Preset not found", 404)
+    return JSONResponse(content={"success": True, "data": preset.summary(), "error": None})
+
+
+def _preset_error(error: str, status_code: int) -> JSONResponse:
+    return JSONResponse(content={"success": False, "data": None, "error": error}, status_code=status_code)
+
+
+@app.get("/metrics")
+async def prometheus_metrics() -> PlainTextResponse:
+    # Prometheus text exposition format
+    return PlainTextResponse(stage_histograms.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    # For load balancer health checks: 503 until the startup warm-up is over (or when it failed)
+    return JSONResponse(
+        content={
+            "success": warm_up_status.ready,
+            "data": asdict(warm_up_status),
+            "error": None if warm_up_status.ready else warm_up_status.error or "Warming up",
+        },
+        status_code=200 if warm_up_status.ready else 503,
+        headers=None if warm_up_status.ready else {"Retry-After": "1"},
+    )
+
+
+@app.get("/stats")
+async def stats() -> JSONResponse:
+    from core.service.sessions import session_store
+
+    executor_stats = processing_executor.stats()
+    return JSONResponse(
+        content={
+            "success": True,
+            "data": {
+                "admission": asdict(admission_controller.stats()),
+                "executor": {**asdict(executor_stats), "mean_wait_time": executor_stats.mean_wait_time},
+                "result_cache": asdict(result_cache.stats()),
+                "sessions": asdict(session_store.stats()),
+                "jobs": asdict(job_store.stats()),
+                "presets": {"size": len(preset_store), "max_size": preset_store.max_presets},
+            },
+            "error": None,
+        }
+    )
@@ -0,0 +1,26 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+def forwarded_client(x_forwarded_for: str, trusted_hops: int) -> str:
+    # Every proxy appends the address it got the request from, so only the last trusted_hops entries were
+    # written by our proxies: the leftmost of them is the client they saw. Whatever is before it came from the
+    # client and can be made up.
+    hosts = [host.strip() for host in x_forwarded_for.split(",")]
+    return hosts[max(len(hosts) - trusted_hops, 0)]
+
+
+class ForwardedClientMiddleware:
+    # Sets the client of requests that went through trusted_hops proxies to the address the farthest of them
+    # saw, so the logs and admission control tell clients apart. Unlike uvicorn's --forwarded-allow-ips='*', a
+    # client can't pick its address by sending its own X-Forwarded-For.
+    def __init__(self, app: ASGIApp, *, trusted_hops: int) -> None:
+        self.app = app
+        self.trusted_hops = trusted_hops
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and self.trusted_hops > 0:
+            values = [value.decode("latin1") for name, value in scope["headers"] if name == b"x-forwarded-for"]
+            if values:
+                # Several headers are one list, in order
+                scope["client"] = (forwarded_client(",".join(values), self.trusted_hops), 0)
+        await self.app(scope, receive, send)
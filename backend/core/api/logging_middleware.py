@@ -1,93 +1,120 @@
 import logging
+import queue
 import time
-from typing import Any, Callable, Dict, Tuple
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterable, List, Optional
 from uuid import uuid4
 
-from fastapi import FastAPI, Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app: FastAPI, *, logger: logging.Logger) -> None:
-        self._logger = logger
-        super().__init__(app)
-
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        request_id: str = str(uuid4())
+def client_ip(scope: Scope) -> Optional[str]:
+    # The address the request came from, as logged and as admission control counts clients
+    return scope["client"][0] if scope.get("client") else None
 
-        logging_dict: Dict[str, Any] = {"X-API-REQUEST-ID": request_id}
 
-        response, response_dict = await self._log_response(call_next, request, request_id)
+class LoggingMiddleware:
+    # Plain ASGI middleware: it only looks at the response start message for the status and the request id
+    # header, so bodies (streaming responses included) pass through untouched
+    def __init__(self, app: ASGIApp, *, logger: logging.Logger) -> None:
+        self.app = app
+        self._logger = logger
 
-        request_dict = await self._log_request(request)
-        logging_dict["request"] = request_dict
-        logging_dict["response"] = response_dict
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        self._logger.info(logging_dict)
+        request_id: str = str(uuid4())
+        status_code: Optional[int] = None
 
-        return response
+        async def send_with_request_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message)["X-API-Request-ID"] = request_id
+            await send(message)
 
-    async def _log_request(self, request: Request) -> Dict[str, Any]:
-        path = request.url.path
-        if request.query_params:
-            path += f"?{request.query_params}"
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        except Exception as e:
+            self._logger.exception({"path": scope["path"], "method": scope["method"], "reason": e})
+            # The server error response is sent by an outer middleware
+            if status_code is None:
+                status_code = 500
+            raise
+        finally:
+            execution_time = time.perf_counter() - start_time
+            self._logger.info(
+                {
+                    "X-API-REQUEST-ID": request_id,
+                    "request": self._log_request(scope),
+                    "response": self._log_response(status_code, execution_time),
+                }
+            )
+
+    def _log_request(self, scope: Scope) -> Dict[str, Any]:
+        path = scope["path"]
+        if scope.get("query_string"):
+            path += f"?{scope['query_string'].decode('latin-1')}"
 
         request_logging = {
-            "method": request.method,
+            "method": scope["method"],
             "path": path,
-            "ip": request.client.host if request.client is not None else None,
+            "ip": client_ip(scope),
         }
 
         return request_logging
 
-    async def _log_response(
-        self, call_next: Callable, request: Request, request_id: str
-    ) -> Tuple[Response, Dict[str, Any]]:
-        start_time = time.perf_counter()
-        response: Response = await self._execute_request(call_next, request, request_id)
-        finish_time = time.perf_counter()
-
-        overall_status = "successful" if response.status_code < 400 else "failed"
-
-        execution_time = finish_time - start_time
+    def _log_response(self, status_code: Optional[int], execution_time: float) -> Dict[str, Any]:
+        # `time_taken` runs until the last body chunk was sent (or the client disconnected)
+        overall_status = "successful" if status_code is not None and status_code < 400 else "failed"
 
         response_logging = {
             "status": overall_status,
-            "status_code": response.status_code,
+            "status_code": status_code,
             "time_taken": f"{execution_time:0.4f}s",
         }
 
-        resp_body = [section async for section in response.__dict__["body_iterator"]]
-        response.__setattr__("body_iterator", AsyncIteratorWrapper(resp_body))
-
-        return response, response_logging
-
-    async def _execute_request(self, call_next: Callable, request: Request, request_id: str) -> Response:
-        try:
-            response: Response = await call_next(request)
-            response.headers["X-API-Request-ID"] = request_id
-            return response
-
-        except Exception as e:
-            self._logger.exception({"path": request.url.path, "method": request.method, "reason": e})
-
-
-class AsyncIteratorWrapper:
-    def __init__(self, obj):
-        self._it = iter(obj)
-
-    def __aiter__(self):
-        return self
-
-    async def __anext__(self):
-        try:
-            value = next(self._it)
-        except StopIteration:
-            raise StopAsyncIteration
-        return value
-
-
-log_config = {
+        return response_logging
+
+
+class QueueLogging:
+    # Puts the handlers of the given loggers behind queues: the request path only enqueues records, and
+    # listener threads do the formatting and the (file, console) writes
+    def __init__(self, logger_names: Iterable[str]) -> None:
+        self.logger_names = list(logger_names)
+        self._listeners: List[QueueListener] = []
+        self._handlers: Dict[str, List[logging.Handler]] = {}
+
+    def start(self) -> None:
+        if self._listeners:
+            return
+        for name in self.logger_names:
+            logger = logging.getLogger(name)
+            handlers = list(logger.handlers)
+            if not handlers:
+                continue
+            log_queue: queue.SimpleQueue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+            self._handlers[name] = handlers
+            logger.handlers = [QueueHandler(log_queue)]
+            listener.start()
+            self._listeners.append(listener)
+
+    def stop(self) -> None:
+        # Writes out the queued records and puts the original handlers back
+        for listener in self._listeners:
+            listener.stop()
+        for name, handlers in self._handlers.items():
+            logging.getLogger(name).handlers = handlers
+        self._listeners.clear()
+        self._handlers.clear()
+
+
+log_config: Dict[str, Any] = {
     "version": 1,
     "loggers": {
         "root": {"level": "INFO", "handlers": ["consoleHandler"]},
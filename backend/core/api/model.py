@@ -80,6 +80,9 @@ class MusicInformationData(BaseModel):
 
     empty_beat_rate: NonNegativeFloat
     drum_pattern_consistency: NonNegativeFloat
+    pitch_class_entropy: NonNegativeFloat
+    scale_consistency: NonNegativeFloat
+    groove_consistency: NonNegativeFloat
 
 
 @dataclass
@@ -99,11 +102,6 @@ class MetricsData:
 
     empty_beat_rate: float
     drum_pattern_consistency: float
-
-@dataclass
-class Note:
-    pitch: int
-    name: str
-    start: int
-    end: int
-    velocity: int
\ No newline at end of file
+    pitch_class_entropy: float
+    scale_consistency: float
+    groove_consistency: float
\ No newline at end of file
@@ -0,0 +1,24 @@
+from typing import Optional
+
+from fastapi import HTTPException
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "columnar": "application/vnd.miditok.columnar+json",
+    "msgpack": "application/x-msgpack",
+    "ids": "application/vnd.miditok.ids+json",
+}
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    # An explicit ?format= wins over the Accept header, plain JSON stays the default
+    if requested is not None:
+        if requested not in MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unsupported response format: {requested}")
+        return requested
+    if accept:
+        accepted = [media_range.split(";")[0].strip() for media_range in accept.split(",")]
+        for wire_format, media_type in MEDIA_TYPES.items():
+            if wire_format != "json" and media_type in accepted:
+                return wire_format
+    return "json"
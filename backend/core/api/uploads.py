@@ -0,0 +1,155 @@
+import struct
+from typing import AsyncIterator, Awaitable, Callable, List, Tuple
+
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.constants import MAX_UPLOAD_BYTES
+
+MIDI_CONTENT_TYPES = ["audio/mid", "audio/midi", "audio/x-mid", "audio/x-midi"]
+CHUNK_HEADER = struct.Struct(">4sI")
+
+
+async def read_midi_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    # A file of a multipart form. Starlette has already received the whole form by then (keeping files past
+    # 1 MiB in a temporary file), so only BodySizeLimitMiddleware bounds what a client sends this way.
+    if file.content_type not in MIDI_CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail="Unsupported file type")
+    return await _read_midi(file.read, max_bytes)
+
+
+async def read_midi_body(request: Request, max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    # A file sent alone as the request body, checked while it streams in: a body that doesn't start like a
+    # MIDI file, or whose chunks declare more than max_bytes, is rejected without receiving the rest
+    if request.headers.get("content-type") not in MIDI_CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail="Unsupported file type")
+    return await _read_midi(_BodyReader(request.stream()).read, max_bytes)
+
+
+async def _read_midi(read: Callable[[int], Awaitable[bytes]], max_bytes: int) -> bytes:
+    # Reads the header chunk and then the declared number of track chunks, each one exactly as long as its
+    # header says, so anything that is not a MIDI file or declares more than max_bytes is rejected before
+    # the rest is read. Data after the last track is ignored, as the parsers do.
+    name, header_length = await _read_chunk_header(read)
+    if name != b"MThd":
+        raise HTTPException(status_code=415, detail="Not a MIDI file")
+    if header_length < 6:
+        raise HTTPException(status_code=400, detail="Invalid MIDI header")
+    size = CHUNK_HEADER.size + header_length
+    _check_size(size, max_bytes)
+    header = await _read_exactly(read, header_length)
+    _, tracks, _ = struct.unpack(">HHH", header[:6])
+
+    parts: List[bytes] = [CHUNK_HEADER.pack(name, header_length), header]
+    for index in range(tracks):
+        name, length = await _read_chunk_header(read)
+        if name != b"MTrk":
+            raise HTTPException(status_code=400, detail=f"Invalid MIDI file: track {index} is not an MTrk chunk")
+        size += CHUNK_HEADER.size + length
+        _check_size(size, max_bytes)
+        parts.append(CHUNK_HEADER.pack(name, length))
+        parts.append(await _read_exactly(read, length))
+    return b"".join(parts)
+
+
+class _BodyReader:
+    # Reads of a given length over the chunks of a request body as they arrive: every read fills a buffer of
+    # the length asked, the declared length of a MIDI chunk, and the body is not read any further
+    def __init__(self, chunks: AsyncIterator[bytes]) -> None:
+        self._chunks = chunks
+        self._pending = memoryview(b"")
+
+    async def read(self, length: int) -> bytes:
+        data = bytearray(length)
+        filled = 0
+        while filled < length:
+            if not self._pending:
+                try:
+                    self._pending = memoryview(await self._chunks.__anext__())
+                except StopAsyncIteration:
+                    return data[:filled]
+                continue
+            taken = min(len(self._pending), length - filled)
+            data[filled : filled + taken] = self._pending[:taken]
+            self._pending = self._pending[taken:]
+            filled += taken
+        return data
+
+
+async def _read_chunk_header(read: Callable[[int], Awaitable[bytes]]) -> Tuple[bytes, int]:
+    return CHUNK_HEADER.unpack(await _read_exactly(read, CHUNK_HEADER.size))
+
+
+async def _read_exactly(read: Callable[[int], Awaitable[bytes]], length: int) -> bytes:
+    data = await read(length)
+    if len(data) < length:
+        raise HTTPException(status_code=400, detail="Invalid MIDI file: it ends before its declared length")
+    return data
+
+
+def _check_size(size: int, max_bytes: int) -> None:
+    if size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"MIDI files are limited to {max_bytes} bytes")
+
+
+class BodySizeLimitMiddleware:
+    # Rejects requests whose body is over max_bytes with 413: right away when Content-Length says so,
+    # otherwise as soon as the streamed body goes over it. The app then only sees a disconnected client,
+    # and what it answers is dropped.
+    def __init__(self, app: ASGIApp, *, max_bytes: int) -> None:
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+        rejected = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    rejected = True
+                    # Too late for a 413 when a (streaming) response has already started
+                    if not response_started:
+                        await self._reject(scope, receive, send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            nonlocal response_started
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            # Reading a disconnected request raises (ClientDisconnect), the 413 is already sent
+            if not rejected:
+                raise
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send) -> None:
+        response = JSONResponse(
+            content={"success": False, "data": None, "error": f"Request body is larger than {self.max_bytes} bytes"},
+            status_code=413,
+            headers={"Connection": "close"},
+        )
+        await response(scope, receive, send)
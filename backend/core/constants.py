@@ -1,4 +1,5 @@
 import os
+from typing import Any, Dict
 
 ROOT_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), "."))
 DATA_DIR = os.path.join(ROOT_DIR, "data")
@@ -19,3 +20,71 @@ DEFAULT_TOKENIZER_PARAMS = {
     "nb_tempos": 32,
     "tempo_range": (40, 250),
 }
+
+# The frontend's default form values
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "tokenizer": "REMI",
+    "pitch_range": [21, 109],
+    "nb_velocities": 32,
+    "special_tokens": ["PAD", "BOS", "EOS", "MASK"],
+    "use_chords": True,
+    "use_rests": False,
+    "use_tempos": True,
+    "use_time_signatures": False,
+    "use_sustain_pedals": False,
+    "use_pitch_bends": False,
+    "use_programs": False,
+    "nb_tempos": 32,
+    "tempo_range": [40, 250],
+    "log_tempos": False,
+    "delete_equal_successive_tempo_changes": False,
+    "sustain_pedal_duration": False,
+    "pitch_bend_range": [-8192, 8191, 32],
+    "delete_equal_successive_time_sig_changes": False,
+    "programs": None,
+    "one_token_stream_for_programs": None,
+    "program_changes": None,
+}
+
+TOKENIZER_CACHE_SIZE = int(os.environ.get("TOKENIZER_CACHE_SIZE", 32))
+WARM_UP_TOKENIZER_CACHE = os.environ.get("WARM_UP_TOKENIZER_CACHE", "1") == "1"
+WARM_UP_TOKENIZERS = ["REMI", "MIDILike", "TSD", "Structured", "CPWord", "Octuple"]
+STARTUP_WARM_UP = os.environ.get("STARTUP_WARM_UP", "1") == "1"
+
+PROCESSING_BACKEND = os.environ.get("PROCESSING_BACKEND", "process")
+PROCESSING_WORKERS = int(os.environ.get("PROCESSING_WORKERS", os.cpu_count() or 1))
+PROCESSING_QUEUE_SIZE = int(os.environ.get("PROCESSING_QUEUE_SIZE", 16))
+PROCESSING_TIMEOUT = float(os.environ.get("PROCESSING_TIMEOUT", 60.0))
+
+# Admission control of the CPU-heavy endpoints, see core/api/admission.py
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", 2 * PROCESSING_WORKERS))
+ADMISSION_MAX_PER_CLIENT = int(os.environ.get("ADMISSION_MAX_PER_CLIENT", 2))
+ADMISSION_RATE = float(os.environ.get("ADMISSION_RATE", 0.0))
+ADMISSION_BURST = int(os.environ.get("ADMISSION_BURST", 10))
+ADMISSION_MAX_WAIT = float(os.environ.get("ADMISSION_MAX_WAIT", 10.0))
+ADMISSION_MAX_QUEUED = int(os.environ.get("ADMISSION_MAX_QUEUED", 64))
+# Proxies in front of the server appending to X-Forwarded-For, see core/api/forwarded.py
+FORWARDED_TRUSTED_HOPS = int(os.environ.get("FORWARDED_TRUSTED_HOPS", 0))
+
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 64))
+
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 16 * 1024 * 1024))
+MAX_REQUEST_BYTES = int(os.environ.get("MAX_REQUEST_BYTES", 64 * 1024 * 1024))
+
+RESULT_CACHE_MEMORY_BYTES = int(os.environ.get("RESULT_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", "")
+RESULT_CACHE_DISK_BYTES = int(os.environ.get("RESULT_CACHE_DISK_BYTES", 1024 * 1024 * 1024))
+
+SESSION_TTL = float(os.environ.get("SESSION_TTL", 600.0))
+SESSION_MAX_BYTES = int(os.environ.get("SESSION_MAX_BYTES", 256 * 1024 * 1024))
+
+PIANO_ROLL_MAX_TILES = int(os.environ.get("PIANO_ROLL_MAX_TILES", 16384))
+
+PRESETS_FILE = os.environ.get("PRESETS_FILE", "")
+PRESET_MAX_COUNT = int(os.environ.get("PRESET_MAX_COUNT", 64))
+
+JOB_CONCURRENCY = int(os.environ.get("JOB_CONCURRENCY", 1))
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", 32))
+JOB_TIMEOUT = float(os.environ.get("JOB_TIMEOUT", 600.0))
+JOB_TTL = float(os.environ.get("JOB_TTL", 600.0))
+JOB_MAX_BYTES = int(os.environ.get("JOB_MAX_BYTES", 256 * 1024 * 1024))
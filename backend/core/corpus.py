@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from core.api.model import ConfigModel
+from core.constants import DEFAULT_CONFIG
+from core.service.corpus import CorpusResult, CorpusRunStats, CorpusStore, CorpusStoreError, run_corpus
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Tokenize a directory of MIDI files and compute their metrics into a resumable store"
+    )
+    parser.add_argument("corpus", help="Directory searched recursively for .mid and .midi files")
+    parser.add_argument("output", help="Store directory, created if needed; a run into an existing one resumes it")
+    parser.add_argument("--config", help="JSON file with the tokenizer config (ConfigModel), the frontend's default")
+    parser.add_argument("--tokenizer", help="Overrides the tokenizer of the config")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-files", type=int, default=256, help="Files per chunk of the store")
+    parser.add_argument("--retry-failed", action="store_true", help="Process again the files that failed before")
+    parser.add_argument("--report-every", type=float, default=5.0, help="Seconds between progress lines")
+    args = parser.parse_args()
+
+    config = dict(DEFAULT_CONFIG)
+    if args.config:
+        with open(args.config) as file:
+            config.update(json.load(file))
+    if args.tokenizer:
+        config["tokenizer"] = args.tokenizer
+    user_config = ConfigModel(**config)
+
+    try:
+        store = CorpusStore(args.output, user_config, args.chunk_files)
+    except CorpusStoreError as e:
+        sys.exit(f"error: {e}")
+    if args.retry_failed:
+        store.retry_failed()
+
+    last_report = time.perf_counter()
+
+    def on_result(result: CorpusResult, stats: CorpusRunStats) -> None:
+        nonlocal last_report
+        if result.error is not None:
+            print(f"FAILED {result.path}: {result.error}", file=sys.stderr, flush=True)
+        if time.perf_counter() - last_report >= args.report_every:
+            last_report = time.perf_counter()
+            print(_format_stats(stats), file=sys.stderr, flush=True)
+
+    try:
+        stats = run_corpus(args.corpus, store, user_config, max(args.workers, 1), on_result)
+    except KeyboardInterrupt:
+        sys.exit("Interrupted, the next run into the same store resumes from there")
+    print(_format_stats(stats))
+    print(f"{len(store.manifest.files)} files stored in {args.output}, {len(store.manifest.failed)} failed")
+
+
+def _format_stats(stats: CorpusRunStats) -> str:
+    done = stats.skipped + stats.processed + stats.failed
+    return (
+        f"{done}/{stats.files} files ({stats.skipped} from earlier runs), {stats.failed} failed, "
+        f"{stats.seconds:.1f} s, {stats.files_per_second:.1f} files/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
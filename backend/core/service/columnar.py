@@ -0,0 +1,295 @@
+import json
+from dataclasses import dataclass, field
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from miditok import Event, TokSequence
+
+from core.service.message_pack import packb, unpack_array
+from core.service.note_table import NOTE_COLUMN_NAMES, NoteTable, serialize_note_tables
+from core.service.serializer import TokSequenceEncoder
+from core.service.tokenizers.note_linking import NoteLinks
+
+COLUMNAR_FORMAT = "columnar"
+PACKED_FORMAT = "msgpack"
+IDS_FORMAT = "ids"
+COLUMN_NAMES = ["type", "value", "time", "program", "desc", "note_id"]
+# Stands for None in packed columns, which are then int32 (-1 is a valid program: drums)
+PACKED_NULL = -(2**31)
+
+_EVENT_FIELDS = attrgetter("type", "value", "time", "program", "desc")
+
+
+@dataclass
+class TokenColumns:
+    # type, value and desc are indexes into the response's value table, time and program are stored as is
+    # (None where the event has none), note_id is the index of the token's note in its track (-1 for none)
+    type: List[int]
+    value: List[int]
+    time: List[Optional[int]]
+    program: List[Optional[int]]
+    desc: List[int]
+    note_id: List[int]
+
+
+@dataclass
+class TokenStream:
+    length: int
+    compound: bool
+    # One column set for plain streams, one per sub-token position for compound tokens (CPWord, Octuple...)
+    positions: List[TokenColumns]
+
+
+@dataclass
+class ColumnarTokens:
+    table: List[Any] = field(default_factory=list)
+    # False when the tokenizer returned a single TokSequence instead of one per track
+    nested: bool = True
+    streams: List[TokenStream] = field(default_factory=list)
+
+
+class ColumnBuilder:
+    def __init__(self) -> None:
+        self.columnar = ColumnarTokens()
+        # Keyed by (type, value): 60, 60.0 and True must not share an entry
+        self._index: Dict[Tuple[type, Any], int] = {}
+
+    def add_tokens(
+        self, tokens: Union[TokSequence, List[TokSequence]], links: Optional[NoteLinks] = None
+    ) -> ColumnarTokens:
+        if isinstance(tokens, TokSequence):
+            self.columnar.nested = False
+            tokens = [tokens]
+        for index, sequence in enumerate(tokens):
+            token_notes = links.token_notes[index].tolist() if links is not None else [-1] * len(sequence.events)
+            self.columnar.streams.append(self._build_stream(sequence.events, token_notes))
+        return self.columnar
+
+    def _build_stream(self, events: List[Any], token_notes: List[int]) -> TokenStream:
+        if events and isinstance(events[0], list):
+            # All the sub-tokens of a compound token belong to its note
+            positions = [self._build_columns(list(position), token_notes) for position in zip(*events)]
+            return TokenStream(len(events), True, positions)
+        return TokenStream(len(events), False, [self._build_columns(events, token_notes)])
+
+    def _build_columns(self, events: List[Event], token_notes: List[int]) -> TokenColumns:
+        if events:
+            types, values, times, programs, descs = map(list, zip(*map(_EVENT_FIELDS, events)))
+        else:
+            types, values, times, programs, descs = [], [], [], [], []
+        # Programs often come as NumPy ints from miditoolkit, there are only a few distinct ones
+        program_values = {program: None if program is None else int(program) for program in set(programs)}
+        return TokenColumns(
+            type=self._index_column(types),
+            value=self._index_column(values),
+            time=times,
+            program=[program_values[program] for program in programs],
+            desc=self._index_column(descs),
+            note_id=token_notes,
+        )
+
+    def _index_column(self, values: List[Any]) -> List[int]:
+        keys = list(zip(map(type, values), values))
+        try:
+            for key in dict.fromkeys(keys):
+                if key not in self._index:
+                    self._index[key] = len(self.columnar.table)
+                    self.columnar.table.append(key[1])
+            return list(map(self._index.__getitem__, keys))
+        except TypeError:
+            # Unhashable values (chord descs are lists), fall back to one lookup per value
+            return [self._index_value(value) for value in values]
+
+    def _index_value(self, value: Any) -> int:
+        try:
+            key: Tuple[type, Any] = (type(value), value)
+            hash(key)
+        except TypeError:
+            key = (type(value), json.dumps(value, cls=TokSequenceEncoder))
+        if key not in self._index:
+            self._index[key] = len(self.columnar.table)
+            self.columnar.table.append(value)
+        return self._index[key]
+
+
+def build_token_columns(
+    tokens: Union[TokSequence, List[TokSequence]], links: Optional[NoteLinks] = None
+) -> ColumnarTokens:
+    return ColumnBuilder().add_tokens(tokens, links)
+
+
+def serialize_columnar_tokens_and_notes(
+    tokens: Union[TokSequence, List[TokSequence]], notes: List[NoteTable], links: Optional[NoteLinks] = None
+) -> bytes:
+    columnar = build_token_columns(tokens, links)
+    # The notes are written from their tables and spliced in after the tokens
+    payload = {
+        "format": COLUMNAR_FORMAT,
+        "table": columnar.table,
+        "tokens": {
+            "nested": columnar.nested,
+            "streams": [
+                {
+                    "length": stream.length,
+                    "compound": stream.compound,
+                    "positions": [position.__dict__ for position in stream.positions],
+                }
+                for stream in columnar.streams
+            ],
+        },
+    }
+    serialized = json.dumps(payload, cls=TokSequenceEncoder, separators=(",", ":"))
+    note_tokens = json.dumps(_note_token_columns(links, lambda column: column.tolist()), separators=(",", ":"))
+    return f'{serialized[:-1]},"notes":{serialize_note_tables(notes)},"note_tokens":{note_tokens}}}'.encode()
+
+
+def serialize_packed_tokens_and_notes(
+    tokens: Union[TokSequence, List[TokSequence]], notes: List[NoteTable], links: Optional[NoteLinks] = None
+) -> bytes:
+    # Same layout as the columnar format, as MessagePack with every column a little-endian integer array.
+    # Note names are left out, they only depend on the pitch.
+    columnar = build_token_columns(tokens, links)
+    payload = {
+        "format": PACKED_FORMAT,
+        "table": columnar.table,
+        "tokens": {
+            "nested": columnar.nested,
+            "streams": [
+                {
+                    "length": stream.length,
+                    "compound": stream.compound,
+                    "positions": [_pack_columns(position) for position in stream.positions],
+                }
+                for stream in columnar.streams
+            ],
+        },
+        "notes": [_pack_notes(track_notes) for track_notes in notes],
+        "note_tokens": _note_token_columns(links, lambda column: _compact_array(column.tolist())),
+    }
+    return packb(payload)
+
+
+def serialize_id_tokens_and_notes(
+    tokens: Union[TokSequence, List[TokSequence]], notes: List[NoteTable], links: Optional[NoteLinks] = None
+) -> bytes:
+    # Only the vocabulary ids of the tokens (one list per compound token), for clients decoding them with
+    # the tokenizer's vocabulary from /vocab, and next to them the time, program and note index of every
+    # token. Compound tokens take the first time and program of their sub-tokens.
+    nested = not isinstance(tokens, TokSequence)
+    streams = []
+    for index, sequence in enumerate(tokens if nested else [tokens]):
+        events = sequence.events
+        compound = bool(events) and isinstance(events[0], list)
+        times, programs = _token_times_and_programs(events, compound)
+        streams.append(
+            {
+                "length": len(events),
+                "compound": compound,
+                "ids": sequence.ids,
+                "time": times,
+                "program": programs,
+                "note_id": links.token_notes[index].tolist() if links is not None else [-1] * len(events),
+            }
+        )
+    payload = {"format": IDS_FORMAT, "tokens": {"nested": nested, "streams": streams}}
+    serialized = json.dumps(payload, cls=TokSequenceEncoder, separators=(",", ":"))
+    note_tokens = json.dumps(_note_token_columns(links, lambda column: column.tolist()), separators=(",", ":"))
+    return f'{serialized[:-1]},"notes":{serialize_note_tables(notes)},"note_tokens":{note_tokens}}}'.encode()
+
+
+def _token_times_and_programs(events: List[Any], compound: bool) -> Tuple[List[Optional[int]], List[Optional[int]]]:
+    if not compound:
+        times = [event.time for event in events]
+        programs = [event.program for event in events]
+    else:
+        times = [next((sub.time for sub in event if sub.time is not None), None) for event in events]
+        programs = [next((sub.program for sub in event if sub.program is not None), None) for event in events]
+    # Programs often come as NumPy ints from miditoolkit
+    return times, [None if program is None else int(program) for program in programs]
+
+
+def _note_token_columns(links: Optional[NoteLinks], convert: Callable[[np.ndarray], Any]) -> Optional[List[Any]]:
+    # Per track, the first token and the end (last token + 1) of each note's token span, -1 for none
+    if links is None:
+        return None
+    return [
+        {"first_token": convert(note_tokens[:, 0]), "end_token": convert(note_tokens[:, 1])}
+        for note_tokens in links.note_tokens
+    ]
+
+
+def _pack_columns(columns: TokenColumns) -> Dict[str, np.ndarray]:
+    return {name: _compact_array(getattr(columns, name)) for name in COLUMN_NAMES}
+
+
+def _pack_notes(table: NoteTable) -> Dict[str, Any]:
+    packed: Dict[str, Any] = {"length": len(table)}
+    for name in NOTE_COLUMN_NAMES:
+        packed[name] = _compact_array(getattr(table, name))
+    return packed
+
+
+def _compact_array(values: Union[List[Optional[int]], np.ndarray]) -> np.ndarray:
+    # Smallest integer type holding the column, most columns are table indexes that fit a byte
+    if isinstance(values, np.ndarray):
+        array = values.astype(np.int64)
+    elif None in values:
+        return np.array([PACKED_NULL if value is None else value for value in values], dtype="<i4")
+    else:
+        array = np.array(values, dtype=np.int64)
+    if not len(array):
+        return array.astype("<i4")
+    low, high = array.min(), array.max()
+    for dtype in ("u1", "i1", "<u2", "<i2", "<i4"):
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return array.astype(dtype)
+    raise ValueError("Column values don't fit in 32 bits")
+
+
+def decode_columnar_tokens(data: Dict[str, Any]) -> List[Any]:
+    # Rebuilds the row format (one dict per event) from a columnar response's data
+    table = data["table"]
+
+    def decode_columns(columns: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "type": table[type_],
+                "value": table[value],
+                "time": time,
+                "program": program,
+                "desc": table[desc],
+                "note_id": None if note_id < 0 else note_id,
+            }
+            for type_, value, time, program, desc, note_id in zip(*(columns[name] for name in COLUMN_NAMES))
+        ]
+
+    # Per stream, one dict per token, or one list of dicts per compound token
+    streams: List[List[Any]] = []
+    for stream in data["tokens"]["streams"]:
+        positions = [decode_columns(columns) for columns in stream["positions"]]
+        if stream["compound"]:
+            streams.append([list(compound) for compound in zip(*positions)])
+        else:
+            streams.append(positions[0] if positions else [])
+    return streams if data["tokens"]["nested"] else streams[0]
+
+
+def decode_packed_tokens(data: Dict[str, Any]) -> List[Any]:
+    # Turns a packed response's data back into the columnar layout, then into rows
+    def decode_column(name: str, packed: Dict[str, Any]) -> List[Optional[int]]:
+        values = unpack_array(packed).tolist()
+        if name in ("time", "program"):
+            return [None if value == PACKED_NULL else value for value in values]
+        return values
+
+    streams = [
+        {
+            **stream,
+            "positions": [
+                {name: decode_column(name, columns[name]) for name in COLUMN_NAMES} for columns in stream["positions"]
+            ],
+        }
+        for stream in data["tokens"]["streams"]
+    ]
+    return decode_columnar_tokens({"table": data["table"], "tokens": {**data["tokens"], "streams": streams}})
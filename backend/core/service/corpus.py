@@ -0,0 +1,276 @@
+import json
+import multiprocessing
+import os
+import struct
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass, field
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from core.api.model import ConfigModel
+from core.service.message_pack import packb, unpack_array, unpackb
+from core.service.note_table import NOTE_COLUMN_NAMES, NoteTable
+
+MIDI_EXTENSIONS = (".mid", ".midi")
+# Bump whenever the record or manifest format changes, older stores are then refused instead of mixed in
+CORPUS_STORE_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+RECORD_LENGTH = struct.Struct(">I")
+
+
+class CorpusStoreError(ValueError):
+    pass
+
+
+@dataclass
+class CorpusResult:
+    # What a worker sends back for one file: its packed record, or why it failed
+    path: str
+    record: Optional[bytes] = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+
+def find_midi_files(root: str) -> List[str]:
+    # Paths relative to the corpus root with "/" separators, sorted so runs visit files in the same order
+    paths = []
+    for directory, directories, names in os.walk(root):
+        directories.sort()
+        for name in sorted(names):
+            if name.lower().endswith(MIDI_EXTENSIONS):
+                paths.append(os.path.relpath(os.path.join(directory, name), root).replace(os.sep, "/"))
+    return paths
+
+
+def process_corpus_file(user_config: ConfigModel, root: str, path: str) -> CorpusResult:
+    # Runs in the pool's worker processes. Any error is reported for this file instead of stopping the run.
+    from core.service.midi_processing import midi_to_notes, retrieve_information_from_midi, tokenize_midi_file
+    from core.service.parsed_score import ParsedScore
+
+    start_time = time.perf_counter()
+    try:
+        with open(os.path.join(root, path), "rb") as file:
+            score = ParsedScore.from_bytes(file.read())
+        tokens, _, _ = tokenize_midi_file(user_config, score)
+        music_info = retrieve_information_from_midi(score)
+        if music_info is None:
+            raise ValueError("Invalid metrics")
+        streams = tokens if isinstance(tokens, list) else [tokens]
+        record = {
+            "path": path,
+            # One array of ids per token stream, (tokens, sub-tokens) shaped for compound tokens (CPWord...)
+            "tokens": [_token_ids(stream.ids) for stream in streams],
+            "notes": [table.columns() for table in midi_to_notes(score.midi)],
+            "metrics": music_info.model_dump(),
+        }
+        return CorpusResult(path, record=packb(record), seconds=time.perf_counter() - start_time)
+    except Exception as e:
+        return CorpusResult(path, error=str(e) or type(e).__name__, seconds=time.perf_counter() - start_time)
+
+
+def _token_ids(ids: List[Any]) -> Dict[str, Any]:
+    array = np.asarray(ids, dtype=np.int32)
+    return {"shape": list(array.shape), "ids": array}
+
+
+def unpack_corpus_record(packed: bytes) -> Dict[str, Any]:
+    record = unpackb(packed)
+    record["tokens"] = [unpack_array(stream["ids"]).reshape(stream["shape"]) for stream in record["tokens"]]
+    record["notes"] = [
+        NoteTable(**{name: unpack_array(table[name]) for name in NOTE_COLUMN_NAMES}) for table in record["notes"]
+    ]
+    return record
+
+
+@dataclass
+class CorpusManifest:
+    version: int
+    config: Dict[str, Any]
+    # Chunk file names, in the order they were written
+    chunks: List[str] = field(default_factory=list)
+    # Path of every stored file -> [chunk index, byte offset, length] of its record
+    files: Dict[str, List[int]] = field(default_factory=dict)
+    # Path -> error of the files that failed
+    failed: Dict[str, str] = field(default_factory=dict)
+
+
+class CorpusStore:
+    # Records go to numbered chunk files, each a sequence of length-prefixed MessagePack records, and the
+    # manifest says which file is where. Chunks are written whole and the manifest replaced after them (both
+    # atomically), so an interrupted run loses at most the chunk it was filling and resumes after the last
+    # one written.
+    def __init__(self, directory: str, user_config: ConfigModel, chunk_files: int = 256) -> None:
+        self.directory = directory
+        self.chunk_files = max(chunk_files, 1)
+        config = user_config.model_dump()
+        os.makedirs(directory, exist_ok=True)
+        manifest = self.read_manifest(directory)
+        if manifest is None:
+            manifest = CorpusManifest(CORPUS_STORE_VERSION, config)
+        elif manifest.config != config:
+            raise CorpusStoreError(f"{directory} holds results for another config")
+        self.manifest = manifest
+        self._pending: List[CorpusResult] = []
+
+    @staticmethod
+    def read_manifest(directory: str) -> Optional[CorpusManifest]:
+        try:
+            with open(os.path.join(directory, MANIFEST_NAME)) as file:
+                manifest = CorpusManifest(**json.load(file))
+        except FileNotFoundError:
+            return None
+        if manifest.version != CORPUS_STORE_VERSION:
+            raise CorpusStoreError(f"{directory} was written by another version of the corpus store")
+        return manifest
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.manifest.files or path in self.manifest.failed
+
+    def retry_failed(self) -> None:
+        self.manifest.failed.clear()
+
+    def append(self, result: CorpusResult) -> None:
+        self._pending.append(result)
+        if len(self._pending) >= self.chunk_files:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        stored = [result for result in pending if result.record is not None]
+        if stored:
+            chunk_index = len(self.manifest.chunks)
+            name = f"chunk-{chunk_index:05d}.bin"
+            parts: List[bytes] = []
+            offset = 0
+            for result in stored:
+                assert result.record is not None
+                parts.append(RECORD_LENGTH.pack(len(result.record)))
+                parts.append(result.record)
+                self.manifest.files[result.path] = [chunk_index, offset + RECORD_LENGTH.size, len(result.record)]
+                self.manifest.failed.pop(result.path, None)
+                offset += RECORD_LENGTH.size + len(result.record)
+            self._write(name, b"".join(parts))
+            self.manifest.chunks.append(name)
+        for result in pending:
+            if result.error is not None:
+                self.manifest.failed[result.path] = result.error
+        self._write(MANIFEST_NAME, json.dumps(asdict(self.manifest)).encode())
+
+    def read(self, path: str) -> Dict[str, Any]:
+        chunk_index, offset, length = self.manifest.files[path]
+        with open(os.path.join(self.directory, self.manifest.chunks[chunk_index]), "rb") as file:
+            file.seek(offset)
+            return unpack_corpus_record(file.read(length))
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        # Every stored record, chunk by chunk
+        for name in self.manifest.chunks:
+            with open(os.path.join(self.directory, name), "rb") as file:
+                data = file.read()
+            offset = 0
+            while offset < len(data):
+                (length,) = RECORD_LENGTH.unpack_from(data, offset)
+                offset += RECORD_LENGTH.size
+                yield unpack_corpus_record(data[offset : offset + length])
+                offset += length
+
+    def _write(self, name: str, data: bytes) -> None:
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary_path, os.path.join(self.directory, name))
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+
+@dataclass
+class CorpusRunStats:
+    files: int = 0
+    skipped: int = 0
+    processed: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        return (self.processed + self.failed) / self.seconds if self.seconds > 0 else 0.0
+
+
+def run_corpus(
+    root: str,
+    store: CorpusStore,
+    user_config: ConfigModel,
+    workers: int,
+    on_result: Optional[Callable[[CorpusResult, CorpusRunStats], None]] = None,
+    process_file: Callable[[ConfigModel, str, str], CorpusResult] = process_corpus_file,
+) -> CorpusRunStats:
+    # Processes the files of the corpus the store doesn't have yet over a pool of worker processes. Only a
+    # few files per worker are in flight at a time, and the store is flushed when the run ends or is
+    # interrupted, so everything finished so far is kept. A worker dying (e.g. a crash in a parser) fails
+    # every file in flight, so the pool is started again and those files are run again one at a time: only a
+    # file that kills a worker on its own is failed.
+    paths = find_midi_files(root)
+    pending = [path for path in paths if path not in store]
+    stats = CorpusRunStats(files=len(paths), skipped=len(paths) - len(pending))
+    start_time = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    remaining = iter(pending)
+    suspects: List[str] = []
+
+    def record(result: CorpusResult) -> None:
+        store.append(result)
+        if result.error is None:
+            stats.processed += 1
+        else:
+            stats.failed += 1
+        stats.seconds = time.perf_counter() - start_time
+        if on_result is not None:
+            on_result(result, stats)
+
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    try:
+        running: Dict[Future, str] = {}
+        while True:
+            if suspects:
+                if not running:
+                    path = suspects.pop(0)
+                    running[pool.submit(process_file, user_config, root, path)] = path
+            else:
+                for path in islice(remaining, workers * 4 - len(running)):
+                    running[pool.submit(process_file, user_config, root, path)] = path
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                # The other files in flight fail along with it
+                done, _ = wait(running)
+            broken = []
+            for future in done:
+                path = running.pop(future)
+                if isinstance(future.exception(), BrokenProcessPool):
+                    broken.append(path)
+                else:
+                    record(future.result())
+            if broken:
+                pool.shutdown(wait=False)
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+                if len(broken) == 1:
+                    record(CorpusResult(broken[0], error="A worker process died"))
+                else:
+                    suspects.extend(sorted(broken))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        store.flush()
+        stats.seconds = time.perf_counter() - start_time
+    return stats
@@ -0,0 +1,213 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable, Literal, Optional
+
+ExecutorBackend = Literal["process", "thread", "inline"]
+
+
+class ExecutorQueueFullError(Exception):
+    pass
+
+
+class ExecutorTimeoutError(Exception):
+    pass
+
+
+@dataclass
+class ExecutorStats:
+    backend: str
+    workers: int
+    max_queue: int
+    running: int
+    queued: int
+    max_queued: int
+    submitted: int
+    completed: int
+    failed: int
+    rejected: int
+    timed_out: int
+    total_wait_time: float
+    max_wait_time: float
+    total_run_time: float
+
+    @property
+    def mean_wait_time(self) -> float:
+        started = self.submitted - self.rejected
+        return self.total_wait_time / started if started else 0.0
+
+
+# Runs CPU-bound jobs off the event loop. At most `workers` jobs run at once and at most `max_queue`
+# more wait for a free worker, anything beyond that is rejected straight away. `timeout` bounds the
+# time a caller waits for a job, queueing included.
+class ProcessingExecutor:
+    def __init__(
+        self,
+        backend: ExecutorBackend,
+        workers: int,
+        max_queue: int,
+        timeout: float,
+        initializer: Optional[Callable[[], None]] = None,
+    ) -> None:
+        if backend not in ("process", "thread", "inline"):
+            raise ValueError(backend)
+        self.backend = backend
+        self.workers = max(workers, 1)
+        self.max_queue = max(max_queue, 0)
+        self.timeout = timeout
+        self._initializer = initializer
+        self._pool: Optional[Executor] = None
+        self._started = False
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._running = 0
+        self._queued = 0
+        self._max_queued = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._total_wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._total_run_time = 0.0
+
+    def start(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        if self.backend != "process":
+            # Threads share the parent's state, so the initializer only needs to run once
+            if self._initializer is not None:
+                self._initializer()
+            if self.backend == "thread":
+                self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            return
+        self._pool = self._create_process_pool()
+        # Spawn the workers (and run their initializer) now rather than on the first requests
+        for _ in range(self.workers):
+            self._pool.submit(_noop)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self._started = False
+
+    async def run(self, function: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        # `timeout` overrides the executor's own for this job
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        if self._running + self._queued >= self.workers + self.max_queue:
+            self._rejected += 1
+            self._submitted += 1
+            raise ExecutorQueueFullError()
+
+        self._submitted += 1
+        timeout = timeout if timeout is not None else self.timeout
+        deadline = time.perf_counter() + timeout
+        enqueued_at = time.perf_counter()
+        if self._slots.locked():
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=timeout)
+            except asyncio.TimeoutError:
+                self._timed_out += 1
+                raise ExecutorTimeoutError()
+            finally:
+                self._queued -= 1
+        else:
+            await self._slots.acquire()
+
+        started_at = time.perf_counter()
+        wait_time = started_at - enqueued_at
+        self._total_wait_time += wait_time
+        self._max_wait_time = max(self._max_wait_time, wait_time)
+        self._running += 1
+
+        if self.backend == "inline":
+            self.start()
+            try:
+                return self._finish(function(*args), started_at)
+            except Exception:
+                self._failed += 1
+                raise
+            finally:
+                self._release()
+
+        try:
+            future = self._submit(function, *args)
+        except Exception:
+            self._failed += 1
+            self._release()
+            raise
+        # The slot is held until the job really finishes: a timed out job keeps its worker busy
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda _: self._release_from_worker(loop))
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=deadline - time.perf_counter())
+        except asyncio.TimeoutError:
+            self._timed_out += 1
+            raise ExecutorTimeoutError()
+        except Exception:
+            self._failed += 1
+            raise
+        return self._finish(result, started_at)
+
+    def stats(self) -> ExecutorStats:
+        return ExecutorStats(
+            backend=self.backend,
+            workers=self.workers,
+            max_queue=self.max_queue,
+            running=self._running,
+            queued=self._queued,
+            max_queued=self._max_queued,
+            submitted=self._submitted,
+            completed=self._completed,
+            failed=self._failed,
+            rejected=self._rejected,
+            timed_out=self._timed_out,
+            total_wait_time=self._total_wait_time,
+            max_wait_time=self._max_wait_time,
+            total_run_time=self._total_run_time,
+        )
+
+    def _submit(self, function: Callable[..., Any], *args: Any) -> Future:
+        self.start()
+        assert self._pool is not None
+        try:
+            return self._pool.submit(function, *args)
+        except BrokenProcessPool:
+            # A crashed worker breaks the whole process pool, so start over with a fresh one
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._create_process_pool()
+            return self._pool.submit(function, *args)
+
+    def _create_process_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=self._initializer
+        )
+
+    def _finish(self, result: Any, started_at: float) -> Any:
+        self._completed += 1
+        self._total_run_time += time.perf_counter() - started_at
+        return result
+
+    def _release_from_worker(self, loop: asyncio.AbstractEventLoop) -> None:
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # The loop is already closed, so there is nobody left waiting for the slot
+            self._release()
+
+    def _release(self) -> None:
+        self._running -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+
+def _noop() -> None:
+    pass
@@ -0,0 +1,236 @@
+import asyncio
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core.constants import JOB_CONCURRENCY, JOB_MAX_BYTES, JOB_MAX_PENDING, JOB_TTL, PROCESSING_BACKEND
+from core.service.relay import Relay
+
+
+@dataclass
+class Job:
+    job_id: str
+    # Updates are applied on the event loop the job was created on, whatever thread they come from
+    loop: asyncio.AbstractEventLoop
+    created_at: float
+    status: str = "queued"
+    # Stages by name in the order they started: status (running or done), summed seconds, and tokenize
+    # progress (tracks_done out of tracks)
+    stages: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    result: Optional[bytes] = None
+    media_type: Optional[str] = None
+    server_timing: Optional[str] = None
+    error: Optional[str] = None
+    status_code: Optional[int] = None
+    finished_at: Optional[float] = None
+    version: int = 0
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.result) if self.result is not None else 0
+
+    def start(self) -> None:
+        self.status = "running"
+        self._notify()
+
+    def apply(self, event: Dict[str, Any]) -> None:
+        # One StageTimer event from the worker
+        if self.finished:
+            return
+        stage = self.stages.setdefault(event["stage"], {"stage": event["stage"], "status": "running", "seconds": 0.0})
+        if event["status"] == "started":
+            stage["status"] = "running"
+        elif event["status"] == "finished":
+            stage["status"] = "done"
+            stage["seconds"] += event["seconds"]
+        else:
+            stage.update((key, value) for key, value in event.items() if key not in ("stage", "status"))
+        self._notify()
+
+    def finish(self, result: bytes, media_type: str, timings: Dict[str, float], finished_at: float) -> None:
+        # Progress events may still be on their way, the final stage durations come from the timings
+        for name, seconds in timings.items():
+            if name != "total":
+                self.stages[name] = {**self.stages.get(name, {"stage": name}), "status": "done", "seconds": seconds}
+        self.status, self.result, self.media_type, self.finished_at = "done", result, media_type, finished_at
+        self.server_timing = ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items())
+        self._notify()
+
+    def fail(self, error: str, status_code: int, finished_at: float) -> None:
+        self.status, self.error, self.status_code, self.finished_at = "failed", error, status_code, finished_at
+        self._notify()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "stages": list(self.stages.values()),
+            "error": self.error,
+        }
+
+    async def wait_for_change(self, version: int, timeout: float) -> bool:
+        # False when nothing changed since `version` within the timeout
+        changed = self.changed
+        if self.version != version:
+            return True
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def _notify(self) -> None:
+        self.version += 1
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class ProgressReporter:
+    # Sent along with a job to the processing worker, where it is the StageTimer listener. Events go through
+    # the queue of the store's relay.
+    def __init__(self, job_id: str, events: Any) -> None:
+        self.job_id = job_id
+        self.events = events
+
+    def __call__(self, event: Dict[str, Any]) -> None:
+        self.events.put((self.job_id, event))
+
+
+@dataclass
+class JobStoreStats:
+    jobs: int
+    queued: int
+    running: int
+    bytes: int
+    max_bytes: int
+    max_pending: int
+    concurrency: int
+    ttl: float
+    created: int
+    rejected: int
+    expired: int
+    evicted: int
+
+
+class JobStore:
+    # Finished jobs are kept `ttl` seconds, the oldest ones are dropped first when their results add up to
+    # more than `max_bytes`. At most `max_pending` jobs are queued or running, `concurrency` of them running.
+    def __init__(
+        self,
+        max_pending: int,
+        concurrency: int,
+        ttl: float,
+        max_bytes: int,
+        processes: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_pending = max_pending
+        self.concurrency = max(concurrency, 1)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.processes = processes
+        self.size = 0
+        self._clock = clock
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._lock = threading.Lock()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._relay = Relay(self._apply_event, processes)
+        self._created = 0
+        self._rejected = 0
+        self._expired = 0
+        self._evicted = 0
+
+    def create(self) -> Optional[Job]:
+        # None when too many jobs are pending
+        with self._lock:
+            self._expire()
+            if sum(not job.finished for job in self._jobs.values()) >= self.max_pending:
+                self._rejected += 1
+                return None
+            job = Job(secrets.token_urlsafe(16), asyncio.get_running_loop(), self._clock())
+            self._jobs[job.job_id] = job
+            self._created += 1
+            return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def finished(self, job: Job) -> None:
+        # Called once the job's result or error is set, to account for its size
+        with self._lock:
+            if self._jobs.get(job.job_id) is not job:
+                return
+            # Finished jobs are kept in the order they finished, so the oldest are at the front
+            self._jobs.move_to_end(job.job_id)
+            self.size += job.nbytes
+            for job_id in list(self._jobs):
+                if self.size <= self.max_bytes:
+                    break
+                if self._jobs[job_id].finished:
+                    self.size -= self._jobs.pop(job_id).nbytes
+                    self._evicted += 1
+
+    def slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        return self._slots
+
+    def reporter(self, job: Job) -> ProgressReporter:
+        return ProgressReporter(job.job_id, self._relay.queue())
+
+    def stats(self) -> JobStoreStats:
+        with self._lock:
+            self._expire()
+            jobs = list(self._jobs.values())
+            return JobStoreStats(
+                jobs=len(jobs),
+                queued=sum(job.status == "queued" for job in jobs),
+                running=sum(job.status == "running" for job in jobs),
+                bytes=self.size,
+                max_bytes=self.max_bytes,
+                max_pending=self.max_pending,
+                concurrency=self.concurrency,
+                ttl=self.ttl,
+                created=self._created,
+                rejected=self._rejected,
+                expired=self._expired,
+                evicted=self._evicted,
+            )
+
+    def close(self) -> None:
+        # Stops the relay thread, the next job starts it again
+        self._relay.close()
+
+    def _apply_event(self, item: Tuple[str, Dict[str, Any]]) -> None:
+        job_id, event = item
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return
+        try:
+            job.loop.call_soon_threadsafe(job.apply, event)
+        except RuntimeError:
+            # The job's event loop is closed
+            pass
+
+    def _expire(self) -> None:
+        now = self._clock()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at + self.ttl <= now:
+                del self._jobs[job_id]
+                self.size -= job.nbytes
+                self._expired += 1
+
+
+# Progress has to cross processes only with the process pool backend
+job_store = JobStore(JOB_MAX_PENDING, JOB_CONCURRENCY, JOB_TTL, JOB_MAX_BYTES, PROCESSING_BACKEND == "process")
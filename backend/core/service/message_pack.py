@@ -0,0 +1,212 @@
+import struct
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+# A small MessagePack (https://msgpack.org/) codec for the binary /process responses. It covers the types
+# the responses are made of; NumPy arrays are written as {"dtype": ..., "data": <bin>} maps holding
+# their little-endian buffer, so clients can view them as typed arrays without decoding element by element.
+
+_PACK_UINT = [(0xFF, 0xCC, ">B"), (0xFFFF, 0xCD, ">H"), (0xFFFFFFFF, 0xCE, ">I"), (0xFFFFFFFFFFFFFFFF, 0xCF, ">Q")]
+_PACK_INT = [(-0x80, 0xD0, ">b"), (-0x8000, 0xD1, ">h"), (-0x80000000, 0xD2, ">i"), (-0x8000000000000000, 0xD3, ">q")]
+
+
+class MessagePackError(ValueError):
+    pass
+
+
+def packb(obj: Any) -> bytes:
+    parts: List[bytes] = []
+    _pack(obj, parts.append)
+    return b"".join(parts)
+
+
+def pack_array(array: np.ndarray) -> Dict[str, Any]:
+    # Typed arrays are sent little-endian whatever the server's byte order
+    array = np.ascontiguousarray(array)
+    little_endian = array.astype(array.dtype.newbyteorder("<"), copy=False)
+    return {"dtype": little_endian.dtype.name, "data": little_endian.tobytes()}
+
+
+def unpack_array(packed: Dict[str, Any]) -> np.ndarray:
+    return np.frombuffer(packed["data"], dtype=np.dtype(packed["dtype"]).newbyteorder("<"))
+
+
+def _pack(obj: Any, append: Callable[[bytes], None]) -> None:
+    obj_type = type(obj)
+    if obj is None:
+        append(b"\xc0")
+    elif obj_type is bool or isinstance(obj, np.bool_):
+        append(b"\xc3" if obj else b"\xc2")
+    elif obj_type is int or isinstance(obj, np.integer):
+        _pack_int(int(obj), append)
+    elif obj_type is float or isinstance(obj, np.floating):
+        append(struct.pack(">Bd", 0xCB, float(obj)))
+    elif obj_type is str:
+        _pack_str(obj, append)
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        _pack_bin(bytes(obj), append)
+    elif isinstance(obj, (list, tuple)):
+        _pack_header(len(obj), 0x90, 0xDC, 0xDD, 15, append)
+        for item in obj:
+            _pack(item, append)
+    elif isinstance(obj, dict):
+        _pack_header(len(obj), 0x80, 0xDE, 0xDF, 15, append)
+        for key, value in obj.items():
+            _pack(key, append)
+            _pack(value, append)
+    elif isinstance(obj, np.ndarray):
+        _pack(pack_array(obj), append)
+    else:
+        raise MessagePackError(f"Cannot pack {obj_type.__name__}")
+
+
+def _pack_int(value: int, append: Callable[[bytes], None]) -> None:
+    if 0 <= value <= 0x7F:
+        append(bytes((value,)))
+    elif -32 <= value < 0:
+        append(bytes((value & 0xFF,)))
+    elif value > 0:
+        for maximum, code, format_ in _PACK_UINT:
+            if value <= maximum:
+                append(bytes((code,)) + struct.pack(format_, value))
+                return
+        raise MessagePackError(f"Integer out of range: {value}")
+    else:
+        for minimum, code, format_ in _PACK_INT:
+            if value >= minimum:
+                append(bytes((code,)) + struct.pack(format_, value))
+                return
+        raise MessagePackError(f"Integer out of range: {value}")
+
+
+def _pack_str(value: str, append: Callable[[bytes], None]) -> None:
+    encoded = value.encode("utf-8")
+    length = len(encoded)
+    if length <= 31:
+        append(bytes((0xA0 | length,)))
+    elif length <= 0xFF:
+        append(struct.pack(">BB", 0xD9, length))
+    else:
+        _pack_length(length, 0xDA, 0xDB, append)
+    append(encoded)
+
+
+def _pack_bin(value: bytes, append: Callable[[bytes], None]) -> None:
+    length = len(value)
+    if length <= 0xFF:
+        append(struct.pack(">BB", 0xC4, length))
+    else:
+        _pack_length(length, 0xC5, 0xC6, append)
+    append(value)
+
+
+def _pack_header(
+    length: int, fix_code: int, code16: int, code32: int, fix_max: int, append: Callable[[bytes], None]
+) -> None:
+    if length <= fix_max:
+        append(bytes((fix_code | length,)))
+    else:
+        _pack_length(length, code16, code32, append)
+
+
+def _pack_length(length: int, code16: int, code32: int, append: Callable[[bytes], None]) -> None:
+    if length <= 0xFFFF:
+        append(struct.pack(">BH", code16, length))
+    elif length <= 0xFFFFFFFF:
+        append(struct.pack(">BI", code32, length))
+    else:
+        raise MessagePackError(f"Length out of range: {length}")
+
+
+def unpackb(data: bytes) -> Any:
+    obj, offset = _unpack(memoryview(data), 0)
+    if offset != len(data):
+        raise MessagePackError("Trailing data")
+    return obj
+
+
+_FIXED = {
+    0xC0: None,
+    0xC2: False,
+    0xC3: True,
+}
+_NUMBERS = {
+    0xCA: ">f",
+    0xCB: ">d",
+    0xCC: ">B",
+    0xCD: ">H",
+    0xCE: ">I",
+    0xCF: ">Q",
+    0xD0: ">b",
+    0xD1: ">h",
+    0xD2: ">i",
+    0xD3: ">q",
+}
+_LENGTHS = {0xC4: ">B", 0xC5: ">H", 0xC6: ">I", 0xD9: ">B", 0xDA: ">H", 0xDB: ">I"}
+_CONTAINERS = {0xDC: ">H", 0xDD: ">I", 0xDE: ">H", 0xDF: ">I"}
+
+
+def _unpack(data: memoryview, offset: int) -> Tuple[Any, int]:
+    try:
+        code = data[offset]
+    except IndexError:
+        raise MessagePackError("Truncated data")
+    offset += 1
+    if code <= 0x7F:
+        return code, offset
+    if code >= 0xE0:
+        return code - 0x100, offset
+    if 0xA0 <= code <= 0xBF:
+        return _unpack_str(data, offset, code & 0x1F)
+    if 0x90 <= code <= 0x9F:
+        return _unpack_list(data, offset, code & 0x0F)
+    if 0x80 <= code <= 0x8F:
+        return _unpack_dict(data, offset, code & 0x0F)
+    if code in _FIXED:
+        return _FIXED[code], offset
+    if code in _NUMBERS:
+        return _read(data, offset, _NUMBERS[code])
+    if code in _LENGTHS:
+        length, offset = _read(data, offset, _LENGTHS[code])
+        if code <= 0xC6:
+            if offset + length > len(data):
+                raise MessagePackError("Truncated data")
+            return bytes(data[offset : offset + length]), offset + length
+        return _unpack_str(data, offset, length)
+    if code in _CONTAINERS:
+        length, offset = _read(data, offset, _CONTAINERS[code])
+        if code <= 0xDD:
+            return _unpack_list(data, offset, length)
+        return _unpack_dict(data, offset, length)
+    raise MessagePackError(f"Unsupported type code: {code:#x}")
+
+
+def _read(data: memoryview, offset: int, format_: str) -> Tuple[Any, int]:
+    size = struct.calcsize(format_)
+    if offset + size > len(data):
+        raise MessagePackError("Truncated data")
+    return struct.unpack_from(format_, data, offset)[0], offset + size
+
+
+def _unpack_str(data: memoryview, offset: int, length: int) -> Tuple[str, int]:
+    if offset + length > len(data):
+        raise MessagePackError("Truncated data")
+    return bytes(data[offset : offset + length]).decode("utf-8"), offset + length
+
+
+def _unpack_list(data: memoryview, offset: int, length: int) -> Tuple[List[Any], int]:
+    items = []
+    for _ in range(length):
+        item, offset = _unpack(data, offset)
+        items.append(item)
+    return items, offset
+
+
+def _unpack_dict(data: memoryview, offset: int, length: int) -> Tuple[Dict[Any, Any], int]:
+    items = {}
+    for _ in range(length):
+        key, offset = _unpack(data, offset)
+        value, offset = _unpack(data, offset)
+        items[key] = value
+    return items, offset
@@ -0,0 +1,198 @@
+import math
+from functools import cached_property
+from itertools import chain
+from typing import Tuple
+
+import muspy
+import numpy as np
+
+from core.api.model import MetricsData
+
+# One row per note of every track. Metrics are computed from this array instead of walking the muspy
+# objects once per metric; their definitions follow muspy.metrics, so the values are the same.
+NOTE_DTYPE = np.dtype(
+    [
+        ("pitch", np.uint8),
+        ("start", np.int64),
+        ("end", np.int64),
+        ("velocity", np.uint8),
+        ("track", np.int32),
+        ("is_drum", np.bool_),
+    ]
+)
+
+# Pitch classes of the major and minor scales on C, rolled to the 12 roots: a (24, 12) mask
+_C_MAJOR = np.array([1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 1], dtype=bool)
+_C_MINOR = np.array([1, 0, 1, 1, 0, 1, 0, 1, 1, 0, 1, 0], dtype=bool)
+_SCALES = np.array([np.roll(scale, root) for scale in (_C_MAJOR, _C_MINOR) for root in range(12)])
+
+
+class MetricsEngine:
+    def __init__(self, notes: np.ndarray, resolution: int, length: int, measure_resolution: int) -> None:
+        # `length` is the end time of the last event of the score, notes or not, as muspy counts it
+        self.notes = notes
+        self.resolution = resolution
+        self.length = length
+        self.measure_resolution = max(measure_resolution, 1)
+        self.pitched = notes[~notes["is_drum"]]
+        self.drums = notes[notes["is_drum"]]
+
+    @classmethod
+    def from_music(cls, music: muspy.Music) -> "MetricsEngine":
+        rows = [
+            (note.pitch, note.time, note.time + note.duration, note.velocity, index, track.is_drum)
+            for index, track in enumerate(music.tracks)
+            for note in track.notes
+        ]
+        notes = np.array(rows, dtype=NOTE_DTYPE)
+        length = max((_track_end(track) for track in music.tracks), default=0)
+        if len(notes):
+            length = max(length, int(notes["end"].max()))
+        measure_resolution = music.resolution * 4
+        if music.time_signatures:
+            signature = music.time_signatures[0]
+            measure_resolution = music.resolution * 4 * signature.numerator // signature.denominator
+        return cls(notes, music.resolution, length, measure_resolution)
+
+    def metrics(self) -> MetricsData:
+        return MetricsData(
+            pitch_range=self.pitch_range(),
+            n_pitches_used=self.n_pitches_used(),
+            polyphony=_zero_if_nan(self.polyphony()),
+            empty_beat_rate=_zero_if_nan(self.empty_beat_rate()),
+            drum_pattern_consistency=_zero_if_nan(self.drum_pattern_consistency()),
+            pitch_class_entropy=_zero_if_nan(self.pitch_class_entropy()),
+            scale_consistency=_zero_if_nan(self.scale_consistency()),
+            groove_consistency=_zero_if_nan(self.groove_consistency()),
+        )
+
+    @cached_property
+    def pitch_histogram(self) -> np.ndarray:
+        return np.bincount(self.pitched["pitch"], minlength=128)
+
+    @cached_property
+    def pitch_class_histogram(self) -> np.ndarray:
+        return np.bincount(np.arange(128) % 12, weights=self.pitch_histogram, minlength=12)
+
+    @cached_property
+    def piano_roll(self) -> Tuple[int, int]:
+        # The sparse piano roll: the merged [start, end) intervals of every pitch. Only the two sums the
+        # metrics need are kept: active (time step, pitch) cells and time steps with any pitch active.
+        pitched = self.pitched
+        return (
+            _covered_length(pitched["start"], pitched["end"], pitched["pitch"].astype(np.int64)),
+            _covered_length(pitched["start"], pitched["end"], np.zeros(len(pitched), dtype=np.int64)),
+        )
+
+    @cached_property
+    def onsets(self) -> np.ndarray:
+        # The sparse onset matrix: measure * measure_resolution + position of every distinct onset, sorted
+        return np.unique(self.notes["start"])
+
+    def pitch_range(self) -> int:
+        # muspy gives -127 when only drums play, this gives 0 as for an empty score
+        if not len(self.pitched):
+            return 0
+        return int(self.pitched["pitch"].max()) - int(self.pitched["pitch"].min())
+
+    def n_pitches_used(self) -> int:
+        return int(np.count_nonzero(self.pitch_histogram))
+
+    def polyphony(self) -> float:
+        active_cells, active_steps = self.piano_roll
+        if active_steps < 1:
+            return math.nan
+        return active_cells / active_steps
+
+    def empty_beat_rate(self) -> float:
+        if self.length < 1:
+            return math.nan
+        n_beats = self.length // self.resolution + 1
+        # A note covers the beats of its start and of its end, both included
+        coverage = np.zeros(n_beats + 1, dtype=np.int64)
+        np.add.at(coverage, self.notes["start"] // self.resolution, 1)
+        np.add.at(coverage, self.notes["end"] // self.resolution + 1, -1)
+        return 1 - np.count_nonzero(np.cumsum(coverage[:-1])) / n_beats
+
+    def drum_pattern_consistency(self) -> float:
+        if not len(self.drums):
+            return math.nan
+        positions = self.drums["start"] % self.resolution
+        rates = [np.count_nonzero(pattern[positions]) / len(positions) for pattern in self._drum_patterns()]
+        return max(rates)
+
+    def pitch_class_entropy(self) -> float:
+        histogram = self.pitch_class_histogram
+        total = histogram.sum()
+        if total < 1:
+            return math.nan
+        probabilities = histogram[histogram > 0] / total
+        return float(-np.sum(probabilities * np.log2(probabilities)))
+
+    def scale_consistency(self) -> float:
+        histogram = self.pitch_class_histogram
+        total = histogram.sum()
+        if total < 1:
+            return math.nan
+        return float((_SCALES @ histogram).max() / total)
+
+    def groove_consistency(self) -> float:
+        # 1 - mean Hamming distance between the onset patterns of neighbouring measures, all tracks included.
+        # With S_i the onsets of measure i, sum |S_i ^ S_i+1| = sum |S_i| + |S_i+1| - 2 |S_i & S_i+1|.
+        resolution = self.measure_resolution
+        n_measures = self.length // resolution + 1
+        if n_measures < 2:
+            return math.nan
+        onsets = self.onsets
+        measures = onsets // resolution
+        sizes = np.count_nonzero(measures > 0) + np.count_nonzero(measures < n_measures - 1)
+        shared = np.count_nonzero(np.isin(onsets + resolution, onsets))
+        return 1 - (sizes - 2 * shared) / (resolution * (n_measures - 1))
+
+    def _drum_patterns(self) -> Tuple[np.ndarray, np.ndarray]:
+        resolution = self.resolution
+        duple = np.zeros(resolution, dtype=bool)
+        triple = np.zeros(resolution, dtype=bool)
+        duple[0] = triple[0] = True
+        if resolution % 4 == 0:
+            duple[:: resolution // 4] = True
+        if resolution % 2 == 0:
+            duple[:: resolution // 2] = True
+        if resolution % 3 == 0:
+            triple[:: resolution // 3] = True
+        return duple, triple
+
+
+def retrieve_music_metrics(music: muspy.Music) -> MetricsData:
+    return MetricsEngine.from_music(music).metrics()
+
+
+def _covered_length(starts: np.ndarray, ends: np.ndarray, groups: np.ndarray) -> int:
+    # Total length of the union of the [start, end) intervals of each group, summed over the groups.
+    # Groups are moved apart on the time axis so one running maximum of the ends covers all of them.
+    if not len(starts):
+        return 0
+    offset = int(ends.max()) + 1
+    shifted_starts = starts + groups * offset
+    shifted_ends = ends + groups * offset
+    order = np.argsort(shifted_starts, kind="stable")
+    shifted_starts = shifted_starts[order]
+    shifted_ends = shifted_ends[order]
+    reached = np.maximum.accumulate(shifted_ends)
+    previous: np.ndarray = np.concatenate((shifted_starts[:1], reached[:-1]))
+    return int(np.maximum(shifted_ends - np.maximum(shifted_starts, previous), 0).sum())
+
+
+def _track_end(track: muspy.Track) -> int:
+    # End of the track's non-note events (muspy counts control changes, lyrics and chords in the length)
+    return max(
+        chain(
+            (event.time for event in chain(track.lyrics, track.annotations)),
+            (chord.end for chord in track.chords),
+        ),
+        default=0,
+    )
+
+
+def _zero_if_nan(value: float) -> float:
+    return 0.0 if math.isnan(value) else float(value)
@@ -1,18 +1,277 @@
-import math
-from io import BytesIO
-from typing import List, Tuple
+from copy import copy
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Iterator, List, Optional, Tuple
 
-import muspy
 import pydantic
-from miditok import TokenizerConfig
+from miditok import TokenizerConfig, TokSequence
 from miditoolkit import MidiFile
-from mido import MidiFile as MidoMidiFile
 
-from core.api.model import BasicInfoData, ConfigModel, MetricsData, MusicInformationData, Note
+from core.api.model import BasicInfoData, ConfigModel, MetricsData, MusicInformationData
+from core.service.columnar import (
+    serialize_columnar_tokens_and_notes,
+    serialize_id_tokens_and_notes,
+    serialize_packed_tokens_and_notes,
+)
+from core.service.metrics import retrieve_music_metrics
+from core.service.note_table import NoteTable
+from core.service.parsed_score import ParsedScore
+from core.service.piano_roll import build_piano_roll, pack_piano_roll
+from core.service.record_relay import StreamAbandonedError
+from core.service.serializer import (
+    serialize_metrics,
+    serialize_stream_record,
+    serialize_tokens_and_notes,
+    serialize_track_record,
+)
+from core.service.sessions import SessionData, build_session_data
+from core.service.timing import ProgressListener, StageTimer, Timings
+from core.service.tokenizers.note_linking import NoteLinks, link_notes
+from core.service.tokenizers.tokenizer_cache import CachedTokenizer
 from core.service.tokenizers.tokenizer_factory import TokenizerFactory
+from core.service.vocab import build_vocab, serialize_vocab
 
 
-def tokenize_midi_file(user_config: ConfigModel, midi_bytes: bytes) -> List:
+@dataclass
+class ProcessingResult:
+    tokens_and_notes: Optional[bytes]
+    metrics: Optional[bytes]
+    timings: Timings = field(default_factory=list)
+
+
+TOKEN_SERIALIZERS = {
+    "json": serialize_tokens_and_notes,
+    "columnar": serialize_columnar_tokens_and_notes,
+    "msgpack": serialize_packed_tokens_and_notes,
+    "ids": serialize_id_tokens_and_notes,
+}
+
+
+def process_midi_file(
+    user_config: ConfigModel,
+    midi_bytes: bytes,
+    with_tokens: bool = True,
+    with_metrics: bool = True,
+    wire_format: str = "json",
+    progress: Optional[ProgressListener] = None,
+    preset_key: Optional[str] = None,
+) -> ProcessingResult:
+    timer = StageTimer(progress)
+    with timer.stage("parse"):
+        score = ParsedScore.from_bytes(midi_bytes)
+    tokens_and_notes = None
+    if with_tokens:
+        tokens, notes, links = tokenize_midi_file(user_config, score, timer, preset_key)
+        with timer.stage("serialize"):
+            tokens_and_notes = TOKEN_SERIALIZERS[wire_format](tokens, notes, links)
+    metrics = None
+    if with_metrics:
+        metrics = retrieve_serialized_metrics(score, timer)
+    return ProcessingResult(tokens_and_notes, metrics, timer.timings)
+
+
+@dataclass
+class BatchResult:
+    # One entry per config, both None for configs that were not asked for
+    tokens_and_notes: List[Optional[bytes]]
+    errors: List[Optional[str]]
+    metrics: Optional[bytes]
+    timings: Timings = field(default_factory=list)
+
+
+def process_midi_batch(
+    user_configs: List[Optional[ConfigModel]], midi_bytes: bytes, with_metrics: bool = True, wire_format: str = "json"
+) -> BatchResult:
+    # The file is parsed once for all configs, and a config that fails doesn't fail the others
+    timer = StageTimer()
+    with timer.stage("parse"):
+        score = ParsedScore.from_bytes(midi_bytes)
+    result = BatchResult([], [], None, timer.timings)
+    for user_config in user_configs:
+        tokens_and_notes, error = None, None
+        if user_config is not None:
+            try:
+                tokens, notes, links = tokenize_midi_file(user_config, score, timer)
+                with timer.stage("serialize"):
+                    tokens_and_notes = TOKEN_SERIALIZERS[wire_format](tokens, notes, links)
+            except Exception as e:
+                error = str(e)
+        result.tokens_and_notes.append(tokens_and_notes)
+        result.errors.append(error)
+    if with_metrics:
+        result.metrics = retrieve_serialized_metrics(score, timer)
+    return result
+
+
+def retrieve_serialized_metrics(score: ParsedScore, timer: StageTimer) -> bytes:
+    with timer.stage("metrics"):
+        music_info_data = retrieve_information_from_midi(score)
+    with timer.stage("serialize"):
+        return serialize_metrics(music_info_data)
+
+
+def process_midi_session(user_config: ConfigModel, midi_bytes: bytes, with_metrics: bool = True) -> SessionData:
+    # Tokens and notes indexed for windowed reads instead of one serialized response
+    timer = StageTimer()
+    with timer.stage("parse"):
+        score = ParsedScore.from_bytes(midi_bytes)
+    tokens, notes, links = tokenize_midi_file(user_config, score, timer)
+    with timer.stage("serialize"):
+        session = build_session_data(tokens, notes, links)
+    if with_metrics:
+        session.metrics = retrieve_serialized_metrics(score, timer)
+    session.timings = timer.timings
+    return session
+
+
+@dataclass
+class PianoRollResult:
+    piano_roll: bytes
+    timings: Timings = field(default_factory=list)
+
+
+def process_piano_roll(midi_bytes: bytes) -> PianoRollResult:
+    timer = StageTimer()
+    with timer.stage("parse"):
+        score = ParsedScore.from_bytes(midi_bytes)
+    with timer.stage("notes"):
+        notes = midi_to_notes(score.midi)
+    with timer.stage("tiles"):
+        piano_roll = build_piano_roll(notes, score.midi.ticks_per_beat)
+    with timer.stage("serialize"):
+        packed = pack_piano_roll(piano_roll)
+    return PianoRollResult(packed, timer.timings)
+
+
+@dataclass
+class VocabResult:
+    vocab: bytes
+    timings: Timings = field(default_factory=list)
+
+
+def process_vocab(user_config: ConfigModel) -> VocabResult:
+    # Not the cached tokenizer: its vocabulary may have grown with the files it tokenized
+    timer = StageTimer()
+    with timer.stage("tokenizer"):
+        tokenizer = TokenizerFactory().get_tokenizer(user_config.tokenizer, create_tokenizer_config(user_config))
+    with timer.stage("serialize"):
+        vocab = serialize_vocab(build_vocab(user_config.tokenizer, tokenizer))
+    return VocabResult(vocab, timer.timings)
+
+
+def process_midi_stream(user_config: ConfigModel, midi_bytes: bytes, sink: Callable[[Optional[bytes]], None]) -> None:
+    # Runs in the processing executor and hands the /process/stream records to `sink` as they are made, then
+    # None. A file that can't be parsed fails the job before any record, and so does a sink left unread for
+    # its timeout, after which nobody would read an error record either.
+    score = ParsedScore.from_bytes(midi_bytes)
+    try:
+        for record in stream_midi_file(user_config, score):
+            sink(record)
+    except StreamAbandonedError:
+        raise
+    except Exception as e:
+        sink(serialize_stream_record("error", error=str(e)))
+    sink(None)
+
+
+def stream_midi_file(user_config: ConfigModel, score: ParsedScore) -> Iterator[bytes]:
+    # NDJSON records in the order they become available: basic info right after parsing, then metrics,
+    # then one record per track. Tokenizers making a stream per track tokenize, link and serialize one
+    # track at a time.
+    yield serialize_stream_record("info", **asdict(retrieve_basic_data(score)))
+    yield serialize_stream_record("metrics", **asdict(retrieve_metrics(score)))
+    cached_tokenizer = get_tokenizer(user_config)
+    tokenizer = cached_tokenizer.tokenizer
+    midi = score.copy_midi()
+    if tokenizer.one_token_stream:
+        # Single stream tokenizers (REMIPlus, MMM...) tokenize all tracks together
+        with cached_tokenizer.lock:
+            tokens = tokenizer(midi)
+        yield serialize_stream_record("tokens", tokens=tokens)
+        for index, track_notes in enumerate(midi_to_notes(midi)):
+            yield serialize_track_record(index, None, track_notes)
+    else:
+        rule = getattr(tokenizer, "note_link_rule", None)
+        with cached_tokenizer.lock:
+            for index, (track_tokens, track) in enumerate(_tokenize_tracks(tokenizer, midi)):
+                [track_notes] = midi_to_notes(track)
+                links = link_notes([track_tokens], track, rule)
+                if links is None:
+                    yield serialize_track_record(index, track_tokens, track_notes)
+                else:
+                    yield serialize_track_record(
+                        index, track_tokens, track_notes, links.token_notes[0], links.note_tokens[0]
+                    )
+    yield serialize_stream_record("end")
+
+
+def _tokenize_tracks(tokenizer: Any, midi: MidiFile) -> Iterator[Tuple[TokSequence, MidiFile]]:
+    # What tokenizer(midi) returns for tokenizers making a stream per track, one track at a time along with
+    # the MIDI of that track alone. The whole file is preprocessed first (dropping empty tracks), then every
+    # track is tokenized on its own with the file's tempos and time signatures: preprocessing it again does
+    # nothing to notes already quantized.
+    tokenizer.preprocess_midi(midi)
+    for instrument in midi.instruments:
+        track = copy(midi)
+        track.instruments = [instrument]
+        [sequence] = tokenizer.midi_to_tokens(track)
+        yield sequence, track
+
+
+def tokenize_midi_file(
+    user_config: ConfigModel,
+    score: ParsedScore,
+    timer: Optional[StageTimer] = None,
+    preset_key: Optional[str] = None,
+) -> Tuple[Any, List[NoteTable], Optional[NoteLinks]]:
+    # preset_key is the canonical config key of a preset's config, whose tokenizer is pinned
+    timer = timer if timer is not None else StageTimer()
+    with timer.stage("tokenizer"):
+        cached_tokenizer = get_tokenizer(user_config, preset_key)
+
+    with timer.stage("tokenize"):
+        midi = score.copy_midi()
+        with cached_tokenizer.lock:
+            tokens = _tokenize_with_progress(cached_tokenizer.tokenizer, midi, timer)
+    with timer.stage("notes"):
+        notes = midi_to_notes(midi)
+    with timer.stage("link"):
+        links = link_notes(tokens, midi, getattr(cached_tokenizer.tokenizer, "note_link_rule", None))
+
+    return tokens, notes, links
+
+
+def _tokenize_with_progress(tokenizer: Any, midi: MidiFile, timer: StageTimer) -> Any:
+    # tokenizer(midi), reporting every tokenized track when someone listens. Tracks are counted after
+    # preprocessing, which drops empty ones. Tokenizers making a single stream for all tracks report them all
+    # at once.
+    if timer.listener is None:
+        return tokenizer(midi)
+    if tokenizer.one_token_stream:
+        tokens = tokenizer(midi)
+        timer.progress("tokenize", tracks_done=len(midi.instruments), tracks=len(midi.instruments))
+        return tokens
+    tokens = []
+    for sequence, _ in _tokenize_tracks(tokenizer, midi):
+        tokens.append(sequence)
+        timer.progress("tokenize", tracks_done=len(tokens), tracks=len(midi.instruments))
+    return tokens
+
+
+def get_tokenizer(user_config: ConfigModel, preset_key: Optional[str] = None) -> CachedTokenizer:
+    tokenizer_factory = TokenizerFactory()
+    if preset_key is not None:
+        return tokenizer_factory.get_pinned_tokenizer(
+            user_config.tokenizer, preset_key, lambda: create_tokenizer_config(user_config)
+        )
+    return tokenizer_factory.get_cached_tokenizer(user_config.tokenizer, create_tokenizer_config(user_config))
+
+
+def pin_preset_tokenizer(user_config: ConfigModel, preset_key: str) -> None:
+    # Builds the tokenizer of a preset in the worker running it, so that its first request there doesn't have to
+    get_tokenizer(user_config, preset_key)
+
+
+def create_tokenizer_config(user_config: ConfigModel) -> TokenizerConfig:
     tokenizer_params = {
         "pitch_range": tuple(user_config.pitch_range),
         "beat_res": {(0, 4): 8, (4, 12): 4},
@@ -37,24 +296,12 @@ def tokenize_midi_file(user_config: ConfigModel, midi_bytes: bytes) -> List:
         # "one_token_stream_for_programs": user_config.one_token_stream_for_programs,
         # "program_changes": user_config.program_changes,
     }
-    tokenizer_config = TokenizerConfig(**tokenizer_params)
-
-    tokenizer_factory = TokenizerFactory()
-    tokenizer = tokenizer_factory.get_tokenizer(user_config.tokenizer, tokenizer_config)
-
-    midi = MidiFile(file=BytesIO(midi_bytes))
-    tokens = tokenizer(midi)
-    notes = midi_to_notes(midi)
+    return TokenizerConfig(**tokenizer_params)
 
-    return tokens, notes
 
-
-def retrieve_information_from_midi(midi_bytes: bytes) -> MusicInformationData:
-    midi = MidoMidiFile(file=BytesIO(midi_bytes))
-    midi_file_music = muspy.from_mido(midi)
-
-    basic_data = retrieve_basic_data(midi_file_music)
-    metrics = retrieve_metrics(midi_file_music)
+def retrieve_information_from_midi(score: ParsedScore) -> MusicInformationData:
+    basic_data = retrieve_basic_data(score)
+    metrics = retrieve_metrics(score)
     music_info_data = create_music_info_data(basic_data, metrics)
 
     return music_info_data
@@ -73,13 +320,17 @@ def create_music_info_data(basic_info: BasicInfoData, metrics_data: MetricsData)
             polyphony=metrics_data.polyphony,
             empty_beat_rate=metrics_data.empty_beat_rate,
             drum_pattern_consistency=metrics_data.drum_pattern_consistency,
+            pitch_class_entropy=metrics_data.pitch_class_entropy,
+            scale_consistency=metrics_data.scale_consistency,
+            groove_consistency=metrics_data.groove_consistency,
         )
         return data
     except pydantic.ValidationError as e:
         print(e)
 
 
-def retrieve_basic_data(music_file: muspy.Music) -> BasicInfoData:
+def retrieve_basic_data(score: ParsedScore) -> BasicInfoData:
+    music_file = score.music
     tempos: List[Tuple[int, float]] = []
     for tempo in music_file.tempos:
         tempo_data: Tuple[int, float] = (tempo.time, tempo.qpm)
@@ -98,36 +349,10 @@ def retrieve_basic_data(music_file: muspy.Music) -> BasicInfoData:
     return BasicInfoData(music_file.metadata.title, music_file.resolution, tempos, key_signatures, time_signatures)
 
 
-def retrieve_metrics(music_file: muspy.Music) -> MetricsData:
-    pitch_range = muspy.pitch_range(music_file)
-    n_pitches_used = muspy.n_pitches_used(music_file)
-
-    polyphony_rate = muspy.polyphony(music_file)
-    if math.isnan(polyphony_rate):
-        polyphony_rate = 0.0
+def retrieve_metrics(score: ParsedScore) -> MetricsData:
+    # All metrics come from one pass over the notes, undefined ones (no notes, no drums...) are 0.0
+    return retrieve_music_metrics(score.music)
 
-    empty_beat_rate = muspy.empty_beat_rate(music_file)
-    if math.isnan(empty_beat_rate):
-        empty_beat_rate = 0.0
 
-    drum_pattern_consistency = muspy.drum_pattern_consistency(music_file)
-    if math.isnan(drum_pattern_consistency):
-        drum_pattern_consistency = 0.0
-
-    return MetricsData(pitch_range, n_pitches_used, polyphony_rate, empty_beat_rate, drum_pattern_consistency)
-
-def midi_to_notes(midi: MidiFile) -> List[List[Note]]:
-    notes = []
-    for instrument in midi.instruments:
-        track_notes = []
-        for note in instrument.notes:
-            note_name = pitch_to_name(note.pitch)
-            track_notes.append(Note(note.pitch, note_name, note.start, note.end, note.velocity))
-        notes.append(track_notes)
-    return notes
-
-def pitch_to_name(pitch: int) -> str:
-    note_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-    octave = pitch // 12 - 1
-    note = note_names[pitch % 12]
-    return f"{note}{octave}"
\ No newline at end of file
+def midi_to_notes(midi: MidiFile) -> List[NoteTable]:
+    return [NoteTable.from_notes(instrument.notes) for instrument in midi.instruments]
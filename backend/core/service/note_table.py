@@ -0,0 +1,79 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+NOTE_COLUMN_NAMES = ["pitch", "start", "end", "velocity"]
+PITCH_CLASS_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+# Name of every MIDI pitch, 60 is C4
+NOTE_NAMES = [f"{PITCH_CLASS_NAMES[pitch % 12]}{pitch // 12 - 1}" for pitch in range(128)]
+# JSON of a note up to its start, per pitch: the part that only depends on the pitch is encoded once
+_NOTE_PREFIXES = [f'{{"pitch":{pitch},"name":"{name}","start":' for pitch, name in enumerate(NOTE_NAMES)]
+
+
+def pitch_to_name(pitch: int) -> str:
+    return NOTE_NAMES[pitch]
+
+
+@dataclass
+class NoteTable:
+    # The notes of one track as parallel columns, in the order of the track
+    pitch: np.ndarray
+    start: np.ndarray
+    end: np.ndarray
+    velocity: np.ndarray
+
+    @classmethod
+    def from_notes(cls, notes: Iterable[Any]) -> "NoteTable":
+        # From objects with pitch, start, end and velocity attributes (miditoolkit notes)
+        notes = notes if isinstance(notes, list) else list(notes)
+        count = len(notes)
+        return cls(
+            pitch=np.fromiter((note.pitch for note in notes), dtype=np.uint8, count=count),
+            start=np.fromiter((note.start for note in notes), dtype=np.int64, count=count),
+            end=np.fromiter((note.end for note in notes), dtype=np.int64, count=count),
+            velocity=np.fromiter((note.velocity for note in notes), dtype=np.uint8, count=count),
+        )
+
+    @classmethod
+    def empty(cls) -> "NoteTable":
+        return cls.from_notes([])
+
+    def __len__(self) -> int:
+        return len(self.pitch)
+
+    @property
+    def names(self) -> List[str]:
+        return [NOTE_NAMES[pitch] for pitch in self.pitch.tolist()]
+
+    @property
+    def nbytes(self) -> int:
+        return self.pitch.nbytes + self.start.nbytes + self.end.nbytes + self.velocity.nbytes
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in NOTE_COLUMN_NAMES}
+
+    def rows(self) -> List[Dict[str, Any]]:
+        # One dict per note, as the JSON responses have them
+        return [
+            {"pitch": pitch, "name": NOTE_NAMES[pitch], "start": start, "end": end, "velocity": velocity}
+            for pitch, start, end, velocity in zip(*self._lists())
+        ]
+
+    def documents(self) -> List[str]:
+        # The JSON of every note, written straight from the columns
+        prefixes = _NOTE_PREFIXES
+        return [
+            f'{prefixes[pitch]}{start},"end":{end},"velocity":{velocity}}}'
+            for pitch, start, end, velocity in zip(*self._lists())
+        ]
+
+    def to_json(self) -> str:
+        return "[" + ",".join(self.documents()) + "]"
+
+    def _lists(self) -> List[List[int]]:
+        return [self.pitch.tolist(), self.start.tolist(), self.end.tolist(), self.velocity.tolist()]
+
+
+def serialize_note_tables(tables: List[NoteTable]) -> str:
+    return "[" + ",".join(table.to_json() for table in tables) + "]"
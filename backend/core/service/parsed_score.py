@@ -0,0 +1,82 @@
+from io import BytesIO
+
+import muspy
+from miditoolkit import (
+    ControlChange,
+    Instrument,
+    KeySignature,
+    MidiFile,
+    Note,
+    Pedal,
+    PitchBend,
+    TempoChange,
+    TimeSignature,
+)
+from mido import MidiFile as MidoMidiFile
+
+
+class ParsedScore:
+    # A MIDI upload parsed once, in both representations the pipeline needs:
+    # `midi` (miditoolkit) for tokenization and notes, `music` (muspy) for basic data and metrics
+    def __init__(self, midi: MidiFile, music: muspy.Music) -> None:
+        self.midi = midi
+        self.music = music
+
+    @classmethod
+    def from_bytes(cls, midi_bytes: bytes) -> "ParsedScore":
+        mido_midi = MidoMidiFile(file=BytesIO(midi_bytes))
+        # muspy reads the delta times, so it has to run before the miditoolkit conversion makes them absolute
+        music = muspy.from_mido(mido_midi)
+        midi = _to_miditoolkit(mido_midi)
+        return cls(midi, music)
+
+    @classmethod
+    def from_file(cls, path: str) -> "ParsedScore":
+        with open(path, "rb") as file:
+            return cls.from_bytes(file.read())
+
+    def copy_midi(self) -> MidiFile:
+        # Tokenizers preprocess the MIDI in place (quantization, track removal), so every tokenization
+        # gets its own copy. This is much cheaper than deepcopy, which walks every attribute generically.
+        midi = self.midi
+        copied = MidiFile(ticks_per_beat=midi.ticks_per_beat)
+        copied.max_tick = midi.max_tick
+        copied.tempo_changes = [TempoChange(tempo.tempo, tempo.time) for tempo in midi.tempo_changes]
+        copied.time_signature_changes = [
+            TimeSignature(signature.numerator, signature.denominator, signature.time)
+            for signature in midi.time_signature_changes
+        ]
+        copied.key_signature_changes = [
+            KeySignature(signature.key_name, signature.time) for signature in midi.key_signature_changes
+        ]
+        copied.lyrics = list(midi.lyrics)
+        copied.markers = list(midi.markers)
+        for instrument in midi.instruments:
+            copied_instrument = Instrument(instrument.program, instrument.is_drum, instrument.name)
+            copied_instrument.notes = [
+                Note(note.velocity, note.pitch, note.start, note.end) for note in instrument.notes
+            ]
+            copied_instrument.pedals = [Pedal(pedal.start, pedal.end) for pedal in instrument.pedals]
+            copied_instrument.pitch_bends = [PitchBend(bend.pitch, bend.time) for bend in instrument.pitch_bends]
+            copied_instrument.control_changes = [
+                ControlChange(change.number, change.value, change.time) for change in instrument.control_changes
+            ]
+            copied.instruments.append(copied_instrument)
+        return copied
+
+
+def _to_miditoolkit(mido_midi: MidoMidiFile) -> MidiFile:
+    # Same steps as miditoolkit.MidiFile(file=...), minus parsing the bytes a second time
+    midi = MidiFile(ticks_per_beat=mido_midi.ticks_per_beat)
+    mido_midi = MidiFile._convert_delta_to_cumulative(mido_midi)
+    midi.tempo_changes = MidiFile._load_tempo_changes(mido_midi)
+    midi.key_signature_changes = MidiFile._load_key_signatures(mido_midi)
+    midi.time_signature_changes = MidiFile._load_time_signatures(mido_midi)
+    midi.markers = MidiFile._load_markers(mido_midi)
+    midi.lyrics = MidiFile._load_lyrics(mido_midi)
+    midi.time_signature_changes.sort(key=lambda signature: signature.time)
+    midi.key_signature_changes.sort(key=lambda signature: signature.time)
+    midi.lyrics.sort(key=lambda lyric: lyric.time)
+    midi.max_tick = max([max([event.time for event in track]) for track in mido_midi.tracks]) + 1
+    midi.instruments = MidiFile._load_instruments(mido_midi)
+    return midi
@@ -0,0 +1,170 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.constants import PIANO_ROLL_MAX_TILES
+from core.service.message_pack import packb, unpack_array, unpackb
+from core.service.note_table import NoteTable
+
+# Level 0 tiles are a beat wide and one pitch high, every level doubles the width, and from level
+# PITCH_MERGE_LEVEL on the height too (up to MAX_PITCH_STEP), until one tile covers the whole track.
+# Views zoomed in further than a beat per tile show few enough notes to read them (/sessions/{id}/notes).
+# Levels more than PIANO_ROLL_MAX_TILES tiles across the file are left out, so the first level of a long
+# file is wider than a beat, and all tracks together may have at most MAX_TILES_PER_COLUMN times as many
+# tiles in a level.
+PITCH_MERGE_LEVEL = 2
+MAX_PITCH_STEP = 16
+MAX_LEVELS = 20
+MAX_TILES_PER_COLUMN = 32
+TILE_COLUMNS = ["start", "pitch", "count", "max_velocity"]
+
+
+class PianoRollTooLargeError(Exception):
+    pass
+
+
+def build_piano_roll(notes: List[NoteTable], resolution: int, max_tiles: int = PIANO_ROLL_MAX_TILES) -> Dict[str, Any]:
+    # Multi-resolution summary of every track: bounds, and per level the tiles holding at least one note,
+    # sorted by time then pitch, with the number of notes overlapping them and their highest velocity
+    base_step = max(resolution, 1)
+    tracks = []
+    for track_notes in notes:
+        track: Dict[str, Any] = {"notes": len(track_notes), "levels": []}
+        if not len(track_notes):
+            track.update(min_pitch=None, max_pitch=None, start=None, end=None)
+        else:
+            track.update(
+                min_pitch=int(track_notes.pitch.min()),
+                max_pitch=int(track_notes.pitch.max()),
+                start=int(track_notes.start.min()),
+                end=int(track_notes.end.max()),
+            )
+        tracks.append(track)
+    end = max((track["end"] for track in tracks if track["end"] is not None), default=0)
+    # The same first level for every track, so a level index means the same tiles across tracks
+    first_level = next((level for level in range(MAX_LEVELS) if -(-end // (base_step << level)) <= max_tiles), None)
+    if first_level is None:
+        raise PianoRollTooLargeError(f"The file is too long for a piano roll of at most {max_tiles} tiles across")
+
+    level_tiles = [0] * MAX_LEVELS
+    for track, track_notes in zip(tracks, notes):
+        if not len(track_notes):
+            continue
+        pitches = track_notes.pitch.astype(np.int64)
+        starts, ends = track_notes.start.astype(np.int64), track_notes.end.astype(np.int64)
+        for level in range(first_level, MAX_LEVELS):
+            time_step = base_step << level
+            pitch_step = min(1 << max(level - PITCH_MERGE_LEVEL + 1, 0), MAX_PITCH_STEP)
+            tiles = _build_level(pitches, starts, ends, track_notes.velocity, time_step, pitch_step)
+            level_tiles[level] += len(tiles["start"])
+            if level_tiles[level] > max_tiles * MAX_TILES_PER_COLUMN:
+                raise PianoRollTooLargeError(
+                    f"The file has too many notes for a piano roll of {max_tiles} tiles across"
+                )
+            track["levels"].append(tiles)
+            if time_step > track["end"]:
+                break
+    return {"resolution": resolution, "base_step": base_step << first_level, "end": end, "tracks": tracks}
+
+
+def _build_level(
+    pitches: np.ndarray, starts: np.ndarray, ends: np.ndarray, velocities: np.ndarray, time_step: int, pitch_step: int
+) -> Dict[str, Any]:
+    # A note counts in every tile its [start, end) overlaps, zero length notes in the tile of their start.
+    # Tiles are counted on a pitch by time grid with a difference array per pitch row (+1 at a note's first
+    # tile, -1 past its last), so long notes cost no more than short ones.
+    first = starts // time_step
+    last = np.maximum(ends - 1, starts) // time_step
+    buckets = pitches // pitch_step
+    low = int(buckets.min())
+    rows = buckets - low
+    shape = (int(rows.max()) + 1, int(last.max()) + 1)
+    changes = np.zeros((shape[0], shape[1] + 1), dtype=np.int32)
+    np.add.at(changes, (rows, first), 1)
+    np.add.at(changes, (rows, last + 1), -1)
+    counts = np.cumsum(changes, axis=1, dtype=np.int32)[:, :-1]
+    max_velocities = _max_velocities(shape, rows, first, last, velocities)
+    # Indexes of the transposed grid come sorted by time then pitch
+    tile_times, tile_rows = np.nonzero(counts.T)
+    return {
+        "time_step": time_step,
+        "pitch_step": pitch_step,
+        "start": tile_times * time_step,
+        "pitch": ((tile_rows + low) * pitch_step).astype(np.uint8),
+        "count": counts[tile_rows, tile_times].astype(np.uint32),
+        "max_velocity": max_velocities[tile_rows, tile_times],
+    }
+
+
+def _max_velocities(
+    shape: Tuple[int, int], rows: np.ndarray, first: np.ndarray, last: np.ndarray, velocities: np.ndarray
+) -> np.ndarray:
+    # Highest velocity of the notes overlapping every tile of the grid. The run of tiles of a note is covered
+    # by two blocks as wide as its largest power of two, which may overlap, and blocks are split in halves
+    # down to single tiles: one pass per power of two instead of one write per tile.
+    block_sizes = np.frexp(last - first + 1)[1] - 1
+    grid: Optional[np.ndarray] = None
+    for block_size in range(int(block_sizes.max()), -1, -1):
+        width = 1 << block_size
+        blocks = np.zeros(shape, dtype=np.uint8)
+        sized = block_sizes == block_size
+        np.maximum.at(blocks, (rows[sized], first[sized]), velocities[sized])
+        np.maximum.at(blocks, (rows[sized], last[sized] - width + 1), velocities[sized])
+        if grid is not None:
+            # A block twice as wide covers the block at its start and the one right after it
+            np.maximum(blocks, grid, out=blocks)
+            np.maximum(blocks[:, width:], grid[:, :-width], out=blocks[:, width:])
+        grid = blocks
+    assert grid is not None
+    return grid
+
+
+def pack_piano_roll(piano_roll: Dict[str, Any]) -> bytes:
+    # Cached as MessagePack, the tile columns as raw little-endian arrays
+    return packb(piano_roll)
+
+
+def unpack_piano_roll(packed: bytes) -> Dict[str, Any]:
+    piano_roll = unpackb(packed)
+    for track in piano_roll["tracks"]:
+        for level in track["levels"]:
+            for column in TILE_COLUMNS:
+                level[column] = unpack_array(level[column])
+    return piano_roll
+
+
+def piano_roll_window(
+    piano_roll: Dict[str, Any],
+    track_index: int,
+    level_index: Optional[int] = None,
+    start_tick: Optional[int] = None,
+    end_tick: Optional[int] = None,
+    width: int = 1024,
+) -> Dict[str, Any]:
+    # The tiles of one track and level overlapping [start_tick, end_tick), by default the whole file. Levels
+    # past a track's coarsest one are clamped to it, and without a level the finest one that fits the window
+    # in at most `width` tiles across is picked, which is the same level for every track.
+    track = piano_roll["tracks"][track_index]
+    levels = track["levels"]
+    bounds = {key: track[key] for key in ("notes", "min_pitch", "max_pitch", "start", "end")}
+    window: Dict[str, Any] = {"track": track_index, "levels": len(levels), **bounds}
+    if not levels:
+        return {**window, "level": None, "time_step": None, "pitch_step": None, "tiles": None}
+
+    window_start = start_tick if start_tick is not None else 0
+    window_end = end_tick if end_tick is not None else piano_roll["end"]
+    if level_index is not None:
+        level_index = min(level_index, len(levels) - 1)
+    else:
+        level_index = len(levels) - 1
+        for index, level in enumerate(levels):
+            if -(-(window_end - window_start) // level["time_step"]) <= width:
+                level_index = index
+                break
+    level = levels[level_index]
+    time_step = level["time_step"]
+    tile_starts = level["start"]
+    first = np.searchsorted(tile_starts, window_start // time_step * time_step, side="left")
+    last = np.searchsorted(tile_starts, window_end, side="left")
+    tiles = {column: level[column][first:last].tolist() for column in TILE_COLUMNS}
+    return {**window, "level": level_index, "time_step": time_step, "pitch_step": level["pitch_step"], "tiles": tiles}
@@ -0,0 +1,107 @@
+import json
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.api.model import ConfigModel
+from core.constants import PRESET_MAX_COUNT
+
+# Ids of presets registered without a name: the start of their canonical config key, so the same config
+# always gets the same id, across restarts too
+PRESET_ID_LENGTH = 16
+PRESET_NAME_PATTERN = re.compile(r"[A-Za-z0-9_.-]{1,64}")
+
+
+class PresetStoreFullError(Exception):
+    pass
+
+
+@dataclass
+class Preset:
+    preset_id: str
+    config: ConfigModel
+    # Canonical key of the tokenizer config, computed once: requests using the preset look their tokenizer up
+    # with it instead of building a TokenizerConfig
+    config_key: str
+
+    def summary(self) -> Dict[str, Any]:
+        return {"id": self.preset_id, "config": self.config.model_dump()}
+
+
+def preset_config_key(config: ConfigModel) -> str:
+    from core.service.midi_processing import create_tokenizer_config
+    from core.service.tokenizers.tokenizer_cache import canonical_config_key
+
+    return canonical_config_key(config.tokenizer, create_tokenizer_config(config))
+
+
+def create_preset(config: ConfigModel, name: Optional[str] = None) -> Preset:
+    if name is not None and not PRESET_NAME_PATTERN.fullmatch(name):
+        raise ValueError(f"Invalid preset name: {name!r}")
+    config_key = preset_config_key(config)
+    return Preset(name if name is not None else config_key[:PRESET_ID_LENGTH], config, config_key)
+
+
+def read_presets_file(path: str) -> List[Preset]:
+    # A JSON object of ConfigModels by preset name
+    with open(path) as file:
+        configs = json.load(file)
+    if not isinstance(configs, dict):
+        raise ValueError(f"{path} must hold a JSON object of configs by preset name")
+    return [create_preset(ConfigModel(**config), name) for name, config in configs.items()]
+
+
+class PresetStore:
+    def __init__(self, max_presets: int) -> None:
+        self.max_presets = max_presets
+        self._presets: Dict[str, Preset] = {}
+        self._lock = threading.Lock()
+
+    def add(self, preset: Preset) -> Preset:
+        # Registering the same config again returns the preset already there
+        with self._lock:
+            existing = self._check(preset)
+            if existing is not None:
+                return existing
+            self._presets[preset.preset_id] = preset
+            return preset
+
+    def check(self, preset: Preset) -> Optional[Preset]:
+        # Raises as add would, without adding: the preset already registered with this config, or None
+        with self._lock:
+            return self._check(preset)
+
+    def get(self, preset_id: str) -> Optional[Preset]:
+        with self._lock:
+            return self._presets.get(preset_id)
+
+    def list(self) -> List[Preset]:
+        with self._lock:
+            return list(self._presets.values())
+
+    def pins(self) -> List[Tuple[ConfigModel, str]]:
+        # What the processing workers need to pin the tokenizers of the presets
+        with self._lock:
+            return [(preset.config, preset.config_key) for preset in self._presets.values()]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._presets)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._presets.clear()
+
+    def _check(self, preset: Preset) -> Optional[Preset]:
+        existing = self._presets.get(preset.preset_id)
+        if existing is not None:
+            if existing.config_key != preset.config_key:
+                raise ValueError(f"Preset {preset.preset_id} is already registered with another config")
+            return existing
+        if len(self._presets) >= self.max_presets:
+            raise PresetStoreFullError()
+        return None
+
+
+preset_store = PresetStore(PRESET_MAX_COUNT)
@@ -0,0 +1,64 @@
+import asyncio
+import queue
+from typing import Any, Optional, Tuple
+
+from core.constants import PROCESSING_BACKEND, PROCESSING_TIMEOUT
+from core.service.relay import Relay
+
+
+class StreamAbandonedError(Exception):
+    pass
+
+
+class RecordSink:
+    # Sent along with a streamed request to the processing worker, which calls it with every record it makes
+    # and then with None. Blocks while the response is behind, and gives up after `timeout` seconds.
+    def __init__(self, records: Any, timeout: float) -> None:
+        self.records = records
+        self.timeout = timeout
+
+    def __call__(self, record: Optional[bytes]) -> None:
+        try:
+            # In a tuple, None alone would stop the relay
+            self.records.put((record,), timeout=self.timeout)
+        except queue.Full as e:
+            raise StreamAbandonedError() from e
+
+
+class RecordStream:
+    # The records of one /process/stream job on their way to its response. Every queue on the way holds a
+    # single record, so a slow reader holds the worker back rather than the records piling up in memory.
+    def __init__(self, loop: asyncio.AbstractEventLoop, processes: bool = PROCESSING_BACKEND == "process") -> None:
+        self.records: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(maxsize=1)
+        self._loop = loop
+        self._dropped = False
+        self._relay = Relay(self._put, processes, maxsize=1)
+
+    def sink(self, timeout: float = PROCESSING_TIMEOUT) -> RecordSink:
+        # Makes the relay's queue, so not on the event loop
+        return RecordSink(self._relay.queue(), timeout)
+
+    def drop(self) -> None:
+        # On the event loop, once nobody reads the records anymore: the ones still coming are dropped
+        self._dropped = True
+        while not self.records.empty():
+            self.records.get_nowait()
+
+    def close(self) -> None:
+        # Once the job is over, not on the event loop
+        self._relay.close()
+
+    def _put(self, item: Tuple[Optional[bytes]]) -> None:
+        # On the relay thread: waits until the response has room for the record
+        [record] = item
+        if self._dropped:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._put_on_loop(record), self._loop).result()
+        except RuntimeError:
+            # The stream's event loop is closed
+            self._dropped = True
+
+    async def _put_on_loop(self, record: Optional[bytes]) -> None:
+        if not self._dropped:
+            await self.records.put(record)
@@ -0,0 +1,71 @@
+import multiprocessing
+import queue
+import threading
+from typing import Any, Callable, Optional
+
+# Queues for worker processes are made by one manager process, started with the first of them
+_manager: Any = None
+_manager_lock = threading.Lock()
+
+
+def shutdown_manager() -> None:
+    # Relays still draining a manager queue stop with it, the next queue starts a new manager
+    global _manager
+    with _manager_lock:
+        manager, _manager = _manager, None
+    if manager is not None:
+        manager.shutdown()
+
+
+def _manager_queue(maxsize: int) -> Any:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = multiprocessing.get_context("spawn").Manager()
+        return _manager.Queue(maxsize)
+
+
+class Relay:
+    # Hands what the processing workers put on its queue to `deliver`, from a thread draining the queue: a
+    # multiprocessing manager queue for worker processes. With a maxsize, workers block once that many items
+    # wait, and for as long as `deliver` does. The queue and the thread start with the first queue() call (so
+    # not on the event loop, making a manager queue waits for the manager), close() stops the thread.
+    def __init__(self, deliver: Callable[[Any], None], processes: bool = True, maxsize: int = 0) -> None:
+        self.processes = processes
+        self.maxsize = maxsize
+        self._deliver = deliver
+        self._lock = threading.Lock()
+        self._items: Any = None
+        self._thread: Optional[threading.Thread] = None
+
+    def queue(self) -> Any:
+        with self._lock:
+            if self._thread is None:
+                self._items = _manager_queue(self.maxsize) if self.processes else queue.Queue(self.maxsize)
+                self._thread = threading.Thread(target=self._relay_items, args=(self._items,), daemon=True)
+                self._thread.start()
+            return self._items
+
+    def close(self) -> None:
+        # Waits for room on a full queue, the next queue() call starts over
+        with self._lock:
+            thread, items = self._thread, self._items
+            self._thread, self._items = None, None
+        if thread is not None:
+            try:
+                items.put(None)
+            except (EOFError, OSError):
+                # The manager went away, and the thread with it
+                return
+            thread.join(timeout=1)
+
+    def _relay_items(self, items: Any) -> None:
+        while True:
+            try:
+                item = items.get()
+            except (EOFError, OSError):
+                # The manager went away
+                return
+            if item is None:
+                return
+            self._deliver(item)
@@ -0,0 +1,218 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from core.constants import RESULT_CACHE_DIR, RESULT_CACHE_DISK_BYTES, RESULT_CACHE_MEMORY_BYTES
+
+# Bump whenever the cached payload format changes, so stale entries on disk are never served
+RESULT_CACHE_VERSION = "3"
+
+
+@dataclass
+class ResultCacheStats:
+    memory_hits: int
+    disk_hits: int
+    misses: int
+    memory_evictions: int
+    disk_evictions: int
+    memory_bytes: int
+    max_memory_bytes: int
+    disk_bytes: int
+    max_disk_bytes: int
+
+
+def file_digest(midi_bytes: bytes) -> str:
+    return hashlib.sha256(midi_bytes).hexdigest()
+
+
+def result_key(digest: str, config_key: str, wire_format: str = "json") -> str:
+    return hashlib.sha256(f"{RESULT_CACHE_VERSION}:result:{digest}:{config_key}:{wire_format}".encode()).hexdigest()
+
+
+def metrics_key(digest: str) -> str:
+    # Metrics only depend on the file, so every config shares them
+    return hashlib.sha256(f"{RESULT_CACHE_VERSION}:metrics:{digest}".encode()).hexdigest()
+
+
+def vocab_key(etag: str) -> str:
+    # By ETag rather than config, which also changes with the miditok version
+    return hashlib.sha256(f"{RESULT_CACHE_VERSION}:vocab:{etag}".encode()).hexdigest()
+
+
+def piano_roll_key(digest: str) -> str:
+    # Piano roll tiles come from the file's own notes, not a tokenizer's, so they are shared by every config
+    return hashlib.sha256(f"{RESULT_CACHE_VERSION}:piano_roll:{digest}".encode()).hexdigest()
+
+
+class MemoryTier:
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class DiskTier:
+    # One file per entry, written atomically, so several uvicorn workers on a host can share the directory.
+    # The modification time doubles as the last access time for eviction.
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.size = sum(size for _, size, _ in self._scan())
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                value = file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(value)
+            os.replace(temporary_path, path)
+        except BaseException:
+            _remove(temporary_path)
+            raise
+        with self._lock:
+            self.size += len(value)
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            for path, _, _ in self._scan():
+                _remove(path)
+            self.size = 0
+
+    def _evict(self) -> None:
+        # Other workers write to the same directory, so the real size is only known after a scan
+        entries = sorted(self._scan(), key=lambda entry: entry[2])
+        self.size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if self.size <= target:
+                break
+            if _remove(path):
+                self.evictions += 1
+            self.size -= size
+
+    def _scan(self) -> List[Tuple[str, int, float]]:
+        entries = []
+        for directory, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+
+class ResultCache:
+    def __init__(self, memory: MemoryTier, disk: Optional[DiskTier] = None) -> None:
+        self._memory = memory
+        self._disk = disk
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory_hits += 1
+            return value
+        if self._disk is not None:
+            value = self._disk.get(key)
+            if value is not None:
+                self._disk_hits += 1
+                self._memory.set(key, value)
+                return value
+        self._misses += 1
+        return None
+
+    def set(self, key: str, value: bytes) -> None:
+        self._memory.set(key, value)
+        if self._disk is not None:
+            self._disk.set(key, value)
+
+    def clear(self) -> None:
+        self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stats(self) -> ResultCacheStats:
+        return ResultCacheStats(
+            memory_hits=self._memory_hits,
+            disk_hits=self._disk_hits,
+            misses=self._misses,
+            memory_evictions=self._memory.evictions,
+            disk_evictions=self._disk.evictions if self._disk is not None else 0,
+            memory_bytes=self._memory.size,
+            max_memory_bytes=self._memory.max_bytes,
+            disk_bytes=self._disk.size if self._disk is not None else 0,
+            max_disk_bytes=self._disk.max_bytes if self._disk is not None else 0,
+        )
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+result_cache = ResultCache(
+    MemoryTier(RESULT_CACHE_MEMORY_BYTES),
+    DiskTier(RESULT_CACHE_DIR, RESULT_CACHE_DISK_BYTES) if RESULT_CACHE_DIR else None,
+)
@@ -1,11 +1,113 @@
 import json
+import json.encoder
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 from miditok import Event, TokSequence
 
+from core.api.model import MusicInformationData
+from core.service.message_pack import packb
+from core.service.note_table import NoteTable, serialize_note_tables
+from core.service.tokenizers.note_linking import NoteLinks, note_token_spans
 
-def get_serialized_tokens(tokens: list[TokSequence]) -> str:
-    return json.dumps(tokens, cls=TokSequenceEncoder)
+
+def serialize_tokens(tokens: Union[TokSequence, List[TokSequence]], links: Optional[NoteLinks] = None) -> str:
+    writer = TokenWriter()
+    writer.write(tokens, [token_notes.tolist() for token_notes in links.token_notes] if links is not None else None)
+    return writer.getvalue()
+
+
+def serialize_tokens_and_notes(
+    tokens: Union[TokSequence, List[TokSequence]], notes: List[NoteTable], links: Optional[NoteLinks] = None
+) -> bytes:
+    serialized_notes = serialize_note_tables(notes)
+    serialized_spans = json.dumps(
+        [note_token_spans(note_tokens) for note_tokens in links.note_tokens] if links is not None else None,
+        separators=(",", ":"),
+    )
+    return (
+        f'{{"tokens":{serialize_tokens(tokens, links)},"notes":{serialized_notes},"note_tokens":{serialized_spans}}}'
+    ).encode()
+
+
+def serialize_metrics(metrics: MusicInformationData) -> bytes:
+    return metrics.model_dump_json().encode()
+
+
+def serialize_process_response(tokens_and_notes: bytes, metrics: bytes) -> bytes:
+    # Both parts are already JSON, so the envelope is spliced around them instead of parsing them back
+    return b'{"success":true,"data":' + tokens_and_notes[:-1] + b',"metrics":' + metrics + b'},"error":null}'
+
+
+def serialize_stream_record(record: str, **fields: Any) -> bytes:
+    # One line of a /process/stream response
+    return json.dumps({"record": record, **fields}, cls=TokSequenceEncoder, separators=(",", ":")).encode() + b"\n"
+
+
+def serialize_track_record(
+    index: int,
+    tokens: Optional[TokSequence],
+    notes: NoteTable,
+    token_notes: Optional[np.ndarray] = None,
+    note_tokens: Optional[np.ndarray] = None,
+) -> bytes:
+    serialized_tokens = "null"
+    if tokens is not None:
+        writer = TokenWriter()
+        writer.write(tokens, token_notes.tolist() if token_notes is not None else None)
+        serialized_tokens = writer.getvalue()
+    serialized_notes = notes.to_json()
+    serialized_spans = json.dumps(
+        note_token_spans(note_tokens) if note_tokens is not None else None, separators=(",", ":")
+    )
+    return (
+        f'{{"record":"track","index":{index},"tokens":{serialized_tokens},"notes":{serialized_notes},'
+        f'"note_tokens":{serialized_spans}}}\n'
+    ).encode()
+
+
+def serialize_batch_response(
+    files: List[Tuple[str, Optional[bytes], Optional[str]]],
+    results: List[Tuple[int, int, Optional[bytes], Optional[str]]],
+) -> bytes:
+    # files: (filename, metrics, error) per upload, results: (file index, config index, tokens and notes, error)
+    parts = [b'{"success":true,"data":{"files":[']
+    for index, (filename, metrics, error) in enumerate(files):
+        if index:
+            parts.append(b",")
+        parts.append(b'{"filename":' + json.dumps(filename).encode() + b',"metrics":')
+        parts.append(metrics if metrics is not None else b"null")
+        parts.append(b',"error":' + json.dumps(error).encode() + b"}")
+    parts.append(b'],"results":[')
+    for index, (file_index, config_index, tokens_and_notes, error) in enumerate(results):
+        if index:
+            parts.append(b",")
+        success = "true" if error is None else "false"
+        parts.append(f'{{"file":{file_index},"config":{config_index},"success":{success},"data":'.encode())
+        parts.append(tokens_and_notes if tokens_and_notes is not None else b"null")
+        parts.append(b',"error":' + json.dumps(error).encode() + b"}")
+    parts.append(b']},"error":null}')
+    return b"".join(parts)
+
+
+def serialize_packed_process_response(tokens_and_notes: bytes, metrics: bytes) -> bytes:
+    # Same splicing for MessagePack: the data map gets one more entry (its fixmap header is bumped) for the
+    # metrics, which are cached as JSON whatever the response format
+    if not 0x80 <= tokens_and_notes[0] < 0x8F:
+        raise ValueError("Packed tokens must be a MessagePack fixmap")
+    return (
+        b"\x83"
+        + packb("success")
+        + packb(True)
+        + packb("data")
+        + bytes((tokens_and_notes[0] + 1,))
+        + tokens_and_notes[1:]
+        + packb("metrics")
+        + packb(json.loads(metrics))
+        + packb("error")
+        + packb(None)
+    )
 
 
 class TokSequenceEncoder(json.JSONEncoder):
@@ -19,10 +121,121 @@ class TokSequenceEncoder(json.JSONEncoder):
                 "time": obj.time,
                 "program": obj.program,
                 "desc": obj.desc,
-                "note_id": getattr(obj, 'note_id', None)
+                "note_id": getattr(obj, "note_id", None),
             }
         if isinstance(obj, np.integer):
             return int(obj)
         if isinstance(obj, np.floating):
             return float(obj)
+        if isinstance(obj, np.bool_):
+            return bool(obj)
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
         return super(TokSequenceEncoder, self).default(obj)
+
+
+_EVENT_FIELDS = attrgetter("type", "value", "time", "program", "desc")
+# The C string encoder json.dumps uses, missing from the json.encoder stubs
+_encode_string: Callable[[str], str] = getattr(json.encoder, "encode_basestring_ascii")
+
+
+class TokenWriter:
+    # Writes the same JSON as TokSequenceEncoder (compact separators) in a single pass, without building
+    # a dict per event. Token types, values, programs and descs come from a small vocabulary, so their
+    # encoded fragments are cached and each event is only a handful of string appends.
+    def __init__(self) -> None:
+        self._parts: List[str] = []
+        self._heads: Dict[Tuple[Any, ...], str] = {}
+        self._tails: Dict[Tuple[Any, ...], str] = {}
+
+    def getvalue(self) -> str:
+        return "".join(self._parts)
+
+    def write(self, obj: Any, note_ids: Any = None) -> None:
+        # note_ids follows the shape of obj: a list per list (per track, then per token), down to one note index
+        # (-1 for none) shared by all the sub-tokens of a compound token. Without them the events' own note_id
+        # attribute is written.
+        if isinstance(obj, TokSequence):
+            self._write_list(obj.events, note_ids)
+        elif isinstance(obj, (list, tuple)):
+            self._write_list(obj, note_ids)
+        elif isinstance(obj, Event):
+            self._write_event(obj, note_ids)
+        else:
+            self._parts.append(encode_value(obj))
+
+    def serialize_each(self, items: List[Any], note_ids: Optional[List[Any]] = None) -> List[str]:
+        # One JSON document per item (token), sharing the fragment caches
+        parts = self._parts
+        serialized = []
+        for index, item in enumerate(items):
+            start = len(parts)
+            self.write(item, note_ids[index] if note_ids is not None else None)
+            serialized.append("".join(parts[start:]))
+            del parts[start:]
+        return serialized
+
+    def _write_list(self, items: Sequence[Any], note_ids: Any = None) -> None:
+        append = self._parts.append
+        write_event = self._write_event
+        per_item = isinstance(note_ids, list)
+        append("[")
+        for index, item in enumerate(items):
+            if index:
+                append(",")
+            item_note_ids = note_ids[index] if per_item else note_ids
+            if type(item) is Event:
+                write_event(item, item_note_ids)
+            else:
+                self.write(item, item_note_ids)
+        append("]")
+
+    def _write_event(self, event: Event, note_id: Optional[int] = None) -> None:
+        type_, value, time, program, desc = _EVENT_FIELDS(event)
+        append = self._parts.append
+
+        try:
+            head_key: Tuple[Any, ...] = (type_, value, type(value))
+            head = self._heads.get(head_key)
+        except TypeError:
+            head_key, head = (), None
+        if head is None:
+            head = f'{{"type":{encode_value(type_)},"value":{encode_value(value)},"time":'
+            if head_key:
+                self._heads[head_key] = head
+
+        try:
+            tail_key: Tuple[Any, ...] = (program, type(program), desc, type(desc))
+            tail = self._tails.get(tail_key)
+        except TypeError:
+            tail_key, tail = (), None
+        if tail is None:
+            tail = f',"program":{encode_value(program)},"desc":{encode_value(desc)},"note_id":'
+            if tail_key:
+                self._tails[tail_key] = tail
+
+        append(head)
+        # Exactly int: bools and numpy integers go through encode_value
+        append(int.__repr__(time) if type(time) is int else encode_value(time))  # noqa: E721
+        append(tail)
+        if note_id is None:
+            attribute = event.__dict__.get("note_id")
+            append("null" if attribute is None else encode_value(attribute))
+        else:
+            append("null" if note_id < 0 else int.__repr__(note_id))
+        append("}")
+
+
+def encode_value(value: Any) -> str:
+    value_type = type(value)
+    if value_type is str:
+        return _encode_string(value)
+    if value_type is int:
+        return int.__repr__(value)
+    if value is None:
+        return "null"
+    if value_type is bool:
+        return "true" if value else "false"
+    if isinstance(value, np.integer):
+        return int.__repr__(int(value))
+    return json.dumps(value, cls=TokSequenceEncoder, separators=(",", ":"))
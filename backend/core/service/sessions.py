@@ -0,0 +1,268 @@
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+import numpy as np
+from miditok import TokSequence
+
+from core.constants import SESSION_MAX_BYTES, SESSION_TTL
+from core.service.note_table import NoteTable
+from core.service.serializer import TokenWriter
+from core.service.tokenizers.note_linking import NoteLinks, note_token_spans
+
+
+@dataclass
+class SerializedItems:
+    # JSON documents joined with commas in one buffer: item i is data[offsets[i]:offsets[i + 1] - 1]
+    data: bytes
+    offsets: np.ndarray
+
+    @classmethod
+    def from_documents(cls, documents: List[str]) -> "SerializedItems":
+        # Documents are ASCII JSON, so string lengths are byte lengths
+        offsets = np.zeros(len(documents) + 1, dtype=np.int64)
+        np.cumsum([len(document) + 1 for document in documents], out=offsets[1:])
+        return cls(",".join(documents).encode(), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def slice(self, start: int, end: int) -> bytes:
+        if end <= start:
+            return b"[]"
+        return b"[" + self.data[self.offsets[start] : self.offsets[end] - 1] + b"]"
+
+    def take(self, indexes: np.ndarray) -> bytes:
+        data, offsets = self.data, self.offsets
+        return b"[" + b",".join(data[offsets[index] : offsets[index + 1] - 1] for index in indexes.tolist()) + b"]"
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + self.offsets.nbytes
+
+
+@dataclass
+class SessionStream:
+    tokens: SerializedItems
+    # Running maximum of the token times, so a time window maps to a contiguous range of tokens by bisection
+    times: np.ndarray
+
+    def window(self, start_tick: Optional[int], end_tick: Optional[int]) -> Tuple[int, int]:
+        # Tokens from the first one at or after start_tick to the last one before end_tick
+        start = 0 if start_tick is None else int(np.searchsorted(self.times, start_tick, side="left"))
+        end = len(self.times) if end_tick is None else int(np.searchsorted(self.times, end_tick, side="left"))
+        return start, max(start, end)
+
+
+@dataclass
+class SessionTrack:
+    notes: SerializedItems
+    # The interval index: `order` sorts the notes by start, `starts` and `ends` are in that order and
+    # `ends_reached` is the running maximum of the ends, which bounds the notes still sounding at a given tick
+    order: np.ndarray
+    starts: np.ndarray
+    ends: np.ndarray
+    ends_reached: np.ndarray
+    note_tokens: Optional[np.ndarray]
+
+    @classmethod
+    def from_notes(cls, notes: NoteTable, note_tokens: Optional[np.ndarray]) -> "SessionTrack":
+        starts, ends = notes.start, notes.end
+        order = np.argsort(starts, kind="stable")
+        documents = notes.documents()
+        ends_reached = np.maximum.accumulate(ends[order]) if len(notes) else ends
+        return cls(
+            SerializedItems.from_documents(documents), order, starts[order], ends[order], ends_reached, note_tokens
+        )
+
+    def window(self, start_tick: Optional[int], end_tick: Optional[int]) -> np.ndarray:
+        # Indexes of the notes sounding in [start_tick, end_tick), in track order
+        first = 0 if start_tick is None else int(np.searchsorted(self.ends_reached, start_tick, side="right"))
+        last = len(self.starts) if end_tick is None else int(np.searchsorted(self.starts, end_tick, side="left"))
+        candidates = np.arange(first, max(first, last))
+        if start_tick is not None:
+            candidates = candidates[self.ends[candidates] > start_tick]
+        return np.sort(self.order[candidates])
+
+    @property
+    def nbytes(self) -> int:
+        size = self.notes.nbytes + self.order.nbytes + self.starts.nbytes + self.ends.nbytes + self.ends_reached.nbytes
+        return size + (self.note_tokens.nbytes if self.note_tokens is not None else 0)
+
+
+@dataclass
+class SessionData:
+    # What a /process session keeps server side, built in the processing workers
+    streams: List[SessionStream]
+    tracks: List[SessionTrack]
+    # False when the tokenizer made a single token stream for all tracks (REMIPlus, MMM...)
+    nested: bool
+    metrics: Optional[bytes] = None
+    timings: List[Tuple[str, float]] = field(default_factory=list)
+
+    @property
+    def nbytes(self) -> int:
+        size = sum(stream.tokens.nbytes + stream.times.nbytes for stream in self.streams)
+        size += sum(track.nbytes for track in self.tracks)
+        return size + (len(self.metrics) if self.metrics is not None else 0)
+
+    def summary(self) -> dict:
+        return {
+            "nested": self.nested,
+            "streams": [
+                {
+                    "tokens": len(stream.tokens),
+                    "start_tick": int(stream.times[0]) if len(stream.times) else None,
+                    "end_tick": int(stream.times[-1]) if len(stream.times) else None,
+                }
+                for stream in self.streams
+            ],
+            "tracks": [
+                {
+                    "notes": len(track.notes),
+                    "start_tick": int(track.starts[0]) if len(track.starts) else None,
+                    "end_tick": int(track.ends_reached[-1]) if len(track.ends_reached) else None,
+                }
+                for track in self.tracks
+            ],
+        }
+
+
+def build_session_data(
+    tokens: Union[TokSequence, List[TokSequence]], notes: List[NoteTable], links: Optional[NoteLinks]
+) -> SessionData:
+    nested = not isinstance(tokens, TokSequence)
+    sequences = tokens if nested else [tokens]
+    writer = TokenWriter()
+    streams = []
+    for index, sequence in enumerate(sequences):
+        token_notes = links.token_notes[index].tolist() if links is not None else None
+        documents = writer.serialize_each(sequence.events, token_notes)
+        times = np.fromiter(map(_token_time, sequence.events), dtype=np.int64, count=len(sequence.events))
+        streams.append(SessionStream(SerializedItems.from_documents(documents), np.maximum.accumulate(times)))
+
+    tracks = [
+        SessionTrack.from_notes(track_notes, links.note_tokens[index] if links is not None else None)
+        for index, track_notes in enumerate(notes)
+    ]
+    return SessionData(streams, tracks, nested)
+
+
+def _token_time(event: Any) -> int:
+    # Compound tokens take the time of their sub-tokens, tokens without a time (special ones) count as 0
+    if isinstance(event, list):
+        return max((sub_token.time for sub_token in event if sub_token.time is not None), default=0)
+    return event.time if event.time is not None else 0
+
+
+def serialize_session(session_id: str, data: SessionData, ttl: float) -> bytes:
+    summary = _dumps({"session_id": session_id, "expires_in": ttl, **data.summary()})
+    metrics = data.metrics if data.metrics is not None else b"null"
+    return b'{"success":true,"data":' + summary[:-1].encode() + b',"metrics":' + metrics + b'},"error":null}'
+
+
+def serialize_token_window(stream_index: int, stream: SessionStream, start: int, end: int) -> bytes:
+    return (
+        f'{{"success":true,"data":{{"track":{stream_index},"start_token":{start},"end_token":{end},"tokens":'.encode()
+        + stream.tokens.slice(start, end)
+        + b'},"error":null}'
+    )
+
+
+def serialize_note_window(track_index: int, track: SessionTrack, indexes: np.ndarray) -> bytes:
+    spans = note_token_spans(track.note_tokens[indexes]) if track.note_tokens is not None else None
+    return (
+        f'{{"success":true,"data":{{"track":{track_index},"indexes":{_dumps(indexes.tolist())},"notes":'.encode()
+        + track.notes.take(indexes)
+        + f',"note_tokens":{_dumps(spans)}}},"error":null}}'.encode()
+    )
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+
+@dataclass
+class SessionStoreStats:
+    sessions: int
+    bytes: int
+    max_bytes: int
+    ttl: float
+    created: int
+    expired: int
+    evicted: int
+
+
+class SessionStore:
+    # Sessions expire `ttl` seconds after they were last read, and the least recently read ones are evicted
+    # when the total size goes over `max_bytes`
+    def __init__(self, max_bytes: int, ttl: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._clock = clock
+        self._sessions: OrderedDict[str, Tuple[SessionData, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._expired = 0
+        self._evicted = 0
+
+    def add(self, data: SessionData) -> Optional[str]:
+        # None when the session alone is larger than the store
+        size = data.nbytes
+        if size > self.max_bytes:
+            return None
+        session_id = secrets.token_urlsafe(16)
+        with self._lock:
+            self._expire()
+            self._sessions[session_id] = (data, self._clock() + self.ttl)
+            self.size += size
+            self._created += 1
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self._sessions.popitem(last=False)
+                self.size -= evicted.nbytes
+                self._evicted += 1
+        return session_id
+
+    def get(self, session_id: str) -> Optional[SessionData]:
+        with self._lock:
+            self._expire()
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            self._sessions[session_id] = (entry[0], self._clock() + self.ttl)
+            self._sessions.move_to_end(session_id)
+            return entry[0]
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is None:
+                return False
+            self.size -= entry[0].nbytes
+            return True
+
+    def stats(self) -> SessionStoreStats:
+        with self._lock:
+            self._expire()
+            return SessionStoreStats(
+                len(self._sessions), self.size, self.max_bytes, self.ttl, self._created, self._expired, self._evicted
+            )
+
+    def _expire(self) -> None:
+        # Sessions are kept in order of last access, so the expired ones are at the front
+        now = self._clock()
+        while self._sessions:
+            session_id, (data, expires_at) = next(iter(self._sessions.items()))
+            if expires_at > now:
+                break
+            del self._sessions[session_id]
+            self.size -= data.nbytes
+            self._expired += 1
+
+
+session_store = SessionStore(SESSION_MAX_BYTES, SESSION_TTL)
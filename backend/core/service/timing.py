@@ -0,0 +1,119 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds (bytes) of the upload size buckets, with their label
+SIZE_BUCKETS = (
+    (16 * 1024, "0-16KiB"),
+    (64 * 1024, "16-64KiB"),
+    (256 * 1024, "64-256KiB"),
+    (1024 * 1024, "256KiB-1MiB"),
+)
+LARGEST_SIZE_BUCKET = "1MiB+"
+
+Timings = List[Tuple[str, float]]
+# Receives {"stage": ..., "status": "started" | "progress" | "finished", ...} events as stages run
+ProgressListener = Callable[[Dict[str, Any]], None]
+
+
+class StageTimer:
+    # Durations of the named stages of one request, in the order they ran. Stages can repeat (e.g. serialize),
+    # they are summed when reported. The timings are plain tuples so worker processes can send them back.
+    def __init__(self, listener: Optional[ProgressListener] = None) -> None:
+        self.timings: Timings = []
+        self.listener = listener
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self.listener is not None:
+            self.listener({"stage": name, "status": "started"})
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.timings.append((name, seconds))
+            if self.listener is not None:
+                self.listener({"stage": name, "status": "finished", "seconds": seconds})
+
+    def progress(self, name: str, **fields: Any) -> None:
+        # Progress within a running stage (e.g. tracks tokenized so far)
+        if self.listener is not None:
+            self.listener({"stage": name, "status": "progress", **fields})
+
+    def add(self, name: str, seconds: float) -> None:
+        self.timings.append((name, seconds))
+
+    def extend(self, timings: Iterable[Tuple[str, float]]) -> None:
+        self.timings.extend(timings)
+
+    def summed(self) -> Dict[str, float]:
+        stages: Dict[str, float] = {}
+        for name, seconds in self.timings:
+            stages[name] = stages.get(name, 0.0) + seconds
+        return stages
+
+    def server_timing(self) -> str:
+        # Server-Timing header value, durations in milliseconds
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.summed().items())
+
+
+def size_bucket(size: int) -> str:
+    for limit, label in SIZE_BUCKETS:
+        if size < limit:
+            return label
+    return LARGEST_SIZE_BUCKET
+
+
+class StageHistograms:
+    # Latency histograms of every stage by tokenizer and upload size, in the Prometheus text format
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # (stage, tokenizer, size bucket) -> per bucket counts (not cumulative, the last one is +Inf), sum
+        self._series: Dict[Tuple[str, str, str], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, timer: StageTimer, tokenizer: str, size: int) -> None:
+        bucket = size_bucket(size)
+        with self._lock:
+            for stage, seconds in timer.summed().items():
+                counts, total = self._series.setdefault(
+                    (stage, tokenizer, bucket), ([0] * (len(self.buckets) + 1), [0.0])
+                )
+                counts[bisect.bisect_left(self.buckets, seconds)] += 1
+                total[0] += seconds
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(counts), total[0]) for key, (counts, total) in self._series.items())
+        for (stage, tokenizer, bucket), counts, total in series:
+            labels = f'stage="{stage}",tokenizer="{_escape(tokenizer)}",size="{bucket}"'
+            cumulative = 0
+            for limit, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{limit}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+stage_histograms = StageHistograms(
+    "miditok_stage_duration_seconds", "Time spent in each stage of a /process request, by tokenizer and upload size."
+)
@@ -0,0 +1,128 @@
+from dataclasses import dataclass, field
+from operator import attrgetter
+from typing import Any, List, Optional, Tuple, Union
+
+import numpy as np
+from miditok import TokSequence
+from miditoolkit import MidiFile
+
+# Notes are matched on time * _PITCH_SPAN + pitch, MIDI pitches are below 128
+_PITCH_SPAN = 128
+
+
+@dataclass(frozen=True)
+class NoteLinkRule:
+    # Tokens of `note_types` start a note and are matched to it on (time, value) == (start, pitch), tokens of
+    # `follower_types` belong to the last note started before them. Tokens of `end_types` end a note, they are
+    # matched on (time, value) == (end, pitch) and stop later followers from linking to that note.
+    # For compound tokens the whole compound token follows the sub-token of `note_types`.
+    note_types: Tuple[str, ...]
+    follower_types: Tuple[str, ...] = ()
+    end_types: Tuple[str, ...] = ()
+
+
+@dataclass
+class NoteLinks:
+    # One array per track. token_notes: index in the track's notes of the note each token belongs to,
+    # -1 for tokens of no note. note_tokens: (first, last + 1) token span of each note, (-1, -1) if it has none.
+    token_notes: List[np.ndarray] = field(default_factory=list)
+    note_tokens: List[np.ndarray] = field(default_factory=list)
+
+
+def link_notes(
+    tokens: Union[TokSequence, List[TokSequence]], midi: MidiFile, rule: Optional[NoteLinkRule]
+) -> Optional[NoteLinks]:
+    # `midi` is the MIDI the tokens were made from, after preprocessing, so the token times match the notes
+    if rule is None or isinstance(tokens, TokSequence) or len(tokens) != len(midi.instruments):
+        return None
+    links = NoteLinks()
+    for sequence, instrument in zip(tokens, midi.instruments):
+        starts, ends, pitches = (
+            np.fromiter(map(attrgetter(name), instrument.notes), dtype=np.int64, count=len(instrument.notes))
+            for name in ("start", "end", "pitch")
+        )
+        token_notes = _link_sequence(sequence.events, starts, ends, pitches, rule)
+        links.token_notes.append(token_notes)
+        links.note_tokens.append(_note_spans(token_notes, len(instrument.notes)))
+    return links
+
+
+def note_token_spans(note_tokens: np.ndarray) -> List[Optional[List[int]]]:
+    return [None if first < 0 else [first, end] for first, end in note_tokens.tolist()]
+
+
+def _link_sequence(
+    events: List[Any], starts: np.ndarray, ends: np.ndarray, pitches: np.ndarray, rule: NoteLinkRule
+) -> np.ndarray:
+    if events and isinstance(events[0], list):
+        events = _note_position(events, rule)
+    token_notes = np.full(len(events), -1, dtype=np.int32)
+    if not events:
+        return token_notes
+    types = np.array([event.type for event in events])
+
+    is_note = np.isin(types, rule.note_types)
+    note_indexes = np.flatnonzero(is_note)
+    token_notes[note_indexes] = _match(events, note_indexes, starts, pitches)
+
+    anchors = is_note
+    if rule.end_types:
+        is_end = np.isin(types, rule.end_types)
+        end_indexes = np.flatnonzero(is_end)
+        token_notes[end_indexes] = _match(events, end_indexes, ends, pitches)
+        anchors = is_note | is_end
+
+    if rule.follower_types:
+        # Followers take the note of the last anchor before them, which is none when that anchor ended a note
+        anchor_notes = np.where(is_note, token_notes, -1)
+        last_anchors = np.maximum.accumulate(np.where(anchors, np.arange(len(events)), -1))
+        followers = np.flatnonzero(np.isin(types, rule.follower_types) & (last_anchors >= 0))
+        token_notes[followers] = anchor_notes[last_anchors[followers]]
+    return token_notes
+
+
+def _note_position(events: List[List[Any]], rule: NoteLinkRule) -> List[Any]:
+    # The sub-token position holding the pitch is the same for every compound token of a sequence
+    for position in zip(*events):
+        if any(event.type in rule.note_types for event in position):
+            return list(position)
+    return list(next(zip(*events)))
+
+
+def _match(events: List[Any], indexes: np.ndarray, note_times: np.ndarray, note_pitches: np.ndarray) -> np.ndarray:
+    # The k-th token of a given (time, pitch) goes to the k-th note of that (time, pitch), so notes played
+    # twice at once are told apart. Tokens without a matching note get -1.
+    if not len(note_times):
+        return np.full(len(indexes), -1)
+    times = np.fromiter((events[index].time for index in indexes), dtype=np.int64, count=len(indexes))
+    values = np.fromiter((events[index].value for index in indexes), dtype=np.int64, count=len(indexes))
+    token_keys = times * _PITCH_SPAN + values
+    note_keys = note_times * _PITCH_SPAN + note_pitches
+
+    note_order = np.argsort(note_keys, kind="stable")
+    sorted_note_keys = note_keys[note_order]
+    positions = np.searchsorted(sorted_note_keys, token_keys) + _occurrence_ranks(token_keys)
+    matched = positions < len(sorted_note_keys)
+    matched[matched] = sorted_note_keys[positions[matched]] == token_keys[matched]
+    return np.where(matched, note_order[np.minimum(positions, len(note_order) - 1)], -1)
+
+
+def _occurrence_ranks(keys: np.ndarray) -> np.ndarray:
+    # How many times each key already appeared before it
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    ranks = np.empty(len(keys), dtype=np.int64)
+    ranks[order] = np.arange(len(keys)) - np.searchsorted(sorted_keys, sorted_keys)
+    return ranks
+
+
+def _note_spans(token_notes: np.ndarray, note_count: int) -> np.ndarray:
+    spans = np.full((note_count, 2), -1, dtype=np.int32)
+    linked = np.flatnonzero(token_notes >= 0)
+    notes = token_notes[linked]
+    # `linked` is sorted, so the first occurrence of a note in it is its first token, and in reverse its last
+    linked_notes, first = np.unique(notes, return_index=True)
+    spans[linked_notes, 0] = linked[first]
+    linked_notes, last = np.unique(notes[::-1], return_index=True)
+    spans[linked_notes, 1] = linked[::-1][last] + 1
+    return spans
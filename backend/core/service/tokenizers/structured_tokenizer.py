@@ -1,23 +1,11 @@
-from miditoolkit import MidiFile
 from miditok import Structured
 
-class StructuredTokenizer(Structured):
-    def __init__(self, config):
-        super().__init__(config)
+from core.service.tokenizers.note_linking import NoteLinkRule
 
-    def midi_to_tokens(self, midi: MidiFile):
-        tokens = super().midi_to_tokens(midi)
 
-        for token_list in tokens:
-            current_note_id = None
-            for token in token_list.events:
-                if token.type == "Pitch":
-                    current_note_id = f"{token.time}:{token.value}"
-                    token.note_id = current_note_id
-                elif token.type in ["Velocity", "Duration"]:
-                    if current_note_id:
-                        token.note_id = current_note_id
-                else:
-                    token.note_id = None  
+class StructuredTokenizer(Structured):
+    # Tokens are linked to their notes after tokenization, see note_linking.link_notes
+    note_link_rule = NoteLinkRule(note_types=("Pitch",), follower_types=("Velocity", "Duration"))
 
-        return tokens
\ No newline at end of file
+    def __init__(self, config):
+        super().__init__(config)
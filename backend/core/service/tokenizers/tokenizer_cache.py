@@ -0,0 +1,127 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict
+
+from core.constants import TOKENIZER_CACHE_SIZE
+
+if TYPE_CHECKING:
+    # Only for annotations, so the API can compute cache keys without importing miditok up front
+    from miditok import MIDITokenizer, TokenizerConfig
+
+
+@dataclass
+class CachedTokenizer:
+    tokenizer: "MIDITokenizer"
+    # miditok tokenizers keep per-call state (current MIDI metadata), so a shared instance
+    # must not tokenize two files at the same time
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+@dataclass
+class TokenizerCacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    max_size: int
+    pinned: int
+
+
+class TokenizerCache:
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._entries: OrderedDict[str, CachedTokenizer] = OrderedDict()
+        # Preset tokenizers: never evicted, and not counted in max_size
+        self._pinned: Dict[str, CachedTokenizer] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get_or_create(self, key: str, builder: Callable[[], "MIDITokenizer"]) -> CachedTokenizer:
+        with self._lock:
+            entry = self._pinned.get(key)
+            if entry is not None:
+                self._hits += 1
+                return entry
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry
+            self._misses += 1
+
+        # Vocabulary construction is the expensive part, so it runs outside the lock
+        entry = CachedTokenizer(builder())
+
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                self._entries.move_to_end(key)
+                return existing
+            self._entries[key] = entry
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+        return entry
+
+    def pin(self, key: str, builder: Callable[[], "MIDITokenizer"]) -> CachedTokenizer:
+        # Like get_or_create, but the tokenizer stays until the process ends. An entry already cached is
+        # moved out of the LRU, so both never hold the same key.
+        with self._lock:
+            entry = self._pinned.get(key)
+            if entry is not None:
+                self._hits += 1
+                return entry
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._hits += 1
+                self._pinned[key] = entry
+                return entry
+            self._misses += 1
+
+        entry = CachedTokenizer(builder())
+
+        with self._lock:
+            return self._pinned.setdefault(key, entry)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._pinned or key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._pinned.clear()
+
+    def stats(self) -> TokenizerCacheStats:
+        with self._lock:
+            return TokenizerCacheStats(
+                self._hits, self._misses, self._evictions, len(self._entries), self._max_size, len(self._pinned)
+            )
+
+
+def canonical_config_key(tokenizer_type: str, config: "TokenizerConfig") -> str:
+    payload = {"tokenizer": tokenizer_type, "config": _canonicalize(vars(config))}
+    serialized = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def _canonicalize(value: Any) -> Any:
+    # Config dicts are keyed by tuples (beat_res) or ints (time_signature_range), which JSON can't sort
+    if isinstance(value, dict):
+        items = [[_canonicalize(key), _canonicalize(item)] for key, item in value.items()]
+        return sorted(items, key=lambda item: json.dumps(item[0]))
+    if isinstance(value, (list, tuple)):
+        return [_canonicalize(item) for item in value]
+    return value
+
+
+tokenizer_cache = TokenizerCache(TOKENIZER_CACHE_SIZE)
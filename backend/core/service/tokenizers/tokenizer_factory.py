@@ -1,39 +1,62 @@
-from miditoolkit import MidiFile
-from miditok import (
-    MMM,
-    MIDITokenizer,
-    MuMIDI,
-    REMIPlus,
-    TokenizerConfig
+from copy import deepcopy
+from importlib import import_module
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Optional, Tuple, Type
+
+from core.constants import DEFAULT_TOKENIZER_PARAMS
+from core.service.tokenizers.tokenizer_cache import (
+    CachedTokenizer,
+    TokenizerCache,
+    canonical_config_key,
+    tokenizer_cache,
 )
 
-from core.service.tokenizers.remi_tokenizer import REMITokenizer
-from core.service.tokenizers.midilike_tokenizer import MIDILikeTokenizer
-from core.service.tokenizers.tsd_tokenizer import TSDTokenizer
-from core.service.tokenizers.structured_tokenizer import StructuredTokenizer
-from core.service.tokenizers.cpword_tokenizer import CPWordTokenizer
-from core.service.tokenizers.octuple_tokenizer import OctupleTokenizer
+if TYPE_CHECKING:
+    from miditok import MIDITokenizer, TokenizerConfig
+
+# Module and class of every tokenizer type. Classes are imported the first time their type is asked for,
+# so importing the factory doesn't import miditok and every tokenizer module.
+TOKENIZER_CLASSES: Dict[str, Tuple[str, str]] = {
+    "REMI": ("core.service.tokenizers.remi_tokenizer", "REMITokenizer"),
+    "REMIPlus": ("miditok", "REMIPlus"),  # Not used by frontend
+    "MIDILike": ("core.service.tokenizers.midilike_tokenizer", "MIDILikeTokenizer"),
+    "TSD": ("core.service.tokenizers.tsd_tokenizer", "TSDTokenizer"),
+    "Structured": ("core.service.tokenizers.structured_tokenizer", "StructuredTokenizer"),
+    "CPWord": ("core.service.tokenizers.cpword_tokenizer", "CPWordTokenizer"),
+    "Octuple": ("core.service.tokenizers.octuple_tokenizer", "OctupleTokenizer"),
+    "MuMIDI": ("miditok", "MuMIDI"),  # Not used by frontend
+    "MMM": ("miditok", "MMM"),  # Not used by frontend
+}
+
+
+def tokenizer_class(tokenizer_type: str) -> Type["MIDITokenizer"]:
+    if tokenizer_type not in TOKENIZER_CLASSES:
+        raise ValueError(tokenizer_type)
+    module_name, class_name = TOKENIZER_CLASSES[tokenizer_type]
+    return getattr(import_module(module_name), class_name)
+
 
 class TokenizerFactory:
-    def get_tokenizer(self, tokenizer_type: str, config: TokenizerConfig) -> MIDITokenizer:
-        match tokenizer_type:
-            case "REMI":
-                return REMITokenizer(config)
-            case "REMIPlus":
-                return REMIPlus(config) # Not used by frontend
-            case "MIDILike":
-                return MIDILikeTokenizer(config)
-            case "TSD":
-                return TSDTokenizer(config)
-            case "Structured":
-                return StructuredTokenizer(config)
-            case "CPWord":
-                return CPWordTokenizer(config)
-            case "Octuple":
-                return OctupleTokenizer(config)
-            case "MuMIDI":
-                return MuMIDI(config) # Not used by frontend
-            case "MMM":
-                return MMM(config) # Not used by frontend
-            case _:
-                raise ValueError(tokenizer_type)
+    def __init__(self, cache: Optional[TokenizerCache] = None) -> None:
+        self._cache = cache if cache is not None else tokenizer_cache
+
+    def get_tokenizer(self, tokenizer_type: str, config: "TokenizerConfig") -> "MIDITokenizer":
+        return tokenizer_class(tokenizer_type)(config)
+
+    def get_cached_tokenizer(self, tokenizer_type: str, config: "TokenizerConfig") -> CachedTokenizer:
+        # Tokenizers tweak their config while building the vocabulary (e.g. additional_params),
+        # so the key is computed on the caller's config and the tokenizer is built from a copy
+        key = canonical_config_key(tokenizer_type, config)
+        return self._cache.get_or_create(key, lambda: self.get_tokenizer(tokenizer_type, deepcopy(config)))
+
+    def get_pinned_tokenizer(
+        self, tokenizer_type: str, key: str, config_builder: Callable[[], "TokenizerConfig"]
+    ) -> CachedTokenizer:
+        # For presets, whose canonical key is computed once when they are registered: once pinned, getting
+        # the tokenizer is a dictionary lookup, and the config is only built the first time
+        return self._cache.pin(key, lambda: self.get_tokenizer(tokenizer_type, config_builder()))
+
+    def warm_up(self, tokenizer_types: Iterable[str]) -> None:
+        from miditok import TokenizerConfig
+
+        for tokenizer_type in tokenizer_types:
+            self.get_cached_tokenizer(tokenizer_type, TokenizerConfig(**DEFAULT_TOKENIZER_PARAMS))
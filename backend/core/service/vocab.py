@@ -0,0 +1,55 @@
+import hashlib
+import json
+from operator import itemgetter
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:
+    from miditok import MIDITokenizer
+
+# Bump whenever the /vocab payload changes, so clients holding an older one get the new one
+VOCAB_VERSION = "1"
+# Token types a tokenizer appends to its vocabulary when it meets longer files than the config allows for
+# (max_bar_embedding): Bar_60, Bar_61... take the ids following the last one of the vocabulary
+GROWING_TOKEN_TYPES = {"Octuple": "Bar", "MuMIDI": "BarPosEnc"}
+
+
+def vocab_etag(config_key: str) -> str:
+    # Strong ETag of the vocabulary of a canonical tokenizer config. The vocabulary only depends on the
+    # config and on the miditok version building it.
+    from miditok import __version__ as miditok_version
+
+    digest = hashlib.sha256(f"{VOCAB_VERSION}:{miditok_version}:{config_key}".encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def build_vocab(tokenizer_type: str, tokenizer: "MIDITokenizer") -> Dict[str, Any]:
+    # One vocabulary per sub-token position for compound tokenizers (CPWord, Octuple, MuMIDI), a single one
+    # otherwise. In each, the token at index i is the one of id i, split into its type and value as miditok
+    # names them ("Pitch_60" is type "Pitch", value "60"). The tokenizer must be freshly built: one that
+    # already tokenized files may have grown its vocabulary, and the ETag only covers the config.
+    vocabs = tokenizer.vocab if tokenizer.is_multi_voc else [tokenizer.vocab]
+    growing_type = GROWING_TOKEN_TYPES.get(tokenizer_type)
+    return {
+        "tokenizer": tokenizer_type,
+        "multi_voc": tokenizer.is_multi_voc,
+        "vocabs": [_vocab_columns(vocab, growing_type) for vocab in vocabs],
+    }
+
+
+def _vocab_columns(vocab: Dict[str, int], growing_type: Optional[str]) -> Dict[str, Any]:
+    tokens = [token for token, _ in sorted(vocab.items(), key=itemgetter(1))]
+    types, values = zip(*(token.split("_", 1) for token in tokens)) if tokens else ((), ())
+    # Ids past the end of a growing vocabulary continue its last type: id len(tokens) + i has the value
+    # of the last token plus 1 + i
+    grows = growing_type if types and types[-1] == growing_type else None
+    return {"tokens": tokens, "type": list(types), "value": list(values), "grows": grows}
+
+
+def serialize_vocab(vocab: Dict[str, Any]) -> bytes:
+    return json.dumps({"success": True, "data": vocab, "error": None}, separators=(",", ":")).encode()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison: W/ prefixes are ignored
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return any(candidate == "*" or candidate.removeprefix("W/") == etag for candidate in candidates)
@@ -0,0 +1,96 @@
+import os
+import time
+from dataclasses import dataclass
+from importlib import import_module
+from io import BytesIO
+from typing import TYPE_CHECKING, Optional, Sequence, Tuple
+
+from core.constants import DEFAULT_CONFIG, PRESETS_FILE, STARTUP_WARM_UP, WARM_UP_TOKENIZER_CACHE, WARM_UP_TOKENIZERS
+
+if TYPE_CHECKING:
+    from core.api.model import ConfigModel
+
+# What the API process itself needs to answer requests, besides what runs in the processing workers
+API_PIPELINE_MODULES = [
+    "core.service.midi_processing",
+    "core.service.parsed_score",
+    "core.service.serializer",
+    "core.service.sessions",
+]
+
+# Why the warm-up of this processing worker failed, see warm_up_worker
+worker_warm_up_error: Optional[str] = None
+
+
+@dataclass
+class WarmUpStatus:
+    # pending until the app starts, then running, and finally done, failed or skipped (STARTUP_WARM_UP=0)
+    state: str = "pending"
+    seconds: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state in ("done", "skipped")
+
+
+def warm_up_tokenizers() -> None:
+    # Processing worker initializer
+    if WARM_UP_TOKENIZER_CACHE:
+        from core.service.tokenizers.tokenizer_factory import TokenizerFactory
+
+        TokenizerFactory().warm_up(WARM_UP_TOKENIZERS)
+
+
+def warm_up_worker() -> None:
+    # Process pool initializer, so every worker process runs it once before its first job: the tokenizer
+    # cache, then with STARTUP_WARM_UP the whole pipeline and the presets of PRESETS_FILE. A failed pipeline
+    # warm-up is only reported by worker_status, an initializer raising would break the whole pool.
+    global worker_warm_up_error
+    warm_up_tokenizers()
+    if not STARTUP_WARM_UP:
+        return
+    try:
+        from core.service.presets import read_presets_file
+
+        presets = read_presets_file(PRESETS_FILE) if PRESETS_FILE else []
+        warm_up_pipeline([(preset.config, preset.config_key) for preset in presets])
+    except Exception as e:
+        worker_warm_up_error = str(e) or type(e).__name__
+
+
+def worker_status() -> Tuple[int, Optional[str]]:
+    # Run as a job, which a worker only takes once its initializer is done
+    return os.getpid(), worker_warm_up_error
+
+
+def import_api_pipeline() -> float:
+    start_time = time.perf_counter()
+    for module in API_PIPELINE_MODULES:
+        import_module(module)
+    return time.perf_counter() - start_time
+
+
+def warm_up_pipeline(presets: Sequence[Tuple["ConfigModel", str]] = ()) -> None:
+    # A small file through the whole pipeline with the frontend's default config, so the first request finds
+    # its tokenizer built and every code path already imported and run once. The tokenizers of the presets
+    # (config and canonical key) are pinned.
+    from core.api.model import ConfigModel
+    from core.service.midi_processing import pin_preset_tokenizer, process_midi_file
+
+    process_midi_file(ConfigModel(**DEFAULT_CONFIG), dummy_midi())
+    for config, config_key in presets:
+        pin_preset_tokenizer(config, config_key)
+
+
+def dummy_midi() -> bytes:
+    from mido import Message, MetaMessage, MidiFile, MidiTrack
+
+    track = MidiTrack([MetaMessage("time_signature", numerator=4, denominator=4), MetaMessage("set_tempo")])
+    for pitch in (60, 64, 67, 72):
+        track.append(Message("note_on", note=pitch, velocity=80, time=0))
+        track.append(Message("note_off", note=pitch, velocity=0, time=480))
+    midi = MidiFile(type=1, ticks_per_beat=480, tracks=[track])
+    output = BytesIO()
+    midi.save(file=output)
+    return output.getvalue()
@@ -0,0 +1,118 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from core.api.admission import AdmissionController, AdmissionMiddleware, AdmissionRejected
+from core.api.forwarded import ForwardedClientMiddleware, forwarded_client
+from tests.test_jobs import FakeClock
+
+
+def create_controller(**kwargs: Any) -> AdmissionController:
+    params = {"max_in_flight": 2, "max_per_client": 1, "rate": 0.0, "burst": 1, "max_wait": 1.0, "max_queued": 8}
+    return AdmissionController(**{**params, **kwargs})
+
+
+@pytest.mark.asyncio
+async def test_waiting_requests_get_freed_slots_by_client():
+    controller = create_controller()
+    await controller.acquire("a")
+    await controller.acquire("b")
+    # "a" is at its own limit, "c" only waits for a free slot: it gets the one "b" frees, ahead of "a"
+    second_a = asyncio.create_task(controller.acquire("a"))
+    first_c = asyncio.create_task(controller.acquire("c"))
+    await asyncio.sleep(0)
+    controller.release("b")
+    await asyncio.wait_for(first_c, 1)
+    assert not second_a.done()
+    controller.release("a")
+    await asyncio.wait_for(second_a, 1)
+
+    stats = controller.stats()
+    assert (stats.admitted, stats.queued, stats.in_flight, stats.waiting, stats.clients) == (4, 2, 2, 0, 2)
+
+
+@pytest.mark.asyncio
+async def test_waiting_too_long_is_rejected():
+    controller = create_controller(max_wait=0.01, max_queued=1)
+    await controller.acquire("a")
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire("a")
+    assert rejected.value.status_code == 429
+
+    await controller.acquire("b")
+    waiting = asyncio.create_task(controller.acquire("c"))
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire("d")
+    assert rejected.value.status_code == 503
+    with pytest.raises(AdmissionRejected) as rejected:
+        await waiting
+    assert rejected.value.status_code == 503
+    stats = controller.stats()
+    assert (stats.timed_out, stats.queue_full, stats.waiting) == (2, 1, 0)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket():
+    clock = FakeClock()
+    controller = create_controller(max_in_flight=10, max_per_client=10, rate=0.5, burst=2, clock=clock)
+    for _ in range(2):
+        await controller.acquire("a")
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire("a")
+    assert (rejected.value.status_code, rejected.value.retry_after) == (429, 2)
+    await controller.acquire("b")
+
+    clock.now = 2.0
+    await controller.acquire("a")
+    assert controller.stats().rate_limited == 1
+
+
+def test_admission_middleware():
+    controller = create_controller(max_in_flight=1, max_wait=0.01)
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware, controller=controller, paths=["/process"])
+
+    @app.post("/process")
+    async def process():
+        # A second request from the same client, while this one holds the client's only slot
+        response = await asyncio.to_thread(client.post, "/process")
+        return {"nested": response.status_code, "retry_after": response.headers.get("Retry-After")}
+
+    @app.get("/process")
+    async def not_admitted():
+        return {}
+
+    client = TestClient(app)
+    assert client.post("/process").json() == {"nested": 429, "retry_after": "1"}
+    assert client.get("/process").status_code == 200
+    stats = controller.stats()
+    assert (stats.admitted, stats.timed_out, stats.in_flight) == (1, 1, 0)
+
+
+def test_spoofed_forwarded_for_entries_dont_change_the_client():
+    assert forwarded_client("1.1.1.1, 10.0.0.1", 1) == "10.0.0.1"
+    assert forwarded_client("1.1.1.1, 10.0.0.1, 10.0.0.2", 2) == "10.0.0.1"
+    assert forwarded_client("10.0.0.1", 2) == "10.0.0.1"
+
+    clock = FakeClock()
+    controller = create_controller(max_in_flight=10, max_per_client=10, rate=0.5, burst=1, clock=clock)
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware, controller=controller, paths=["/process"])
+    app.add_middleware(ForwardedClientMiddleware, trusted_hops=1)
+
+    @app.post("/process")
+    async def process(request: Request) -> Dict[str, Optional[str]]:
+        return {"client": request.client.host if request.client else None}
+
+    client = TestClient(app)
+    first = client.post("/process", headers={"X-Forwarded-For": "1.1.1.1, 10.0.0.1"})
+    assert first.json() == {"client": "10.0.0.1"}
+    # The router appended the same address: a different leading entry is the same client, out of tokens
+    assert client.post("/process", headers={"X-Forwarded-For": "2.2.2.2, 10.0.0.1"}).status_code == 429
+    assert client.post("/process", headers={"X-Forwarded-For": "10.0.0.1"}).status_code == 429
+    assert client.post("/process", headers={"X-Forwarded-For": "1.1.1.1, 10.0.0.2"}).status_code == 200
+    assert controller.stats().rate_limited == 2
@@ -1,11 +1,19 @@
+import json
+from typing import Any, Dict
+
 import pytest
 from fastapi.testclient import TestClient
 
+from benchmarks.synthetic import SIZES, generate_midi
 from core.api.api import app
-from core.constants import EXAMPLE_MIDI_FILE_PATH
+from core.constants import DEFAULT_CONFIG, EXAMPLE_MIDI_FILE_PATH
+from core.service.result_cache import result_cache
+from core.service.timing import stage_histograms
 
 client = TestClient(app)
 
+TEST_CONFIG: Dict[str, Any] = {**DEFAULT_CONFIG, "tokenizer": "REMI"}
+
 
 @pytest.fixture
 def event_loop():
@@ -22,3 +30,249 @@ async def test_upload_file():
         form_data = {"file": file}
         response = client.post("/process", files=form_data)
         assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_process_file():
+    with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+        form_data = {"file": ("example.mid", file, "audio/midi")}
+        response = client.post("/process", files=form_data, data={"config": json.dumps(TEST_CONFIG)})
+    assert response.status_code == 200
+    content = response.json()
+    assert content["success"]
+    assert len(content["data"]["tokens"]) == len(content["data"]["notes"])
+    assert content["data"]["metrics"]["resolution"] > 0
+
+
+@pytest.mark.asyncio
+async def test_process_file_reports_stage_timings():
+    result_cache.clear()
+    stage_histograms.clear()
+    with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+        form_data = {"file": ("example.mid", file, "audio/midi")}
+        response = client.post("/process", files=form_data, data={"config": json.dumps(TEST_CONFIG)})
+
+    stages = dict(entry.split(";dur=") for entry in response.headers["Server-Timing"].split(", "))
+    for stage in ["read", "cache", "wait", "parse", "tokenizer", "tokenize", "notes", "link", "metrics", "serialize"]:
+        assert float(stages[stage]) >= 0
+    assert float(stages["total"]) >= float(stages["tokenize"])
+
+    exposition = client.get("/metrics").text
+    assert '_count{stage="tokenize",tokenizer="REMI",size="16-64KiB"} 1' in exposition
+
+
+@pytest.mark.asyncio
+async def test_process_session():
+    with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+        form_data = {"file": ("example.mid", file, "audio/midi")}
+        response = client.post("/process?session=true", files=form_data, data={"config": json.dumps(TEST_CONFIG)})
+    assert response.status_code == 200
+    summary = response.json()["data"]
+    assert summary["metrics"]["resolution"] > 0
+    assert summary["streams"][0]["tokens"] > 0 and summary["tracks"][0]["notes"] > 0
+    sessions_url = f"/sessions/{summary['session_id']}"
+
+    tokens = client.get(f"{sessions_url}/tokens", params={"track": 0, "start_tick": 0, "end_tick": 1920}).json()
+    assert 0 < len(tokens["data"]["tokens"]) < summary["streams"][0]["tokens"]
+    notes = client.get(f"{sessions_url}/notes", params={"track": 0, "start_tick": 0, "end_tick": 1920}).json()
+    assert all(note["start"] < 1920 for note in notes["data"]["notes"])
+    assert client.get(f"{sessions_url}/notes", params={"track": 99}).status_code == 400
+
+    assert client.delete(sessions_url).status_code == 200
+    response = client.get(f"{sessions_url}/tokens")
+    assert response.status_code == 404
+    assert response.json()["success"] is False
+
+
+@pytest.mark.asyncio
+async def test_piano_roll():
+    with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+        form_data = {"file": ("example.mid", file, "audio/midi")}
+        response = client.post("/piano-roll", files=form_data, params={"width": 64})
+    assert response.status_code == 200
+    assert "total" in response.headers["Server-Timing"]
+    data = response.json()["data"]
+    track = data["tracks"][0]
+    assert track["notes"] > 0 and track["min_pitch"] <= track["max_pitch"]
+    assert -(-data["end"] // track["time_step"]) <= 64
+    assert sum(track["tiles"]["count"]) >= track["notes"]
+
+    # Later views of the same file read the cached tiles
+    response = client.get(f"/piano-roll/{data['digest']}", params={"track": 0, "level": 0, "end_tick": 1920})
+    assert response.status_code == 200
+    window = response.json()["data"]["tracks"]
+    assert len(window) == 1 and window[0]["time_step"] == data["resolution"]
+    assert all(start < 1920 for start in window[0]["tiles"]["start"])
+    assert client.get(f"/piano-roll/{data['digest']}", params={"track": 99}).status_code == 400
+    assert client.get("/piano-roll/unknown").status_code == 404
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("tokenizer", ["REMI", "Octuple"])
+async def test_vocab_decodes_ids(tokenizer):
+    config = json.dumps({**TEST_CONFIG, "tokenizer": tokenizer})
+    response = client.get("/vocab", params={"config": config})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    vocabs = response.json()["data"]["vocabs"]
+    assert len(vocabs) == (6 if tokenizer == "Octuple" else 1)
+    assert client.get("/vocab", params={"config": config}, headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+    other = client.get("/vocab", params={"config": json.dumps({**TEST_CONFIG, "tokenizer": "TSD"})})
+    assert other.headers["ETag"] != etag
+    assert client.get("/vocab", params={"config": "{}"}).status_code == 422
+
+    with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+        midi_bytes = file.read()
+    form_data = {"file": ("example.mid", midi_bytes, "audio/midi")}
+    full = client.post("/process", files=form_data, data={"config": config}).json()["data"]
+    response = client.post("/process", params={"format": "ids"}, files=form_data, data={"config": config})
+    assert response.headers["content-type"] == "application/vnd.miditok.ids+json"
+    data = response.json()["data"]
+    stream, tokens = data["tokens"]["streams"][0], full["tokens"][0]
+    assert data["notes"] == full["notes"] and data["metrics"] == full["metrics"]
+    # Every id decodes to the token the plain JSON format sends
+    if stream["compound"]:
+        # Octuple's Bar vocabulary grows with the file: ids past its end are more bars
+        decoded = [[_token_type(vocab, i) for vocab, i in zip(vocabs, ids)] for ids in stream["ids"]]
+        assert max(ids[4] for ids in stream["ids"]) >= len(vocabs[4]["tokens"]) and vocabs[4]["grows"] == "Bar"
+        assert decoded == [[sub_token["type"] for sub_token in token] for token in tokens]
+    else:
+        assert [vocabs[0]["type"][i] for i in stream["ids"]] == [token["type"] for token in tokens]
+        assert stream["time"] == [token["time"] for token in tokens]
+    assert stream["note_id"] == [-1 if token_note is None else token_note for token_note in _note_ids(tokens)]
+
+
+def _token_type(vocab, token_id):
+    return vocab["type"][token_id] if token_id < len(vocab["tokens"]) else vocab["grows"]
+
+
+def _note_ids(tokens):
+    return [token[0]["note_id"] if isinstance(token, list) else token["note_id"] for token in tokens]
+
+
+@pytest.mark.asyncio
+async def test_process_unsupported_file_type():
+    with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+        form_data = {"file": ("example.txt", file, "text/plain")}
+        response = client.post("/process", files=form_data, data={"config": json.dumps(TEST_CONFIG)})
+    assert response.status_code == 415
+    assert response.json()["success"] is False
+
+
+@pytest.mark.asyncio
+async def test_process_rejects_non_midi_content():
+    form_data = {"file": ("example.mid", b"<html>not a midi file</html>", "audio/midi")}
+    response = client.post("/process", files=form_data, data={"config": json.dumps(TEST_CONFIG)})
+    assert response.status_code == 415
+    assert response.json()["error"] == "Not a MIDI file"
+
+
+@pytest.mark.asyncio
+async def test_process_file_is_cached():
+    result_cache.clear()
+    memory_hits = result_cache.stats().memory_hits
+    responses = []
+    for tokenizer in ["REMI", "REMI", "TSD"]:
+        with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+            form_data = {"file": ("example.mid", file, "audio/midi")}
+            config = {**TEST_CONFIG, "tokenizer": tokenizer}
+            responses.append(client.post("/process", files=form_data, data={"config": json.dumps(config)}))
+
+    assert responses[0].content == responses[1].content
+    assert responses[2].json()["data"]["metrics"] == responses[0].json()["data"]["metrics"]
+    stats = client.get("/stats").json()["data"]["result_cache"]
+    # Second request: tokens and metrics hit, third request: only metrics hit
+    assert stats["memory_hits"] - memory_hits == 3
+
+
+@pytest.mark.asyncio
+async def test_process_batch():
+    configs = [TEST_CONFIG, {**TEST_CONFIG, "tokenizer": "TSD"}, TEST_CONFIG]
+    with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+        midi_bytes = file.read()
+    files = [
+        ("files", ("example.mid", midi_bytes, "audio/midi")),
+        ("files", ("broken.mid", b"not a midi file", "audio/midi")),
+        ("files", ("notes.txt", b"text", "text/plain")),
+    ]
+    response = client.post("/process/batch", files=files, data={"configs": [json.dumps(config) for config in configs]})
+    assert response.status_code == 200
+    content = response.json()
+    assert content["success"]
+
+    batch_files = content["data"]["files"]
+    assert [batch_file["filename"] for batch_file in batch_files] == ["example.mid", "broken.mid", "notes.txt"]
+    assert batch_files[0]["metrics"] and batch_files[0]["error"] is None
+    assert batch_files[1]["error"] and batch_files[2]["error"] == "Unsupported file type"
+
+    results = content["data"]["results"]
+    assert [(result["file"], result["config"]) for result in results] == [(f, c) for f in range(3) for c in range(3)]
+    assert all(result["success"] for result in results[:3])
+    assert not any(result["success"] or result["data"] for result in results[3:])
+    assert results[0]["data"] == results[2]["data"]
+    assert results[0]["data"]["tokens"] != results[1]["data"]["tokens"]
+
+
+@pytest.mark.asyncio
+async def test_process_batch_too_large(monkeypatch):
+    monkeypatch.setattr("core.api.api.BATCH_MAX_ITEMS", 1)
+    with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+        midi_bytes = file.read()
+    files = [("files", ("a.mid", midi_bytes, "audio/midi")), ("files", ("b.mid", midi_bytes, "audio/midi"))]
+    response = client.post("/process/batch", files=files, data={"configs": [json.dumps(TEST_CONFIG)]})
+    assert response.status_code == 413
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("tokenizer", ["REMI", "REMIPlus"])
+async def test_process_stream(tokenizer):
+    config = {**TEST_CONFIG, "tokenizer": tokenizer}
+    with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+        form_data = {"file": ("example.mid", file, "audio/midi")}
+        response = client.post("/process/stream", files=form_data, data={"config": json.dumps(config)})
+        file.seek(0)
+        form_data = {"file": ("example.mid", file, "audio/midi")}
+        processed = client.post("/process", files=form_data, data={"config": json.dumps(config)}).json()["data"]
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["record"] for record in records[:2]] == ["info", "metrics"]
+    assert records[-1] == {"record": "end"}
+    metrics = {key: value for record in records[:2] for key, value in record.items() if key != "record"}
+    assert json.loads(json.dumps(metrics)) == processed["metrics"]
+
+    tracks = [record for record in records if record["record"] == "track"]
+    assert [track["notes"] for track in tracks] == processed["notes"]
+    if tokenizer == "REMIPlus":
+        assert records[2] == {"record": "tokens", "tokens": processed["tokens"]}
+    else:
+        assert [track["tokens"] for track in tracks] == processed["tokens"]
+
+
+@pytest.mark.asyncio
+async def test_process_stream_tracks():
+    # One record per track, the same tracks /process returns
+    midi_bytes = generate_midi(SIZES["small"])
+    form_data = {"file": ("small.mid", midi_bytes, "audio/midi")}
+    response = client.post("/process/stream", files=form_data, data={"config": json.dumps(TEST_CONFIG)})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    processed = client.post("/process", files=form_data, data={"config": json.dumps(TEST_CONFIG)}).json()["data"]
+    tracks = [json.loads(line) for line in response.text.splitlines() if json.loads(line)["record"] == "track"]
+    assert len(tracks) == len(processed["tokens"]) > 1
+    assert [track["tokens"] for track in tracks] == processed["tokens"]
+
+
+@pytest.mark.asyncio
+async def test_process_stream_invalid_file():
+    form_data = {"file": ("broken.mid", b"not a midi file", "audio/midi")}
+    response = client.post("/process/stream", files=form_data, data={"config": json.dumps(TEST_CONFIG)})
+    assert response.status_code == 415
+    assert not response.json()["success"]
+
+    # Valid chunk headers around a track the parsers fail on
+    broken = b"MThd\x00\x00\x00\x06\x00\x01\x00\x01\x01\xe0MTrk\x00\x00\x00\x04\x00\xf4\x00\x00"
+    form_data = {"file": ("broken.mid", broken, "audio/midi")}
+    response = client.post("/process/stream", files=form_data, data={"config": json.dumps(TEST_CONFIG)})
+    assert response.status_code == 500
+    assert not response.json()["success"]
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import os
+
+from benchmarks.baseline import compare
+from benchmarks.import_time import measure_imports
+from benchmarks.load import in_process_clients, load_scenario, run_load, summarize
+from benchmarks.notes import legacy_midi_to_notes, legacy_serialize
+from benchmarks.synthetic import SyntheticSpec, generate_midi
+from core.service.midi_processing import midi_to_notes
+from core.service.note_table import serialize_note_tables
+from core.service.parsed_score import ParsedScore
+
+
+def test_synthetic_midi_is_reproducible_and_sized():
+    spec = SyntheticSpec(notes=301, tracks=3, drum_notes=50, tempo_changes=4, time_signature_changes=2, seed=7)
+    midi_bytes = generate_midi(spec)
+
+    assert generate_midi(spec) == midi_bytes
+    assert generate_midi(SyntheticSpec(notes=301, tracks=3, drum_notes=50, seed=8)) != midi_bytes
+    midi = ParsedScore.from_bytes(midi_bytes).midi
+    assert [len(instrument.notes) for instrument in midi.instruments if not instrument.is_drum] == [101, 100, 100]
+    assert [len(instrument.notes) for instrument in midi.instruments if instrument.is_drum] == [50]
+    assert len(midi.tempo_changes) == 4
+    assert len(midi.time_signature_changes) == 2
+
+
+def test_compare_flags_regressions_above_tolerance():
+    def report(seconds, memory, error=None):
+        result = {"case": "tokenize:REMI", "size": "small", "median_seconds": seconds, "peak_memory_bytes": memory}
+        return {"results": [{**result, "error": error}]}
+
+    assert compare(report(1.0, 1000), report(1.2, 1200), tolerance=0.25) == []
+    [regression] = compare(report(1.0, 1000), report(1.3, 1000), tolerance=0.25)
+    assert (regression.measure, regression.baseline, regression.current) == ("median_seconds", 1.0, 1.3)
+    assert compare(report(1.0, 1000), report(0.0, 0, error="failed"), tolerance=0.25) == []
+
+
+def test_measure_imports():
+    imports = measure_imports("json")
+    assert imports[-1].module == "json" and imports[-1].depth == 0
+    assert imports[-1].cumulative_seconds >= imports[-1].self_seconds >= 0
+
+
+def test_note_tables_serialize_like_legacy_notes():
+    midi = ParsedScore.from_bytes(generate_midi(SyntheticSpec(notes=200, tracks=2, drum_notes=20))).midi
+    assert serialize_note_tables(midi_to_notes(midi)) == legacy_serialize(legacy_midi_to_notes(midi))
+
+
+def test_load_scenario_runs_in_process(tmp_path):
+    from core.api.api import app
+
+    scenario_path = tmp_path / "scenario.json"
+    scenario_path.write_text(
+        json.dumps(
+            {
+                "duration": 0.5,
+                "concurrency": 2,
+                "files": [{"synthetic": {"notes": 50, "tracks": 1}}],
+                "configs": [{"config": {"tokenizer": "TSD"}}, {"preset": "unknown", "weight": 0.5}],
+            }
+        )
+    )
+    scenario = load_scenario(str(scenario_path))
+    records, samples, seconds = asyncio.run(run_load(scenario, in_process_clients(app), os.getpid(), 0.1))
+
+    summary = summarize(records, seconds)
+    assert summary["requests"] == len(records) > 0 and seconds >= 0.5
+    assert set(summary["statuses"]) <= {"200", "404"}
+    assert {record.config for record in records if record.ok} <= {"0:TSD"}
+    assert samples and samples[0].server_bytes > 0
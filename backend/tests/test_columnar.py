@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from core.api.model import ConfigModel
+from core.constants import EXAMPLE_MIDI_FILE_PATH
+from core.service.columnar import decode_columnar_tokens, serialize_columnar_tokens_and_notes
+from core.service.midi_processing import tokenize_midi_file
+from core.service.parsed_score import ParsedScore
+from core.service.serializer import serialize_tokens_and_notes
+from tests.test_api import TEST_CONFIG, client
+
+
+@pytest.mark.parametrize(
+    "tokenizer", ["REMI", "REMIPlus", "MIDILike", "TSD", "Structured", "CPWord", "Octuple", "MMM"]
+)
+def test_columnar_tokens_decode_to_row_format(tokenizer):
+    score = ParsedScore.from_file(EXAMPLE_MIDI_FILE_PATH)
+    tokens, notes, links = tokenize_midi_file(ConfigModel(**{**TEST_CONFIG, "tokenizer": tokenizer}), score)
+    rows = json.loads(serialize_tokens_and_notes(tokens, notes, links))
+    columnar = serialize_columnar_tokens_and_notes(tokens, notes, links)
+    data = json.loads(columnar)
+
+    assert data["format"] == "columnar"
+    assert decode_columnar_tokens(data) == rows["tokens"]
+    assert data["notes"] == rows["notes"]
+    if rows["note_tokens"] is None:
+        assert data["note_tokens"] is None
+    else:
+        assert [
+            [None if first < 0 else [first, end] for first, end in zip(spans["first_token"], spans["end_token"])]
+            for spans in data["note_tokens"]
+        ] == rows["note_tokens"]
+    assert len(columnar) < len(serialize_tokens_and_notes(tokens, notes, links))
+
+
+@pytest.mark.parametrize(
+    "params, headers",
+    [
+        ({"format": "columnar"}, {}),
+        ({}, {"Accept": "application/vnd.miditok.columnar+json, application/json;q=0.9"}),
+    ],
+)
+def test_process_file_columnar(params, headers):
+    with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+        form_data = {"file": ("example.mid", file, "audio/midi")}
+        response = client.post(
+            "/process", files=form_data, data={"config": json.dumps(TEST_CONFIG)}, params=params, headers=headers
+        )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.miditok.columnar+json"
+    content = response.json()
+    assert content["success"]
+    assert content["data"]["format"] == "columnar"
+    assert decode_columnar_tokens(content["data"])
+    assert content["data"]["metrics"]
+
+
+def test_process_file_unknown_format():
+    with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+        form_data = {"file": ("example.mid", file, "audio/midi")}
+        response = client.post(
+            "/process", files=form_data, data={"config": json.dumps(TEST_CONFIG)}, params={"format": "xml"}
+        )
+    assert response.status_code == 400
+    assert not response.json()["success"]
@@ -0,0 +1,84 @@
+import os
+import shutil
+
+import pytest
+
+from core.api.model import ConfigModel
+from core.constants import EXAMPLE_MIDI_FILE_PATH
+from core.service.corpus import (
+    CorpusResult,
+    CorpusStore,
+    CorpusStoreError,
+    find_midi_files,
+    process_corpus_file,
+    run_corpus,
+)
+from tests.test_api import TEST_CONFIG
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    root = tmp_path / "corpus"
+    (root / "b").mkdir(parents=True)
+    shutil.copy(EXAMPLE_MIDI_FILE_PATH, root / "a.mid")
+    shutil.copy(EXAMPLE_MIDI_FILE_PATH, root / "b" / "c.MIDI")
+    (root / "b" / "broken.mid").write_bytes(b"not a midi file")
+    (root / "notes.txt").write_text("not a midi file either")
+    return str(root)
+
+
+def crash_on_broken_file(user_config: ConfigModel, root: str, path: str) -> CorpusResult:
+    # Kills its worker process on the broken file, as a crash in a parser would
+    if path == "b/broken.mid":
+        os._exit(1)
+    return process_corpus_file(user_config, root, path)
+
+
+@pytest.mark.parametrize("tokenizer", ["REMI", "Octuple"])
+def test_process_corpus_file(corpus, tokenizer):
+    user_config = ConfigModel(**{**TEST_CONFIG, "tokenizer": tokenizer})
+    result = process_corpus_file(user_config, corpus, "a.mid")
+    assert result.error is None
+
+    store = CorpusStore(f"{corpus}-store", user_config)
+    store.append(result)
+    store.flush()
+    record = store.read("a.mid")
+    assert record["metrics"]["resolution"] > 0
+    notes = record["notes"][0]
+    assert len(notes) > 0 and (notes.end >= notes.start).all()
+    # Compound tokens keep one row per token
+    assert record["tokens"][0].ndim == (2 if tokenizer == "Octuple" else 1) and len(record["tokens"][0]) > 0
+
+
+def test_corpus_store_resumes(tmp_path, corpus):
+    user_config = ConfigModel(**TEST_CONFIG)
+    assert find_midi_files(corpus) == ["a.mid", "b/broken.mid", "b/c.MIDI"]
+
+    store = CorpusStore(str(tmp_path / "store"), user_config, chunk_files=2)
+    store.append(process_corpus_file(user_config, corpus, "a.mid"))
+    store.append(CorpusResult("b/broken.mid", error="EOFError"))
+    # Still pending when the run is interrupted: lost, and processed by the next run
+    store.append(process_corpus_file(user_config, corpus, "b/c.MIDI"))
+
+    store = CorpusStore(str(tmp_path / "store"), user_config)
+    assert "a.mid" in store and "b/broken.mid" in store and "b/c.MIDI" not in store
+    assert store.manifest.failed == {"b/broken.mid": "EOFError"}
+
+    stats = run_corpus(corpus, store, user_config, workers=1)
+    assert (stats.files, stats.skipped, stats.processed, stats.failed) == (3, 2, 1, 0)
+    records = list(CorpusStore(str(tmp_path / "store"), user_config).records())
+    assert [record["path"] for record in records] == ["a.mid", "b/c.MIDI"]
+    assert records[0]["tokens"][0].tolist() == records[1]["tokens"][0].tolist()
+
+    with pytest.raises(CorpusStoreError):
+        CorpusStore(str(tmp_path / "store"), ConfigModel(**{**TEST_CONFIG, "tokenizer": "TSD"}))
+
+
+def test_run_corpus_only_fails_the_file_killing_a_worker(tmp_path, corpus):
+    user_config = ConfigModel(**TEST_CONFIG)
+    store = CorpusStore(str(tmp_path / "store"), user_config)
+    stats = run_corpus(corpus, store, user_config, workers=2, process_file=crash_on_broken_file)
+    assert (stats.processed, stats.failed) == (2, 1)
+    assert store.manifest.failed == {"b/broken.mid": "A worker process died"}
+    assert [record["path"] for record in store.records()] == ["a.mid", "b/c.MIDI"]
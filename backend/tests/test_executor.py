@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+
+from core.service.executor import ExecutorQueueFullError, ExecutorTimeoutError, ProcessingExecutor
+
+
+def square(value: int) -> int:
+    return value * value
+
+
+def sleep_for(seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
+
+
+@pytest.mark.parametrize("backend", ["inline", "thread", "process"])
+def test_run(backend):
+    executor = ProcessingExecutor(backend, workers=1, max_queue=1, timeout=30.0)
+
+    async def run():
+        return await executor.run(square, 7)
+
+    try:
+        assert asyncio.run(run()) == 49
+    finally:
+        executor.shutdown()
+    stats = executor.stats()
+    assert (stats.submitted, stats.completed, stats.running, stats.queued) == (1, 1, 0, 0)
+
+
+def test_run_rejects_when_queue_is_full():
+    executor = ProcessingExecutor("thread", workers=1, max_queue=1, timeout=5.0)
+
+    async def run():
+        jobs = [asyncio.ensure_future(executor.run(sleep_for, 0.2)) for _ in range(3)]
+        return await asyncio.gather(*jobs, return_exceptions=True)
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        executor.shutdown()
+    assert results[:2] == [0.2, 0.2]
+    assert isinstance(results[2], ExecutorQueueFullError)
+    stats = executor.stats()
+    assert stats.rejected == 1
+    assert stats.max_queued == 1
+    assert stats.max_wait_time > 0.1
+
+
+def test_run_times_out():
+    executor = ProcessingExecutor("thread", workers=1, max_queue=0, timeout=0.05)
+
+    async def run():
+        return await executor.run(sleep_for, 0.3)
+
+    try:
+        with pytest.raises(ExecutorTimeoutError):
+            asyncio.run(run())
+    finally:
+        executor.shutdown()
+    assert executor.stats().timed_out == 1
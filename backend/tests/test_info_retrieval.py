@@ -1,19 +1,18 @@
-import muspy
-
 from core.constants import EXAMPLE_MIDI_FILE_PATH
 from core.service.midi_processing import retrieve_basic_data, retrieve_information_from_midi, retrieve_metrics
+from core.service.parsed_score import ParsedScore
 
 
 def test_retrieve_basic_info():
-    music_file = muspy.read(EXAMPLE_MIDI_FILE_PATH)
-    basic_info_data = retrieve_basic_data(music_file)
+    score = ParsedScore.from_file(EXAMPLE_MIDI_FILE_PATH)
+    basic_info_data = retrieve_basic_data(score)
     assert basic_info_data
     print(basic_info_data)
 
 
 def test_retrieve_metrics():
-    music_file = muspy.read(EXAMPLE_MIDI_FILE_PATH)
-    metrics = retrieve_metrics(music_file)
+    score = ParsedScore.from_file(EXAMPLE_MIDI_FILE_PATH)
+    metrics = retrieve_metrics(score)
     assert metrics
     print(metrics)
 
@@ -22,6 +21,6 @@ def test_retrieve_info():
     music_obj = open(EXAMPLE_MIDI_FILE_PATH, "rb")
     music_obj_bytes: bytes = music_obj.read()
 
-    music = retrieve_information_from_midi(music_obj_bytes)
+    music = retrieve_information_from_midi(ParsedScore.from_bytes(music_obj_bytes))
     assert music
     print(music)
@@ -0,0 +1,152 @@
+import asyncio
+import json
+from typing import Any, Dict, List
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.synthetic import SIZES, generate_midi
+from core.api.api import app
+from core.api.model import ConfigModel
+from core.constants import EXAMPLE_MIDI_FILE_PATH
+from core.service.jobs import JobStore
+from core.service.midi_processing import get_tokenizer, process_midi_file
+from core.service.result_cache import result_cache
+from core.service.timing import StageTimer
+from tests.test_api import TEST_CONFIG
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_stage_timer_listener():
+    events: List[Dict[str, Any]] = []
+    timer = StageTimer(events.append)
+    with timer.stage("tokenize"):
+        timer.progress("tokenize", tracks_done=1, tracks=2)
+    assert [event["status"] for event in events] == ["started", "progress", "finished"]
+    assert events[1] == {"stage": "tokenize", "status": "progress", "tracks_done": 1, "tracks": 2}
+    assert events[2]["seconds"] == timer.summed()["tokenize"]
+
+
+@pytest.mark.parametrize("tokenizer", ["REMI", "Octuple"])
+def test_process_midi_file_reports_track_progress(tokenizer):
+    with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+        midi_bytes = file.read()
+    events: List[Dict[str, Any]] = []
+    process_midi_file(ConfigModel(**{**TEST_CONFIG, "tokenizer": tokenizer}), midi_bytes, progress=events.append)
+    tokenize_progress = [event for event in events if event["stage"] == "tokenize" and event["status"] == "progress"]
+    tracks = tokenize_progress[0]["tracks"]
+    assert [event["tracks_done"] for event in tokenize_progress] == list(range(1, tracks + 1))
+    assert [event["stage"] for event in events if event["status"] == "finished"][0] == "parse"
+
+
+@pytest.mark.parametrize("tokenizer", ["REMI", "REMIPlus"])
+def test_track_progress_of_several_tracks(tokenizer):
+    config = ConfigModel(**{**TEST_CONFIG, "tokenizer": tokenizer})
+    events: List[Dict[str, Any]] = []
+    result = process_midi_file(config, generate_midi(SIZES["small"]), progress=events.append)
+    tokenize_progress = [event for event in events if event["stage"] == "tokenize" and event["status"] == "progress"]
+    tracks = tokenize_progress[-1]["tracks"]
+    # Single stream tokenizers report their tracks once they are all done
+    expected = [tracks] if tokenizer == "REMIPlus" else list(range(1, tracks + 1))
+    assert tracks > 1 and [event["tracks_done"] for event in tokenize_progress] == expected
+    # The same tokens as without a listener, and the shared tokenizer is left as it was
+    assert result.tokens_and_notes == process_midi_file(config, generate_midi(SIZES["small"])).tokens_and_notes
+    assert not vars(get_tokenizer(config).tokenizer).keys() & {"_midi_to_tokens", "_create_track_events"}
+
+
+@pytest.mark.asyncio
+async def test_job_progress_and_result():
+    store = JobStore(max_pending=4, concurrency=1, ttl=60, max_bytes=1024, processes=False)
+    job = store.create()
+    assert job is not None
+    job.start()
+    job.apply({"stage": "tokenize", "status": "started"})
+    job.apply({"stage": "tokenize", "status": "progress", "tracks_done": 1, "tracks": 3})
+    assert job.summary()["stages"] == [
+        {"stage": "tokenize", "status": "running", "seconds": 0.0, "tracks_done": 1, "tracks": 3}
+    ]
+
+    version = job.version
+    waiter = asyncio.ensure_future(job.wait_for_change(version, 1))
+    job.finish(b"result", "application/json", {"tokenize": 0.5, "total": 1.0}, 0.0)
+    assert await waiter
+    assert not await job.wait_for_change(job.version, 0.01)
+    assert job.summary()["status"] == "done"
+    assert job.stages["tokenize"] == {
+        "stage": "tokenize",
+        "status": "done",
+        "seconds": 0.5,
+        "tracks_done": 1,
+        "tracks": 3,
+    }
+    assert job.server_timing == "tokenize;dur=500.00, total;dur=1000.00"
+
+    # Late events from the worker don't change a finished job
+    job.apply({"stage": "metrics", "status": "started"})
+    assert "metrics" not in job.stages
+
+
+@pytest.mark.asyncio
+async def test_job_store_limits():
+    clock = FakeClock()
+    store = JobStore(max_pending=2, concurrency=1, ttl=10, max_bytes=10, processes=False, clock=clock)
+    first, second = store.create(), store.create()
+    assert first is not None and second is not None
+    assert store.create() is None
+
+    first.finish(b"x" * 6, "application/json", {}, clock())
+    store.finished(first)
+    second.finish(b"y" * 6, "application/json", {}, clock())
+    store.finished(second)
+    # Over max_bytes: the job that finished first is evicted
+    assert store.get(first.job_id) is None and store.get(second.job_id) is second
+
+    third = store.create()
+    assert third is not None
+    third.fail("Processing took too long", 504, clock())
+    store.finished(third)
+    clock.now = 10
+    assert store.get(second.job_id) is None and store.get(third.job_id) is None
+    stats = store.stats()
+    assert (stats.jobs, stats.bytes, stats.rejected, stats.evicted, stats.expired) == (0, 0, 1, 1, 2)
+
+
+def test_jobs_api():
+    with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+        midi_bytes = file.read()
+    form_data = {"file": ("example.mid", midi_bytes, "audio/midi")}
+    result_cache.clear()
+    with TestClient(app) as client:
+        response = client.post("/jobs", files=form_data, data={"config": json.dumps(TEST_CONFIG)})
+        assert response.status_code == 202
+        job_id = response.json()["data"]["job_id"]
+        assert response.headers["Location"] == f"/jobs/{job_id}"
+
+        events: List[str] = []
+        with client.stream("GET", f"/jobs/{job_id}/events") as stream:
+            assert stream.headers["content-type"].startswith("text/event-stream")
+            for line in stream.iter_lines():
+                if line.startswith("event: "):
+                    events.append(line[len("event: ") :])
+        assert events[-1] == "done" and set(events[:-1]) <= {"progress"}
+
+        summary = client.get(f"/jobs/{job_id}").json()["data"]
+        assert summary["status"] == "done"
+        stages = {stage["stage"]: stage for stage in summary["stages"]}
+        assert {"read", "cache", "wait", "parse", "tokenize", "metrics", "serialize"} <= set(stages)
+        assert all(stage["status"] == "done" for stage in stages.values())
+
+        result = client.get(f"/jobs/{job_id}/result")
+        processed = client.post("/process", files=form_data, data={"config": json.dumps(TEST_CONFIG)})
+        assert result.status_code == 200 and result.content == processed.content
+        assert "total" in result.headers["Server-Timing"]
+
+        assert client.get("/jobs/unknown").status_code == 404
+        assert client.get("/stats").json()["data"]["jobs"]["created"] >= 1
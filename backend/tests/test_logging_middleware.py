@@ -0,0 +1,89 @@
+import logging
+from typing import Any, List
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from core.api.logging_middleware import LoggingMiddleware, QueueLogging
+
+
+class ListHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        # LogRecords, with the middleware's dict as their msg
+        self.records: List[Any] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+
+
+def create_app(logger: logging.Logger) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(LoggingMiddleware, logger=logger)
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for index in range(3):
+                yield f"chunk {index}\n".encode()
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    @app.get("/fail")
+    async def fail():
+        raise RuntimeError("boom")
+
+    return app
+
+
+def create_logger(name: str) -> ListHandler:
+    handler = ListHandler()
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return handler
+
+
+def test_streamed_response_passes_through_and_is_logged():
+    handler = create_logger("tests.logging_middleware.stream")
+    client = TestClient(create_app(logging.getLogger("tests.logging_middleware.stream")))
+
+    response = client.get("/stream?format=json")
+
+    assert response.status_code == 200
+    assert response.text == "chunk 0\nchunk 1\nchunk 2\n"
+    request_id = response.headers["X-API-Request-ID"]
+    [record] = handler.records
+    assert record.msg["X-API-REQUEST-ID"] == request_id
+    assert record.msg["request"]["path"] == "/stream?format=json"
+    assert record.msg["response"]["status_code"] == 200
+    assert record.msg["response"]["status"] == "successful"
+
+
+def test_unhandled_error_is_logged_as_failed():
+    handler = create_logger("tests.logging_middleware.fail")
+    client = TestClient(create_app(logging.getLogger("tests.logging_middleware.fail")), raise_server_exceptions=False)
+
+    response = client.get("/fail")
+
+    assert response.status_code == 500
+    exception_record, record = handler.records
+    assert exception_record.levelno == logging.ERROR
+    assert record.msg["response"]["status_code"] == 500
+    assert record.msg["response"]["status"] == "failed"
+
+
+def test_queue_logging_writes_through_the_original_handlers():
+    handler = create_logger("tests.logging_middleware.queue")
+    logger = logging.getLogger("tests.logging_middleware.queue")
+    queue_logging = QueueLogging([logger.name])
+
+    queue_logging.start()
+    assert logger.handlers != [handler]
+    logger.info("queued")
+    queue_logging.stop()
+
+    assert logger.handlers == [handler]
+    assert [record.getMessage() for record in handler.records] == ["queued"]
@@ -0,0 +1,90 @@
+import json
+
+import numpy as np
+import pytest
+
+from core.api.model import ConfigModel
+from core.constants import EXAMPLE_MIDI_FILE_PATH
+from core.service.columnar import decode_packed_tokens, serialize_packed_tokens_and_notes
+from core.service.message_pack import MessagePackError, packb, unpack_array, unpackb
+from core.service.midi_processing import tokenize_midi_file
+from core.service.parsed_score import ParsedScore
+from core.service.serializer import serialize_tokens_and_notes
+from tests.test_api import TEST_CONFIG, client
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        None,
+        True,
+        False,
+        0,
+        127,
+        -32,
+        -33,
+        255,
+        65536,
+        2**40,
+        -(2**40),
+        0.5,
+        "",
+        "é" * 40,
+        "x" * 70000,
+        b"\x00\x01",
+        list(range(20)),
+        {"a": [1, {"b": None}], "c": 2.0},
+        {str(index): index for index in range(20)},
+    ],
+)
+def test_pack_round_trip(value):
+    assert unpackb(packb(value)) == value
+
+
+def test_pack_numpy_values():
+    array = np.array([1, -2, 2**31 - 1], dtype=">i4")
+    packed = unpackb(packb({"array": array, "scalar": np.int8(3), "flag": np.bool_(True)}))
+
+    assert packed["array"]["dtype"] == "int32"
+    assert unpack_array(packed["array"]).tolist() == [1, -2, 2**31 - 1]
+    assert (packed["scalar"], packed["flag"]) == (3, True)
+
+
+def test_unpack_rejects_truncated_data():
+    with pytest.raises(MessagePackError):
+        unpackb(packb("hello")[:-1])
+
+
+@pytest.mark.parametrize("tokenizer", ["REMI", "REMIPlus", "Structured", "CPWord", "Octuple", "MMM"])
+def test_packed_tokens_decode_to_row_format(tokenizer):
+    score = ParsedScore.from_file(EXAMPLE_MIDI_FILE_PATH)
+    tokens, notes, links = tokenize_midi_file(ConfigModel(**{**TEST_CONFIG, "tokenizer": tokenizer}), score)
+    rows = json.loads(serialize_tokens_and_notes(tokens, notes, links))
+    data = unpackb(serialize_packed_tokens_and_notes(tokens, notes, links))
+
+    assert data["format"] == "msgpack"
+    assert decode_packed_tokens(data) == rows["tokens"]
+    for packed_notes, track_notes in zip(data["notes"], rows["notes"]):
+        assert packed_notes["length"] == len(track_notes)
+        assert unpack_array(packed_notes["pitch"]).tolist() == [note["pitch"] for note in track_notes]
+        assert unpack_array(packed_notes["end"]).tolist() == [note["end"] for note in track_notes]
+    if links is not None:
+        for packed_spans, note_tokens in zip(data["note_tokens"], links.note_tokens):
+            assert unpack_array(packed_spans["first_token"]).tolist() == note_tokens[:, 0].tolist()
+
+
+def test_process_file_msgpack():
+    with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+        form_data = {"file": ("example.mid", file, "audio/midi")}
+        response = client.post(
+            "/process",
+            files=form_data,
+            data={"config": json.dumps(TEST_CONFIG)},
+            headers={"Accept": "application/x-msgpack"},
+        )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-msgpack"
+    content = unpackb(response.content)
+    assert content["success"] and content["error"] is None
+    assert decode_packed_tokens(content["data"])
+    assert content["data"]["metrics"]["title"] is not None
@@ -0,0 +1,74 @@
+import math
+import os
+
+import muspy
+import numpy as np
+import pytest
+
+from core.constants import EXAMPLE_MIDI_FILE_PATH
+from core.service.metrics import MetricsEngine
+from core.service.parsed_score import ParsedScore
+
+EXAMPLE_FILES_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "example_files")
+MIDI_PATHS = [EXAMPLE_MIDI_FILE_PATH] + sorted(
+    os.path.join(EXAMPLE_FILES_DIR, name) for name in os.listdir(EXAMPLE_FILES_DIR) if name.endswith(".mid")
+)
+
+
+def assert_same(value: float, expected: float) -> None:
+    if math.isnan(expected):
+        assert math.isnan(value)
+    else:
+        assert value == pytest.approx(expected, rel=1e-9, abs=1e-12)
+
+
+@pytest.mark.parametrize("path", MIDI_PATHS, ids=os.path.basename)
+def test_metrics_match_muspy(path):
+    music = ParsedScore.from_file(path).music
+    engine = MetricsEngine.from_music(music)
+
+    assert engine.pitch_range() == muspy.pitch_range(music)
+    assert engine.n_pitches_used() == muspy.n_pitches_used(music)
+    assert_same(engine.polyphony(), muspy.polyphony(music))
+    assert_same(engine.empty_beat_rate(), muspy.empty_beat_rate(music))
+    assert_same(engine.drum_pattern_consistency(), muspy.drum_pattern_consistency(music))
+    assert_same(engine.pitch_class_entropy(), muspy.pitch_class_entropy(music))
+    assert_same(engine.scale_consistency(), muspy.scale_consistency(music))
+    assert_same(engine.groove_consistency(), muspy.groove_consistency(music, engine.measure_resolution))
+
+
+def test_metrics_match_muspy_on_overlapping_and_drum_notes():
+    # Same pitch overlapping across tracks, zero length notes, drums and a control change past the last note
+    piano = muspy.Track(program=0, notes=[muspy.Note(0, 60, 480, 64), muspy.Note(240, 60, 480, 64)])
+    piano.notes += [muspy.Note(960, 64, 0, 64), muspy.Note(1000, 67, 100, 90)]
+    strings = muspy.Track(program=48, notes=[muspy.Note(100, 60, 200, 70), muspy.Note(1920, 40, 960, 30)])
+    drums = muspy.Track(is_drum=True, notes=[muspy.Note(time, 36, 10, 100) for time in (0, 160, 240, 480, 500)])
+    drums.annotations.append(muspy.Annotation(5000, {"number": 64, "value": 0}, group="control_change"))
+    music = muspy.Music(resolution=480, tracks=[piano, strings, drums])
+    engine = MetricsEngine.from_music(music)
+
+    assert engine.length == max(track.get_end_time() for track in music.tracks)
+    assert engine.pitch_range() == muspy.pitch_range(music)
+    assert engine.n_pitches_used() == muspy.n_pitches_used(music)
+    assert_same(engine.polyphony(), muspy.polyphony(music))
+    assert_same(engine.empty_beat_rate(), muspy.empty_beat_rate(music))
+    assert_same(engine.drum_pattern_consistency(), muspy.drum_pattern_consistency(music))
+    assert_same(engine.groove_consistency(), muspy.groove_consistency(music, 1920))
+
+
+def test_metrics_of_an_empty_score_are_zero():
+    metrics = MetricsEngine.from_music(muspy.Music(resolution=480, tracks=[muspy.Track()])).metrics()
+
+    assert metrics.pitch_range == 0
+    assert metrics.n_pitches_used == 0
+    assert all(value == 0.0 for value in (metrics.polyphony, metrics.empty_beat_rate, metrics.groove_consistency))
+
+
+def test_note_array_holds_every_note():
+    music = ParsedScore.from_file(EXAMPLE_MIDI_FILE_PATH).music
+    engine = MetricsEngine.from_music(music)
+
+    assert len(engine.notes) == sum(len(track.notes) for track in music.tracks)
+    first = music.tracks[0].notes[0]
+    assert engine.notes[0].tolist() == (first.pitch, first.time, first.end, first.velocity, 0, music.tracks[0].is_drum)
+    assert np.all(engine.notes["end"] >= engine.notes["start"])
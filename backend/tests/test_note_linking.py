@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+from miditok import Event, TokSequence
+from miditoolkit import Instrument, MidiFile, Note
+
+from core.api.model import ConfigModel
+from core.constants import EXAMPLE_MIDI_FILE_PATH
+from core.service.midi_processing import tokenize_midi_file
+from core.service.parsed_score import ParsedScore
+from core.service.tokenizers.note_linking import NoteLinkRule, link_notes, note_token_spans
+from tests.test_api import TEST_CONFIG
+
+REMI_RULE = NoteLinkRule(note_types=("Pitch",), follower_types=("Velocity", "Duration"))
+MIDILIKE_RULE = NoteLinkRule(note_types=("NoteOn",), follower_types=("Velocity",), end_types=("NoteOff",))
+
+
+def midi_with_notes(notes):
+    midi = MidiFile()
+    instrument = Instrument(0)
+    instrument.notes = [Note(100, pitch, start, end) for start, end, pitch in notes]
+    midi.instruments.append(instrument)
+    return midi
+
+
+@pytest.mark.parametrize("tokenizer", ["REMI", "MIDILike", "TSD", "Structured", "CPWord", "Octuple"])
+def test_tokens_link_to_their_notes(tokenizer):
+    score = ParsedScore.from_file(EXAMPLE_MIDI_FILE_PATH)
+    tokens, notes, links = tokenize_midi_file(ConfigModel(**{**TEST_CONFIG, "tokenizer": tokenizer}), score)
+
+    assert links is not None and len(links.token_notes) == len(notes)
+    for sequence, track_notes, token_notes, note_tokens in zip(tokens, notes, links.token_notes, links.note_tokens):
+        assert len(token_notes) == len(sequence.events)
+        # Every note starts exactly one token (or compound token) with its start and pitch
+        heads = {}
+        for index, event in enumerate(sequence.events):
+            pitch = next((sub for sub in event if sub.type == "Pitch"), None) if isinstance(event, list) else event
+            if pitch is not None and pitch.type in ("Pitch", "NoteOn"):
+                note_index = token_notes[index]
+                assert (track_notes.start[note_index], track_notes.pitch[note_index]) == (pitch.time, pitch.value)
+                heads[int(token_notes[index])] = index
+        assert sorted(heads) == list(range(len(track_notes)))
+        for note_index, (first, end) in enumerate(note_tokens.tolist()):
+            assert first == heads[note_index]
+            assert set(token_notes[first:end].tolist()) >= {note_index}
+            assert token_notes[end - 1] == note_index
+
+
+def test_followers_and_note_off_link_to_the_right_note():
+    midi = midi_with_notes([(0, 8, 60), (0, 4, 64)])
+    events = [
+        Event("NoteOn", 60, 0),
+        Event("Velocity", 100, 0),
+        Event("NoteOn", 64, 0),
+        Event("Velocity", 100, 0),
+        Event("TimeShift", "0.4.8", 0),
+        Event("NoteOff", 64, 4),
+        Event("Velocity", 100, 4),
+        Event("NoteOff", 60, 8),
+    ]
+    links = link_notes([TokSequence(events=events)], midi, MIDILIKE_RULE)
+    assert links is not None
+
+    assert links.token_notes[0].tolist() == [0, 0, 1, 1, -1, 1, -1, 0]
+    assert note_token_spans(links.note_tokens[0]) == [[0, 8], [2, 6]]
+
+
+def test_notes_sharing_time_and_pitch_are_told_apart():
+    midi = midi_with_notes([(0, 4, 60), (0, 8, 60), (4, 8, 62)])
+    events = [
+        Event("Bar", None, 0),
+        Event("Pitch", 60, 0),
+        Event("Duration", "0.4.8", 0),
+        Event("Pitch", 60, 0),
+        Event("Duration", "1.0.8", 0),
+        Event("Pitch", 61, 4),
+    ]
+    links = link_notes([TokSequence(events=events)], midi, REMI_RULE)
+    assert links is not None
+
+    assert links.token_notes[0].tolist() == [-1, 0, 0, 1, 1, -1]
+    assert note_token_spans(links.note_tokens[0]) == [[1, 3], [3, 5], None]
+
+
+def test_no_links_without_rule_or_per_track_streams():
+    midi = midi_with_notes([(0, 4, 60)])
+    sequence = TokSequence(events=[Event("Pitch", 60, 0)])
+    assert link_notes([sequence], midi, None) is None
+    assert link_notes(sequence, midi, REMI_RULE) is None
+    empty_sequence = link_notes([TokSequence(events=[])], midi, REMI_RULE)
+    assert empty_sequence is not None and empty_sequence.note_tokens[0].tolist() == [[-1, -1]]
+    no_notes = link_notes([sequence], midi_with_notes([]), REMI_RULE)
+    assert no_notes is not None and no_notes.token_notes[0].dtype == np.int32
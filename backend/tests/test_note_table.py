@@ -0,0 +1,20 @@
+import json
+
+from miditoolkit import Note
+
+from core.service.note_table import NOTE_NAMES, NoteTable, pitch_to_name, serialize_note_tables
+
+
+def test_note_names():
+    assert len(NOTE_NAMES) == 128
+    assert (pitch_to_name(0), pitch_to_name(60), pitch_to_name(61), pitch_to_name(127)) == ("C-1", "C4", "C#4", "G9")
+
+
+def test_note_table_json_matches_rows():
+    table = NoteTable.from_notes([Note(100, 60, 0, 480), Note(1, 127, 480, 2**40), Note(0, 0, 5, 5)])
+    assert table.pitch.dtype.itemsize == table.velocity.dtype.itemsize == 1
+    rows = table.rows()
+    assert rows[0] == {"pitch": 60, "name": "C4", "start": 0, "end": 480, "velocity": 100}
+    assert json.loads(table.to_json()) == rows
+    assert [json.loads(document) for document in table.documents()] == rows
+    assert json.loads(serialize_note_tables([table, NoteTable.empty()])) == [rows, []]
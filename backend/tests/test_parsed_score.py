@@ -0,0 +1,50 @@
+import os
+from io import BytesIO
+
+import muspy
+import pytest
+from miditok import REMI, TokenizerConfig
+from miditoolkit import MidiFile
+from mido import MidiFile as MidoMidiFile
+
+from core.constants import DEFAULT_TOKENIZER_PARAMS, EXAMPLE_MIDI_FILE_PATH, ROOT_DIR
+from core.service.parsed_score import ParsedScore
+
+EXAMPLE_FILES_DIR = os.path.join(ROOT_DIR, "..", "..", "example_files")
+MIDI_FILE_PATHS = [EXAMPLE_MIDI_FILE_PATH] + [
+    os.path.join(EXAMPLE_FILES_DIR, name) for name in ["bethlem2.mid", "test.mid", "test2.mid"]
+]
+
+
+def read_bytes(path: str) -> bytes:
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def dump_midi(midi: MidiFile) -> str:
+    return "\n".join(
+        [str(midi.ticks_per_beat), str(midi.max_tick), str(midi.tempo_changes), str(midi.time_signature_changes)]
+        + [str(midi.key_signature_changes), str(midi.markers), str(midi.lyrics)]
+        + [f"{instrument} {instrument.notes} {instrument.control_changes}" for instrument in midi.instruments]
+    )
+
+
+@pytest.mark.parametrize("path", MIDI_FILE_PATHS)
+def test_from_bytes_matches_separate_parsers(path):
+    midi_bytes = read_bytes(path)
+    score = ParsedScore.from_bytes(midi_bytes)
+
+    assert dump_midi(score.midi) == dump_midi(MidiFile(file=BytesIO(midi_bytes)))
+    assert score.music == muspy.from_mido(MidoMidiFile(file=BytesIO(midi_bytes)))
+
+
+@pytest.mark.parametrize("path", MIDI_FILE_PATHS)
+def test_copy_midi_is_independent(path):
+    score = ParsedScore.from_bytes(read_bytes(path))
+    original = dump_midi(score.midi)
+
+    tokenizer = REMI(TokenizerConfig(**DEFAULT_TOKENIZER_PARAMS))
+    tokens = tokenizer(score.copy_midi())
+
+    assert dump_midi(score.midi) == original
+    assert [seq.ids for seq in tokens] == [seq.ids for seq in tokenizer(MidiFile(path))]
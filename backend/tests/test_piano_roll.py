@@ -0,0 +1,87 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pytest
+from miditoolkit import Note
+
+from core.service.note_table import NoteTable
+from core.service.piano_roll import (
+    PianoRollTooLargeError,
+    build_piano_roll,
+    pack_piano_roll,
+    piano_roll_window,
+    unpack_piano_roll,
+)
+
+TRACK_NOTES = [
+    Note(80, 60, 0, 480),
+    Note(100, 62, 240, 1440),
+    Note(90, 60, 480, 960),
+    Note(50, 40, 1920, 1920),
+    Note(70, 61, 3000, 9000),
+]
+NOTES = [NoteTable.from_notes(TRACK_NOTES), NoteTable.empty()]
+
+
+def _brute_force_tiles(
+    notes: List[Note], time_step: int, pitch_step: int
+) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+    tiles: Dict[Tuple[int, int], Tuple[int, int]] = {}
+    for note in notes:
+        first, last = note.start // time_step, max(note.end - 1, note.start) // time_step
+        for time in range(first, last + 1):
+            key = (time * time_step, note.pitch // pitch_step * pitch_step)
+            count, velocity = tiles.get(key, (0, 0))
+            tiles[key] = (count + 1, max(velocity, note.velocity))
+    return sorted(tiles.items())
+
+
+def test_levels_match_brute_force():
+    piano_roll = build_piano_roll(NOTES, 480)
+    track = piano_roll["tracks"][0]
+    bounds = (track["notes"], track["min_pitch"], track["max_pitch"], track["start"], track["end"])
+    assert bounds == (5, 40, 62, 0, 9000)
+    assert track["levels"][-1]["time_step"] > 9000
+    for level in track["levels"]:
+        tiles = list(zip(level["start"].tolist(), level["pitch"].tolist()))
+        values = list(zip(level["count"].tolist(), level["max_velocity"].tolist()))
+        assert list(zip(tiles, values)) == _brute_force_tiles(TRACK_NOTES, level["time_step"], level["pitch_step"])
+
+
+def test_long_files_start_at_wider_tiles():
+    # A note as long as the file is a single run per pitch row, however many tiles it spans
+    notes = TRACK_NOTES + [Note(120, 60, 0, 480 * 100), Note(30, 60, 480 * 50, 480 * 60)]
+    piano_roll = build_piano_roll([NoteTable.from_notes(notes)], 480, max_tiles=16)
+    # 100 beats in at most 16 tiles: 8 beats wide tiles
+    assert piano_roll["base_step"] == 480 * 8
+    levels = piano_roll["tracks"][0]["levels"]
+    assert levels[0]["time_step"] == 480 * 8 and levels[-1]["time_step"] > 480 * 100
+    for level in levels:
+        tiles = list(zip(level["start"].tolist(), level["pitch"].tolist()))
+        values = list(zip(level["count"].tolist(), level["max_velocity"].tolist()))
+        assert list(zip(tiles, values)) == _brute_force_tiles(notes, level["time_step"], level["pitch_step"])
+
+    with pytest.raises(PianoRollTooLargeError):
+        build_piano_roll([NoteTable.from_notes([Note(80, 60, 0, 1 << 40)])], 1, max_tiles=16)
+    # Every pitch held for the whole file is over the tiles a level may have
+    held = [Note(80, pitch, 0, 480 * 16) for pitch in range(128)]
+    with pytest.raises(PianoRollTooLargeError):
+        build_piano_roll([NoteTable.from_notes(held)], 480, max_tiles=16)
+
+
+def test_empty_track_has_no_levels():
+    window = piano_roll_window(build_piano_roll(NOTES, 480), 1)
+    assert window["notes"] == 0 and window["levels"] == 0 and window["tiles"] is None
+
+
+def test_window_picks_level_and_range():
+    piano_roll = unpack_piano_roll(pack_piano_roll(build_piano_roll(NOTES, 480)))
+    assert isinstance(piano_roll["tracks"][0]["levels"][0]["start"], np.ndarray)
+    # 9000 ticks in at most 5 tiles: 480 * 4 = 1920 wide tiles
+    window = piano_roll_window(piano_roll, 0, width=5)
+    assert window["time_step"] == 1920 and window["level"] == 2
+    assert window["tiles"]["start"] == [0, 0, 1920, 1920, 3840, 5760, 7680]
+
+    window = piano_roll_window(piano_roll, 0, level_index=0, start_tick=500, end_tick=1000)
+    assert window["tiles"]["start"] == [480, 480, 960] and window["tiles"]["pitch"] == [60, 62, 62]
+    assert piano_roll_window(piano_roll, 0, level_index=99)["level"] == len(piano_roll["tracks"][0]["levels"]) - 1
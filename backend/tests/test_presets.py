@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from core.api.model import ConfigModel
+from core.constants import EXAMPLE_MIDI_FILE_PATH
+from core.service.presets import PresetStore, PresetStoreFullError, create_preset, read_presets_file
+from core.service.result_cache import result_cache
+from tests.test_api import TEST_CONFIG, client
+
+MIDI_HEADERS = {"Content-Type": "audio/midi"}
+
+
+def test_preset_store(tmp_path):
+    path = tmp_path / "presets.json"
+    path.write_text(json.dumps({"remi": TEST_CONFIG, "tsd": {**TEST_CONFIG, "tokenizer": "TSD"}}))
+    store = PresetStore(max_presets=2)
+    for preset in read_presets_file(str(path)):
+        store.add(preset)
+    assert [preset.preset_id for preset in store.list()] == ["remi", "tsd"]
+
+    # Ids of unnamed presets only depend on the config
+    preset = create_preset(ConfigModel(**TEST_CONFIG))
+    assert preset.preset_id == create_preset(ConfigModel(**TEST_CONFIG)).preset_id
+    remi = store.get("remi")
+    assert remi is not None and preset.config_key == remi.config_key
+    assert store.check(create_preset(ConfigModel(**TEST_CONFIG), "remi")) is remi
+    with pytest.raises(PresetStoreFullError):
+        store.check(preset)
+    with pytest.raises(PresetStoreFullError):
+        store.add(preset)
+    with pytest.raises(ValueError):
+        store.add(create_preset(ConfigModel(**TEST_CONFIG), "tsd"))
+    assert store.add(create_preset(ConfigModel(**TEST_CONFIG), "remi")) is store.get("remi")
+
+
+def test_process_with_preset():
+    config = {**TEST_CONFIG, "tokenizer": "TSD"}
+    response = client.post("/presets", json=config)
+    assert response.status_code == 201
+    preset_id = response.json()["data"]["id"]
+    assert response.headers["Location"] == f"/presets/{preset_id}"
+    assert client.post("/presets", json=config).json()["data"]["id"] == preset_id
+    assert client.get(f"/presets/{preset_id}").json()["data"]["config"] == config
+    assert preset_id in [preset["id"] for preset in client.get("/presets").json()["data"]]
+
+    with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+        midi_bytes = file.read()
+    form_data = {"file": ("example.mid", midi_bytes, "audio/midi")}
+    expected = client.post("/process", files=form_data, data={"config": json.dumps(config)})
+    # Processed again, with the pinned tokenizer
+    result_cache.clear()
+    response = client.post("/process", params={"preset": preset_id}, files=form_data)
+    assert response.status_code == 200
+    assert response.content == expected.content
+    # The file alone as the body
+    raw = client.post("/process", params={"preset": preset_id}, content=midi_bytes, headers=MIDI_HEADERS)
+    assert raw.status_code == 200
+    assert raw.content == expected.content
+    not_midi = client.post("/process", params={"preset": preset_id}, content=b"RIFF" * 10, headers=MIDI_HEADERS)
+    assert not_midi.status_code == 415
+    # A form without its file
+    assert client.post("/process", params={"preset": preset_id}, data={"format": "json"}).status_code == 422
+
+    assert client.post("/process", params={"preset": "unknown"}, files=form_data).status_code == 404
+    both = client.post("/process", params={"preset": preset_id}, files=form_data, data={"config": json.dumps(config)})
+    assert both.status_code == 422
+
+
+def test_rejected_presets_are_not_pinned(monkeypatch):
+    from core.api.api import processing_executor
+    from core.service.presets import preset_store
+
+    pinned = []
+
+    async def run(function, *args, **kwargs):
+        pinned.append(args)
+
+    monkeypatch.setattr(processing_executor, "run", run)
+    monkeypatch.setattr(preset_store, "max_presets", len(preset_store))
+    response = client.post("/presets", json={**TEST_CONFIG, "tokenizer": "Structured"})
+    assert response.status_code == 507
+    assert pinned == []
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+from typing import List, Tuple, Union
+
+import pytest
+
+from core.service.record_relay import RecordStream, StreamAbandonedError
+
+
+def start_worker(stream: RecordStream, records: int, timeout: float) -> Tuple[threading.Thread, List[Union[int, str]]]:
+    sink = stream.sink(timeout)
+    sent: List[Union[int, str]] = []
+
+    def work() -> None:
+        try:
+            for index in range(records):
+                sink(str(index).encode())
+                sent.append(index)
+            sink(None)
+        except StreamAbandonedError:
+            sent.append("abandoned")
+
+    worker = threading.Thread(target=work)
+    worker.start()
+    return worker, sent
+
+
+@pytest.mark.asyncio
+async def test_worker_waits_for_the_reader():
+    stream = RecordStream(asyncio.get_running_loop(), processes=False)
+    worker, sent = start_worker(stream, 10, timeout=0.2)
+    await asyncio.sleep(0.05)
+    # One record in the response's queue, one on the relay thread and one in the relay's queue
+    assert sent == [0, 1, 2]
+    assert await stream.records.get() == b"0"
+    assert await stream.records.get() == b"1"
+    await asyncio.sleep(0.05)
+    assert sent == [0, 1, 2, 3, 4]
+
+    # Unread for the sink's timeout: the worker gives up
+    await asyncio.to_thread(worker.join)
+    assert sent[-1] == "abandoned"
+    stream.drop()
+    await asyncio.to_thread(stream.close)
+
+
+@pytest.mark.asyncio
+async def test_dropped_stream_lets_the_worker_finish():
+    stream = RecordStream(asyncio.get_running_loop(), processes=False)
+    worker, sent = start_worker(stream, 10, timeout=5)
+    await asyncio.sleep(0.05)
+    stream.drop()
+    await asyncio.to_thread(worker.join)
+    assert sent == list(range(10))
+    await asyncio.to_thread(stream.close)
+    assert stream.records.qsize() <= 1
+
+
+@pytest.mark.asyncio
+async def test_records_end_with_none():
+    stream = RecordStream(asyncio.get_running_loop(), processes=False)
+    worker, sent = start_worker(stream, 3, timeout=5)
+    assert [await stream.records.get() for _ in range(4)] == [b"0", b"1", b"2", None]
+    await asyncio.to_thread(worker.join)
+    await asyncio.to_thread(stream.close)
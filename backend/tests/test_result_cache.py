@@ -0,0 +1,65 @@
+import os
+import time
+
+from core.service.result_cache import DiskTier, MemoryTier, ResultCache, file_digest, metrics_key, result_key
+
+
+def test_memory_tier_evicts_by_byte_budget():
+    memory = MemoryTier(max_bytes=10)
+    memory.set("a", b"1234")
+    memory.set("b", b"1234")
+    memory.get("a")
+    memory.set("c", b"1234")
+
+    assert memory.get("a") == b"1234"
+    assert memory.get("b") is None
+    assert memory.get("c") == b"1234"
+    assert (memory.size, memory.evictions) == (8, 1)
+
+
+def test_memory_tier_skips_values_over_budget():
+    memory = MemoryTier(max_bytes=4)
+    memory.set("a", b"12345")
+    assert memory.get("a") is None
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    DiskTier(str(tmp_path), max_bytes=1024).set("abcdef", b"payload")
+
+    disk = DiskTier(str(tmp_path), max_bytes=1024)
+    assert disk.size == len(b"payload")
+    assert disk.get("abcdef") == b"payload"
+    assert disk.get("missing") is None
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    disk = DiskTier(str(tmp_path), max_bytes=20)
+    disk.set("aa1", b"x" * 8)
+    disk.set("bb2", b"x" * 8)
+    past = time.time() - 60
+    os.utime(disk._path("aa1"), (past, past))
+    disk.set("cc3", b"x" * 8)
+
+    assert disk.get("aa1") is None
+    assert disk.get("bb2") is not None
+    assert disk.get("cc3") is not None
+    assert disk.evictions == 1
+
+
+def test_result_cache_promotes_disk_hits(tmp_path):
+    cache = ResultCache(MemoryTier(1024), DiskTier(str(tmp_path), 1024))
+    cache.set("key", b"value")
+    cache._memory.clear()
+
+    assert cache.get("key") == b"value"
+    assert cache.get("key") == b"value"
+    assert cache.get("other") is None
+    stats = cache.stats()
+    assert (stats.memory_hits, stats.disk_hits, stats.misses) == (1, 1, 1)
+
+
+def test_keys():
+    digest = file_digest(b"MThd")
+    assert result_key(digest, "config") != result_key(digest, "other config")
+    assert metrics_key(digest) != result_key(digest, "config")
+    assert metrics_key(digest) == metrics_key(file_digest(b"MThd"))
@@ -0,0 +1,39 @@
+import json
+
+import numpy as np
+import pytest
+from miditok import Event, TokSequence
+
+from core.api.model import ConfigModel
+from core.constants import EXAMPLE_MIDI_FILE_PATH
+from core.service.midi_processing import tokenize_midi_file
+from core.service.parsed_score import ParsedScore
+from core.service.serializer import TokSequenceEncoder, serialize_tokens
+from tests.test_api import TEST_CONFIG
+
+
+@pytest.mark.parametrize(
+    "tokenizer", ["REMI", "REMIPlus", "MIDILike", "TSD", "Structured", "CPWord", "Octuple", "MMM"]
+)
+def test_serialize_tokens_matches_encoder(tokenizer):
+    score = ParsedScore.from_file(EXAMPLE_MIDI_FILE_PATH)
+    tokens, _, _ = tokenize_midi_file(ConfigModel(**{**TEST_CONFIG, "tokenizer": tokenizer}), score)
+    assert serialize_tokens(tokens) == json.dumps(tokens, cls=TokSequenceEncoder, separators=(",", ":"))
+
+
+def test_serialize_tokens_handles_numpy_and_compound_tokens():
+    pitch = Event("Pitch", 60, np.int64(10), np.int8(3), np.float32(0.5))
+    pitch.note_id = "10:60"
+    tokens = [
+        TokSequence(events=[[pitch, Event("Velocity", 100, 10, None, [0, 4, 7])], Event("Bar", None, 0, 0, "Bar")]),
+        TokSequence(events=[Event("Tempo", 120.0, None, True, (0, 4)), Event("Pitch", 60, 10, 3, "é")]),
+    ]
+    assert serialize_tokens(tokens) == json.dumps(tokens, cls=TokSequenceEncoder, separators=(",", ":"))
+    assert json.loads(serialize_tokens(tokens))[0][0][0] == {
+        "type": "Pitch",
+        "value": 60,
+        "time": 10,
+        "program": 3,
+        "desc": 0.5,
+        "note_id": "10:60",
+    }
@@ -0,0 +1,83 @@
+import json
+
+import numpy as np
+
+from core.api.model import ConfigModel
+from core.constants import EXAMPLE_MIDI_FILE_PATH
+from core.service.midi_processing import process_midi_session, tokenize_midi_file
+from core.service.note_table import NoteTable
+from core.service.parsed_score import ParsedScore
+from core.service.serializer import serialize_tokens_and_notes
+from core.service.sessions import SessionData, SessionStore, serialize_note_window, serialize_token_window
+from tests.test_api import TEST_CONFIG
+
+
+def read_example() -> bytes:
+    with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+        return file.read()
+
+
+def test_whole_windows_match_the_full_result():
+    config = ConfigModel(**{**TEST_CONFIG, "tokenizer": "TSD"})
+    tokens, notes, links = tokenize_midi_file(config, ParsedScore.from_file(EXAMPLE_MIDI_FILE_PATH))
+    full = json.loads(serialize_tokens_and_notes(tokens, notes, links))
+    session = process_midi_session(config, read_example())
+
+    assert session.metrics is not None
+    for track, stream in enumerate(session.streams):
+        start, end = stream.window(None, None)
+        window = json.loads(serialize_token_window(track, stream, start, end))["data"]
+        assert window["tokens"] == full["tokens"][track]
+        indexes = session.tracks[track].window(None, None)
+        window = json.loads(serialize_note_window(track, session.tracks[track], indexes))["data"]
+        assert window["notes"] == full["notes"][track]
+        assert window["note_tokens"] == full["note_tokens"][track]
+
+
+def test_time_windows():
+    config = ConfigModel(**{**TEST_CONFIG, "tokenizer": "REMI"})
+    session = process_midi_session(config, read_example(), with_metrics=False)
+    stream, track = session.streams[0], session.tracks[0]
+    start_tick, end_tick = 1920, 3840
+
+    start, end = stream.window(start_tick, end_tick)
+    tokens = json.loads(serialize_token_window(0, stream, start, end))["data"]["tokens"]
+    assert 0 < len(tokens) < len(stream.tokens)
+    assert all(start_tick <= token["time"] < end_tick for token in tokens)
+    assert stream.times[start - 1] < start_tick and stream.times[end] >= end_tick
+
+    indexes = track.window(start_tick, end_tick)
+    notes = json.loads(serialize_note_window(0, track, indexes))["data"]["notes"]
+    all_notes = json.loads(serialize_note_window(0, track, track.window(None, None)))["data"]["notes"]
+    expected = [index for index, note in enumerate(all_notes) if note["start"] < end_tick and note["end"] > start_tick]
+    assert indexes.tolist() == expected
+    assert notes == [all_notes[index] for index in expected]
+
+
+def test_store_expires_and_evicts_sessions():
+    now = [0.0]
+    empty = SessionData([], [], True, metrics=b"x" * 100)
+    store = SessionStore(max_bytes=250, ttl=10, clock=lambda: now[0])
+
+    first, second = store.add(empty), store.add(empty)
+    assert first is not None and second is not None
+    now[0] = 5
+    assert store.get(first) is empty
+    third = store.add(empty)
+    assert third is not None
+    # Over the byte cap: the least recently read session goes
+    assert store.get(second) is None
+    now[0] = 14
+    assert store.get(first) is empty
+    now[0] = 24
+    assert store.get(first) is None and store.get(third) is None
+    stats = store.stats()
+    assert (stats.sessions, stats.bytes, stats.created, stats.evicted, stats.expired) == (0, 0, 3, 1, 2)
+    assert store.add(SessionData([], [], True, metrics=b"x" * 300)) is None
+
+
+def test_empty_track():
+    session = process_midi_session(ConfigModel(**{**TEST_CONFIG, "tokenizer": "REMI"}), read_example())
+    session.tracks.append(type(session.tracks[0]).from_notes(NoteTable.empty(), None))
+    assert session.tracks[-1].window(0, 100).tolist() == []
+    assert np.array_equal(session.tracks[-1].notes.offsets, [0])
@@ -0,0 +1,39 @@
+from core.service.timing import StageHistograms, StageTimer, size_bucket
+
+
+def test_stage_timer_sums_repeated_stages():
+    timer = StageTimer()
+    timer.add("parse", 0.002)
+    timer.add("serialize", 0.001)
+    with timer.stage("tokenize"):
+        pass
+    timer.add("serialize", 0.0005)
+
+    assert list(timer.summed()) == ["parse", "serialize", "tokenize"]
+    assert timer.summed()["serialize"] == 0.0015
+    assert timer.server_timing().startswith("parse;dur=2.00, serialize;dur=1.50, tokenize;dur=")
+
+
+def test_size_buckets():
+    assert size_bucket(0) == "0-16KiB"
+    assert size_bucket(16 * 1024) == "16-64KiB"
+    assert size_bucket(5 * 1024 * 1024) == "1MiB+"
+
+
+def test_histograms_render_cumulative_buckets():
+    histograms = StageHistograms("test_seconds", "Test.", buckets=(0.01, 0.1))
+    for seconds in (0.005, 0.01, 0.05, 3.0):
+        timer = StageTimer()
+        timer.add("parse", seconds)
+        histograms.observe(timer, "REMI", 1000)
+
+    lines = histograms.render().splitlines()
+    labels = 'stage="parse",tokenizer="REMI",size="0-16KiB"'
+    assert lines[:2] == ["# HELP test_seconds Test.", "# TYPE test_seconds histogram"]
+    assert lines[2:] == [
+        f'test_seconds_bucket{{{labels},le="0.01"}} 2',
+        f'test_seconds_bucket{{{labels},le="0.1"}} 3',
+        f'test_seconds_bucket{{{labels},le="+Inf"}} 4',
+        f"test_seconds_sum{{{labels}}} 3.065",
+        f"test_seconds_count{{{labels}}} 4",
+    ]
@@ -1,6 +1,8 @@
 import pytest
 from miditok import TokenizerConfig
 
+from core.constants import DEFAULT_TOKENIZER_PARAMS
+from core.service.tokenizers.tokenizer_cache import TokenizerCache, canonical_config_key
 from core.service.tokenizers.tokenizer_factory import TokenizerFactory
 
 
@@ -21,3 +23,58 @@ def test_get_tokenizer_fail():
         tokenizer_factory = TokenizerFactory()
         config = TokenizerConfig()
         tokenizer_factory.get_tokenizer("SomeRandomString", config)
+
+
+def test_get_cached_tokenizer_reuses_instance():
+    tokenizer_factory = TokenizerFactory(TokenizerCache(max_size=2))
+    first = tokenizer_factory.get_cached_tokenizer("REMI", TokenizerConfig(**DEFAULT_TOKENIZER_PARAMS))
+    second = tokenizer_factory.get_cached_tokenizer("REMI", TokenizerConfig(**DEFAULT_TOKENIZER_PARAMS))
+    other = tokenizer_factory.get_cached_tokenizer("TSD", TokenizerConfig(**DEFAULT_TOKENIZER_PARAMS))
+
+    assert first is second
+    assert other is not first
+    stats = tokenizer_factory._cache.stats()
+    assert (stats.hits, stats.misses, stats.size) == (1, 2, 2)
+
+
+def test_tokenizer_cache_evicts_least_recently_used():
+    cache = TokenizerCache(max_size=2)
+    tokenizer_factory = TokenizerFactory(cache)
+    config = TokenizerConfig(**DEFAULT_TOKENIZER_PARAMS)
+    for tokenizer in ["REMI", "TSD", "REMI", "MIDILike"]:
+        tokenizer_factory.get_cached_tokenizer(tokenizer, config)
+
+    assert canonical_config_key("REMI", config) in cache
+    assert canonical_config_key("TSD", config) not in cache
+    assert cache.stats().evictions == 1
+
+
+def test_canonical_config_key_matches_equivalent_configs():
+    explicit = TokenizerConfig(**DEFAULT_TOKENIZER_PARAMS, pitch_bend_range=[-8192, 8191, 32], log_tempos=False)
+    assert canonical_config_key("REMI", explicit) == canonical_config_key(
+        "REMI", TokenizerConfig(**DEFAULT_TOKENIZER_PARAMS)
+    )
+    assert canonical_config_key("REMI", explicit) != canonical_config_key("TSD", explicit)
+    assert canonical_config_key("REMI", explicit) != canonical_config_key("REMI", TokenizerConfig())
+
+
+def test_warm_up():
+    cache = TokenizerCache(max_size=8)
+    TokenizerFactory(cache).warm_up(["REMI", "CPWord"])
+    assert len(cache) == 2
+
+
+def test_pinned_tokenizer_is_never_evicted():
+    cache = TokenizerCache(max_size=1)
+    tokenizer_factory = TokenizerFactory(cache)
+    config = TokenizerConfig(**DEFAULT_TOKENIZER_PARAMS)
+    key = canonical_config_key("REMI", config)
+    cached = tokenizer_factory.get_cached_tokenizer("REMI", config)
+    pinned = tokenizer_factory.get_pinned_tokenizer("REMI", key, lambda: TokenizerConfig(**DEFAULT_TOKENIZER_PARAMS))
+    assert pinned is cached
+    for tokenizer in ["TSD", "MIDILike"]:
+        tokenizer_factory.get_cached_tokenizer(tokenizer, config)
+
+    assert tokenizer_factory.get_cached_tokenizer("REMI", config) is pinned
+    stats = cache.stats()
+    assert (stats.size, stats.pinned, stats.evictions) == (1, 1, 1)
@@ -0,0 +1,90 @@
+import struct
+from io import BytesIO
+from typing import List
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request, UploadFile
+from fastapi.testclient import TestClient
+from starlette.datastructures import Headers
+from starlette.types import Message
+
+from core.api.uploads import BodySizeLimitMiddleware, read_midi_body, read_midi_upload
+from core.constants import EXAMPLE_MIDI_FILE_PATH
+
+with open(EXAMPLE_MIDI_FILE_PATH, "rb") as file:
+    EXAMPLE_MIDI = file.read()
+
+
+def _upload(data: bytes, content_type: str = "audio/midi") -> UploadFile:
+    return UploadFile(BytesIO(data), headers=Headers({"content-type": content_type}))
+
+
+async def _status(data: bytes, content_type: str = "audio/midi", max_bytes: int = 1 << 20) -> int:
+    with pytest.raises(HTTPException) as error:
+        await read_midi_upload(_upload(data, content_type), max_bytes)
+    return error.value.status_code
+
+
+@pytest.mark.asyncio
+async def test_read_midi_upload():
+    assert await read_midi_upload(_upload(EXAMPLE_MIDI)) == EXAMPLE_MIDI
+    # Bytes after the declared tracks are not read
+    assert await read_midi_upload(_upload(EXAMPLE_MIDI + b"trailing")) == EXAMPLE_MIDI
+
+
+@pytest.mark.asyncio
+async def test_read_midi_upload_rejects():
+    assert await _status(EXAMPLE_MIDI, content_type="text/plain") == 415
+    assert await _status(b"RIFF" + EXAMPLE_MIDI) == 415
+    assert await _status(EXAMPLE_MIDI[:-10]) == 400
+    assert await _status(EXAMPLE_MIDI, max_bytes=len(EXAMPLE_MIDI) - 1) == 413
+    # A track declaring a huge length is rejected from its header, without reading further
+    huge_track = EXAMPLE_MIDI[:14] + struct.pack(">4sI", b"MTrk", 1 << 30)
+    assert await _status(huge_track) == 413
+    assert await _status(EXAMPLE_MIDI[:14] + struct.pack(">4sI", b"XFIH", 0)) == 400
+
+
+@pytest.mark.asyncio
+async def test_read_midi_body():
+    received: List[bytes] = []
+
+    async def body(chunks: List[bytes]) -> Request:
+        async def receive() -> Message:
+            chunk = chunks.pop(0)
+            received.append(chunk)
+            return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+        scope = {"type": "http", "method": "POST", "headers": [(b"content-type", b"audio/midi")]}
+        return Request(scope, receive)
+
+    # Reads spanning the chunks the body arrives in
+    chunks = [EXAMPLE_MIDI[index : index + 7] for index in range(0, len(EXAMPLE_MIDI), 7)]
+    assert await read_midi_body(await body(chunks + [b"trailing"])) == EXAMPLE_MIDI
+
+    # Rejected from the first chunk, the rest of the body is never received
+    received.clear()
+    with pytest.raises(HTTPException) as error:
+        await read_midi_body(await body([b"RIFF" + EXAMPLE_MIDI[4:16], EXAMPLE_MIDI[16:]]))
+    assert error.value.status_code == 415 and len(received) == 1
+    received.clear()
+    huge_track = EXAMPLE_MIDI[:14] + struct.pack(">4sI", b"MTrk", 1 << 30)
+    with pytest.raises(HTTPException) as error:
+        await read_midi_body(await body([huge_track, b"\x00" * 1024]), max_bytes=1 << 20)
+    assert error.value.status_code == 413 and len(received) == 1
+
+
+def test_body_size_limit():
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request) -> dict:
+        return {"size": len(await request.body())}
+
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=100)
+    client = TestClient(app)
+    assert client.post("/echo", content=b"x" * 100).json() == {"size": 100}
+    response = client.post("/echo", content=b"x" * 101)
+    assert response.status_code == 413 and response.json()["success"] is False
+    # Chunked bodies have no Content-Length and are cut off while streaming
+    response = client.post("/echo", content=iter([b"x" * 60, b"x" * 60]))
+    assert response.status_code == 413
@@ -0,0 +1,36 @@
+import subprocess
+import sys
+import time
+
+from fastapi.testclient import TestClient
+
+from core.api.api import app, warm_up_status
+from core.service.parsed_score import ParsedScore
+from core.service.warm_up import dummy_midi, warm_up_pipeline
+
+
+def test_api_import_does_not_import_pipeline():
+    code = (
+        "import sys, core.api.api, core.service.tokenizers.tokenizer_factory; "
+        "print(sorted({'miditok', 'muspy', 'miditoolkit'} & set(sys.modules)))"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]"
+
+
+def test_warm_up_pipeline():
+    score = ParsedScore.from_bytes(dummy_midi())
+    assert len(score.midi.instruments[0].notes) == 4
+    warm_up_pipeline()
+
+
+def test_ready_after_warm_up():
+    with TestClient(app) as client:
+        deadline = time.monotonic() + 120
+        response = client.get("/ready")
+        while response.status_code == 503 and warm_up_status.state != "failed" and time.monotonic() < deadline:
+            assert response.headers["Retry-After"] == "1"
+            time.sleep(0.1)
+            response = client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["data"]["state"] == "done"
@@ -44,6 +44,8 @@ function App() {
   const [selectedNote, setSelectedNote] = useState<Note | null>(null);
   const [hoveredToken, setHoveredToken] = useState<Token | null>(null);
   const [selectedToken, setSelectedToken] = useState<Token | null>(null);
+  const [hoveredTokenTrack, setHoveredTokenTrack] = useState<number | null>(null);
+  const [selectedTokenTrack, setSelectedTokenTrack] = useState<number | null>(null);
   const [uploaderVisible, setUploaderVisible] = useState<boolean>(true);
 
   const handleFileChange = (file: File) => {
@@ -210,12 +212,14 @@ function App() {
     setSelectedToken(null);
   }
 
-  const handleTokenHover = (token: Token | null) => {
+  const handleTokenHover = (token: Token | null, track: number | null) => {
     setHoveredToken(token);
+    setHoveredTokenTrack(track);
   };
 
-  const handleTokenSelect = (token: Token | null) => {
+  const handleTokenSelect = (token: Token | null, track: number | null) => {
     setSelectedToken(token);
+    setSelectedTokenTrack(track);
     setSelectedNote(null);
   }
 
@@ -471,12 +475,15 @@ function App() {
                         {res.response?.data ?
                           <DataDisplay
                             data={res.response.data.tokens}
+                            notes={res.response.data.notes}
                             hoveredNote={hoveredNote}
                             selectedNote={selectedNote}
                             onTokenHover={handleTokenHover}
                             onTokenSelect={handleTokenSelect}
                             hoveredToken={hoveredToken}
                             selectedToken={selectedToken}
+                            hoveredTokenTrack={hoveredTokenTrack}
+                            selectedTokenTrack={selectedTokenTrack}
                           /> : res.response?.error}
                       </ErrorBoundary>
                     </div>
@@ -497,6 +504,8 @@ function App() {
                                   onNoteSelect={handleNoteSelect}
                                   hoveredToken={hoveredToken}
                                   selectedToken={selectedToken}
+                                  hoveredTokenTrack={hoveredTokenTrack}
+                                  selectedTokenTrack={selectedTokenTrack}
                                   track={idx}
                                 />
                               </TabPanel>
@@ -5,12 +5,15 @@ import TokenInfo from './TokenInfo';
 
 interface DataDisplayProps {
   data: NestedList<Token>;
+  notes: Note[][];
   hoveredNote: Note | null;
   selectedNote: Note | null;
-  onTokenHover: (token: Token | null) => void;
-  onTokenSelect: (token: Token | null) => void;
+  onTokenHover: (token: Token | null, track: number | null) => void;
+  onTokenSelect: (token: Token | null, track: number | null) => void;
   hoveredToken: Token | null;
   selectedToken: Token | null;
+  hoveredTokenTrack: number | null;
+  selectedTokenTrack: number | null;
 }
 
 function isTokenArray(value: NestedList<Token>): value is Token[] {
@@ -25,22 +28,51 @@ const chunkTokens = (tokens: Token[], size: number): Token[][] => {
   return chunks;
 }
 
+// Token's note_id is the index of its note in the notes of its track
+const isLinked = (token: Token, noteIndex: number) =>
+  noteIndex >= 0 && token.note_id !== null && token.note_id !== undefined && token.note_id === noteIndex;
+
 const RNestedList: React.FC<{
-  onHover: (t: Token | null, heading: string) => void;
-  onSelect: (t: Token | null) => void;
+  onHover: (t: Token | null, heading: string, track: number | null) => void;
+  onSelect: (t: Token | null, track: number | null) => void;
   list: NestedList<Token>;
   level: number;
   parentIndex: number[];
+  track: number | null;
+  notes: Note[][];
   hoveredNote: Note | null;
   selectedNote: Note | null;
   hoveredToken: Token | null;
   selectedToken: Token | null;
-}> = ({ onHover, onSelect, list, level, parentIndex, hoveredNote, selectedNote, hoveredToken, selectedToken }) => {
+  hoveredTokenTrack: number | null;
+  selectedTokenTrack: number | null;
+}> = ({ onHover, onSelect, list, level, parentIndex, track, notes, hoveredNote, selectedNote, hoveredToken, selectedToken, hoveredTokenTrack, selectedTokenTrack }) => {
+  // Indexes, in the notes of the given track, of the hovered and selected notes and of the notes of the
+  // hovered and selected tokens (-1 when they are not in that track)
+  const linkedNotes = (linkTrack: number | null) => {
+    const trackNotes = linkTrack !== null ? notes[linkTrack] || [] : [];
+    const tokenNote = (token: Token | null, tokenTrack: number | null) =>
+      token && tokenTrack === linkTrack && token.note_id !== null && token.note_id !== undefined ? token.note_id : -1;
+    return {
+      hoveredNoteIndex: hoveredNote ? trackNotes.indexOf(hoveredNote) : -1,
+      selectedNoteIndex: selectedNote ? trackNotes.indexOf(selectedNote) : -1,
+      hoveredTokenNote: tokenNote(hoveredToken, hoveredTokenTrack),
+      selectedTokenNote: tokenNote(selectedToken, selectedTokenTrack),
+    };
+  };
+  const listLinks = linkedNotes(track);
+
   return (
     <>
       {list.map((item, index) => {
         const currentIndex = [...parentIndex, index + 1];
         const heading = currentIndex.join('.');
+        // Top level lists are the tracks, except for tokenizers that put all tracks in a single stream
+        const itemTrack = level === 0 && Array.isArray(item) ? index : track;
+        const { hoveredNoteIndex, selectedNoteIndex, hoveredTokenNote, selectedTokenNote } =
+          itemTrack === track ? listLinks : linkedNotes(itemTrack);
+        const handleHover = (token: Token | null, heading: string) => onHover(token, heading, itemTrack);
+        const handleSelect = (token: Token | null) => onSelect(token, itemTrack);
 
         if (Array.isArray(item)) {
           if (isTokenArray(item)) {
@@ -54,17 +86,11 @@ const RNestedList: React.FC<{
                       <TokenBlock
                         key={tokenIndex}
                         item={token}
-                        onHover={onHover}
-                        onSelect={onSelect}
+                        onHover={handleHover}
+                        onSelect={handleSelect}
                         heading={heading}
-                        highlight={
-                          (hoveredNote && token.note_id === hoveredNote.start + ':' + hoveredNote.pitch) ||
-                          (hoveredToken && hoveredToken.note_id !== null && token.note_id === hoveredToken.note_id)
-                        }
-                        selected={
-                          (selectedNote && token.note_id === selectedNote.start + ':' + selectedNote.pitch) ||
-                          (selectedToken && token.note_id === selectedToken.note_id)
-                        }
+                        highlight={isLinked(token, hoveredNoteIndex) || isLinked(token, hoveredTokenNote)}
+                        selected={isLinked(token, selectedNoteIndex) || isLinked(token, selectedTokenNote)}
                       />
                     ))}
                   </div>
@@ -82,10 +108,14 @@ const RNestedList: React.FC<{
                   list={item}
                   level={level + 1}
                   parentIndex={currentIndex}
+                  track={itemTrack}
+                  notes={notes}
                   hoveredNote={hoveredNote}
                   selectedNote={selectedNote}
                   hoveredToken={hoveredToken}
                   selectedToken={selectedToken}
+                  hoveredTokenTrack={hoveredTokenTrack}
+                  selectedTokenTrack={selectedTokenTrack}
                 />
               </div>
             );
@@ -96,17 +126,11 @@ const RNestedList: React.FC<{
             <TokenBlock
               key={index}
               item={item as Token}
-              onHover={onHover}
-              onSelect={onSelect}
+              onHover={handleHover}
+              onSelect={handleSelect}
               heading={heading}
-              highlight={
-                (hoveredNote && item.note_id === hoveredNote.start + ':' + hoveredNote.pitch) ||
-                (hoveredToken && hoveredToken.note_id !== null && item.note_id === hoveredToken.note_id)
-              }
-              selected={
-                (selectedNote && item.note_id === selectedNote.start + ':' + selectedNote.pitch) ||
-                (selectedToken && item.note_id === selectedToken.note_id)
-              }
+              highlight={isLinked(item, hoveredNoteIndex) || isLinked(item, hoveredTokenNote)}
+              selected={isLinked(item, selectedNoteIndex) || isLinked(item, selectedTokenNote)}
             />
           );
         }
@@ -116,7 +140,7 @@ const RNestedList: React.FC<{
   );
 }
 
-const DataDisplay: React.FC<DataDisplayProps> = ({ data, hoveredNote, selectedNote, hoveredToken, selectedToken, onTokenHover, onTokenSelect }) => {
+const DataDisplay: React.FC<DataDisplayProps> = ({ data, notes, hoveredNote, selectedNote, hoveredToken, selectedToken, hoveredTokenTrack, selectedTokenTrack, onTokenHover, onTokenSelect }) => {
   const [token, setToken] = useState<Token | null>(null);
   const [heading, setHeading] = useState<string>("");
 
@@ -136,18 +160,22 @@ const DataDisplay: React.FC<DataDisplayProps> = ({ data, hoveredNote, selectedNo
       </div>
       <div style={{ flex: 3}}>
         <RNestedList
-          onHover={(token, heading) => {
-            onTokenHover(token);
+          onHover={(token, heading, track) => {
+            onTokenHover(token, track);
             updateTokenInfo(token, heading);
           }}
           onSelect={onTokenSelect}
           list={data}
           level={0}
           parentIndex={[]}
+          track={null}
+          notes={notes}
           hoveredNote={hoveredNote}
           selectedNote={selectedNote}
           hoveredToken={hoveredToken}
-          selectedToken={selectedToken}/>
+          selectedToken={selectedToken}
+          hoveredTokenTrack={hoveredTokenTrack}
+          selectedTokenTrack={selectedTokenTrack}/>
       </div>
     </div>
   );  
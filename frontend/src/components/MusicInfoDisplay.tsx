@@ -123,6 +123,15 @@ const MusicInfoDisplay: React.FC<TableDisplayProps> = ({ data }) => {
                         <div style={{ fontSize: '10px' }}>
                             <strong>Drum Pattern Consistency:</strong> {data.drum_pattern_consistency.toPrecision(3)}
                         </div>
+                        <div style={{ fontSize: '10px' }}>
+                            <strong>Pitch Class Entropy:</strong> {data.pitch_class_entropy.toPrecision(3)}
+                        </div>
+                        <div style={{ fontSize: '10px' }}>
+                            <strong>Scale Consistency:</strong> {data.scale_consistency.toPrecision(3)}
+                        </div>
+                        <div style={{ fontSize: '10px' }}>
+                            <strong>Groove Consistency:</strong> {data.groove_consistency.toPrecision(3)}
+                        </div>
                     </>
                     )}
                 </div>
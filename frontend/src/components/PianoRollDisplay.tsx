@@ -8,9 +8,11 @@ interface PianoRollDisplayProps {
     track?: number;
     hoveredToken: Token | null;
     selectedToken: Token | null;
+    hoveredTokenTrack?: number | null;
+    selectedTokenTrack?: number | null;
 }
 
-const PianoRollDisplay: React.FC<PianoRollDisplayProps> = ({ notes, onNoteHover, onNoteSelect, hoveredToken, selectedToken, track = 0 }) => {
+const PianoRollDisplay: React.FC<PianoRollDisplayProps> = ({ notes, onNoteHover, onNoteSelect, hoveredToken, selectedToken, hoveredTokenTrack = null, selectedTokenTrack = null, track = 0 }) => {
   const canvasRef = useRef<HTMLCanvasElement>(null);
   const [hoveredNote, setHoveredNote] = useState<Note | null>(null);
   const [selectedNote, setSelectedNote] = useState<Note | null>(null);
@@ -23,9 +25,15 @@ const PianoRollDisplay: React.FC<PianoRollDisplayProps> = ({ notes, onNoteHover,
 
   // Calculate the range of notes to be displayed
   const trackNotes = notes[track] || [];
-  const lowestNote = Math.min(...trackNotes.map(note => note.pitch));
-  const highestNote = Math.max(...trackNotes.map(note => note.pitch));
-  const maxTime = Math.max(...trackNotes.map(note => note.end));
+
+  // Tokens link to their note by its index in the track's notes
+  const linkedNoteIndex = (token: Token | null, tokenTrack: number | null) =>
+    token && tokenTrack === track && token.note_id !== null && token.note_id !== undefined ? token.note_id : -1;
+  const hoveredTokenNote = linkedNoteIndex(hoveredToken, hoveredTokenTrack);
+  const selectedTokenNote = linkedNoteIndex(selectedToken, selectedTokenTrack);
+  const lowestNote = trackNotes.reduce((lowest, note) => Math.min(lowest, note.pitch), Infinity);
+  const highestNote = trackNotes.reduce((highest, note) => Math.max(highest, note.pitch), -Infinity);
+  const maxTime = trackNotes.reduce((end, note) => Math.max(end, note.end), -Infinity);
 
   const lowestOctaveNote = Math.floor(lowestNote / 12) * 12 - 12;
   const highestOctaveNote = Math.ceil(highestNote / 12) * 12 + 11;
@@ -74,9 +82,9 @@ const PianoRollDisplay: React.FC<PianoRollDisplayProps> = ({ notes, onNoteHover,
     };
 
     const drawNotes = () => {
-      trackNotes.forEach(note => {
-        const highlight_token = hoveredToken && note.start + ':' + note.pitch === hoveredToken.note_id;
-        const selected_token = selectedToken && note.start + ':' + note.pitch === selectedToken.note_id;
+      trackNotes.forEach((note, index) => {
+        const highlight_token = index === hoveredTokenNote;
+        const selected_token = index === selectedTokenNote;
 
         const highlight_note = note === hoveredNote;
         const selected_note = note === selectedNote;
@@ -120,7 +128,7 @@ const PianoRollDisplay: React.FC<PianoRollDisplayProps> = ({ notes, onNoteHover,
     drawGrid();
     drawPianoKeys();
     drawNotes();
-  }, [notes, track, hoveredToken, selectedToken, hoveredNote, selectedNote, lowestNote, highestNote, lowestOctaveNote, highestOctaveNote, maxTime]);
+  }, [notes, track, hoveredTokenNote, selectedTokenNote, hoveredNote, selectedNote, lowestNote, highestNote, lowestOctaveNote, highestOctaveNote, maxTime]);
 
   const handleMouseMove = (event: React.MouseEvent) => {
     const canvas = canvasRef.current;
@@ -169,19 +177,19 @@ const PianoRollDisplay: React.FC<PianoRollDisplayProps> = ({ notes, onNoteHover,
 
   useEffect(() => {
     if (hoveredToken) {
-      const hoveredNote = trackNotes.find(note => note.start + ':' + note.pitch === hoveredToken.note_id);
+      const hoveredNote = trackNotes[hoveredTokenNote];
       setHoveredNote(hoveredNote || null);
       onNoteHover(hoveredNote || null);
     }
-  }, [hoveredToken, trackNotes, onNoteHover]);
+  }, [hoveredToken, hoveredTokenNote, trackNotes, onNoteHover]);
 
   useEffect(() => {
     if (selectedToken) {
-      const selectedNote = trackNotes.find(note => note.start + ':' + note.pitch === selectedToken.note_id);
+      const selectedNote = trackNotes[selectedTokenNote];
       setSelectedNote(selectedNote || null);
       onNoteSelect(selectedNote || null);
     }
-  }, [selectedToken, trackNotes, onNoteSelect]);
+  }, [selectedToken, selectedTokenNote, trackNotes, onNoteSelect]);
 
   return (
     <div style={{ overflowX: 'auto', maxWidth: '100%' }}>
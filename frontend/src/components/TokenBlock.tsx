@@ -38,7 +38,7 @@ const TokenBlock: React.FC<TokenBlockProps> = memo(({ item, onHover, onSelect, h
     onHover(null, "");
   };
   const handleClick = () => {
-    if (item.note_id) {
+    if (item.note_id !== null && item.note_id !== undefined) {
       onSelect(item);
     }
   };
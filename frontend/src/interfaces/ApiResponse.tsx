@@ -4,7 +4,7 @@ interface Token {
   time: number;
   program: number;
   desc: string;
-  note_id?: string | null;
+  note_id?: number | null; // Index of the token's note in its track's notes
 }
 
 interface Note {
@@ -28,12 +28,16 @@ interface MusicInfoData {
 
   empty_beat_rate: number;
   drum_pattern_consistency: number;
+  pitch_class_entropy: number;
+  scale_consistency: number;
+  groove_consistency: number;
 }
 
 interface DataStructure {
   tokens: NestedList<Token>;
   metrics: MusicInfoData;
   notes: Note[][];
+  note_tokens?: Array<Array<[number, number] | null>> | null; // Token span [first, last + 1) of each note
 }
 
 interface ApiResponse {